@@ -10,8 +10,9 @@ import os
 import logging
 import cv2
 import numpy as np
-from PIL import Image
-from screenshot_util import take_screenshot
+import matching
+from screenshot_util import grab_bgr
+import template_store
 
 logger = logging.getLogger('backpack_reader')
 
@@ -21,6 +22,41 @@ GRID_COLS = 5
 GRID_ROWS = 4
 GRID_TOTAL = GRID_COLS * GRID_ROWS  # 20
 
+# 颜色签名预筛: 模板真在格子里时, 模板的每个像素格子里都有, 所以模板颜色直方图
+# 应基本被格子直方图"包含"。包含比例 (直方图交 / 模板像素数) 在任一色彩空间
+# 低于该值就不必再做 matchTemplate。分箱很粗, 截图噪声和数字遮挡影响不大。
+SIGNATURE_MIN_OVERLAP = 0.5
+SIGNATURE_HSV_BINS = (12, 4)        # 色相 x 饱和度
+SIGNATURE_BGR_BINS = (4, 4, 4)
+
+
+def color_signature(image, mask=None):
+    """BGR 图像的颜色签名: (HSV 色相-饱和度直方图, BGR 直方图), 均为像素计数;
+    给了掩码时只统计掩码内的像素"""
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    h_bins, s_bins = SIGNATURE_HSV_BINS
+    hs = cv2.calcHist([hsv], [0, 1], mask, [h_bins, s_bins], [0, 180, 0, 256])
+    bgr = cv2.calcHist([image], [0, 1, 2], mask, list(SIGNATURE_BGR_BINS),
+                       [0, 256, 0, 256, 0, 256])
+    return hs, bgr
+
+
+def _match_map(icon, tmpl, mask=None):
+    if mask is None:
+        return cv2.matchTemplate(icon, tmpl, cv2.TM_CCOEFF_NORMED)
+    return matching.masked_match_map(icon, tmpl, mask)
+
+
+def signature_overlap(cell_sig, tmpl_sig):
+    """模板签名被格子签名包含的比例 (各色彩空间取最小), 1.0 = 完全包含"""
+    overlap = 1.0
+    for cell_hist, tmpl_hist in zip(cell_sig, tmpl_sig):
+        total = float(tmpl_hist.sum())
+        if total > 0:
+            overlap = min(overlap,
+                          float(np.minimum(cell_hist, tmpl_hist).sum()) / total)
+    return overlap
+
 
 class BackpackSlot:
     """背包格子信息"""
@@ -33,6 +69,13 @@ class BackpackSlot:
         self.icon_image = icon_image  # numpy BGR
         self.quantity = quantity      # int or None
         self.is_empty = is_empty
+        self._signature = None
+
+    def signature(self):
+        """格子的颜色签名, 每次扫描每格只算一次"""
+        if self._signature is None:
+            self._signature = color_signature(self.icon_image)
+        return self._signature
 
 
 class GridInfo:
@@ -60,6 +103,7 @@ class BackpackReader:
         self.digit_recognizer = digit_recognizer
         self.settings = settings or {}
         self.log_callback = log_callback
+        self._signatures = {}   # {模板路径: (模板数组, 颜色签名)}
 
     def _log(self, message):
         """输出日志到回调和logging"""
@@ -68,12 +112,14 @@ class BackpackReader:
             self.log_callback(message)
 
     def _load_template(self, path):
-        pil_img = Image.open(path)
-        img = np.array(pil_img)
-        pil_img.close()
-        if len(img.shape) == 3:
-            img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-        return img
+        return template_store.load_bgr(path)
+
+    def _template_signature(self, path, tmpl, mask=None):
+        """模板的颜色签名, 按路径缓存 (模板重新截图后数组会换, 随之重算)"""
+        cached = self._signatures.get(path)
+        if cached is None or cached[0] is not tmpl:
+            cached = self._signatures[path] = (tmpl, color_signature(tmpl, mask))
+        return cached[1]
 
     def locate_grid(self, window_region):
         """定位背包网格
@@ -84,37 +130,32 @@ class BackpackReader:
         Returns:
             tuple: (GridInfo, info_str) 或 (None, error_str)
         """
-        win_left, win_top = window_region[0], window_region[1]
-
         # 1. 找到标题位置
         title_path = self.settings.get('backpack_title_image')
         if not title_path or not os.path.exists(title_path):
             return (None, "未设置背包定位模板，请在「设置」中截取")
 
-        screenshot = take_screenshot(region=window_region)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
+        screen_bgr = grab_bgr(region=window_region)
 
         title_tmpl = self._load_template(title_path)
         if (title_tmpl.shape[0] > screen_bgr.shape[0] or
                 title_tmpl.shape[1] > screen_bgr.shape[1]):
             return (None, "背包定位模板大于窗口截图，请重新截取")
 
-        result = cv2.matchTemplate(
-            screen_bgr, title_tmpl, cv2.TM_CCOEFF_NORMED)
-        _, conf, _, title_loc = cv2.minMaxLoc(result)
+        # 传路径而不是数组, 由 TemplateStore 带上 _mask.png 掩码
+        m = matching.match(title_path, window_region, screen=screen_bgr)
+        conf = m.confidence
 
         if conf < 0.7:
             return (None, f"匹配度不足: {conf:.2f}，请确认制造窗口已打开")
 
         # 2. 计算网格起点 = 标题位置 + 偏移量
-        title_h = title_tmpl.shape[0]
+        title_left, title_top, _, title_h = m.box
         offset_x = self.settings.get('grid_offset_x', 0)
         offset_y = self.settings.get('grid_offset_y', 0)
 
-        origin_x = win_left + title_loc[0] + offset_x
-        origin_y = win_top + title_loc[1] + title_h + offset_y
+        origin_x = title_left + offset_x
+        origin_y = title_top + title_h + offset_y
 
         # 3. 格子大小：使用设定值
         cell_w = self.settings.get('cell_width', 40)
@@ -138,10 +179,7 @@ class BackpackReader:
             return (None, info)
 
         # 截取整个窗口
-        screenshot = take_screenshot(region=window_region)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        overlay = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
+        overlay = grab_bgr(region=window_region)
 
         win_left, win_top = window_region[0], window_region[1]
 
@@ -180,25 +218,22 @@ class BackpackReader:
 
         grid_region = (grid_info.origin_x, grid_info.origin_y,
                        cell_w * GRID_COLS, cell_h * GRID_ROWS)
-        screenshot = take_screenshot(region=grid_region)
-        grid_image = np.array(screenshot)
-        screenshot.close()
+        grid_bgr = grab_bgr(region=grid_region)
 
-        if grid_image.size == 0:
+        if grid_bgr.size == 0:
             return []
 
-        grid_bgr = cv2.cvtColor(grid_image, cv2.COLOR_RGB2BGR)
-
         if debug:
             debug_dir = 'debug'
             os.makedirs(debug_dir, exist_ok=True)
             cv2.imwrite(os.path.join(debug_dir, 'grid_full.png'), grid_bgr)
 
         # 空格子模板
-        empty_tmpl = None
+        empty_tmpl = empty_mask = None
         empty_path = self.settings.get('empty_cell_image')
         if empty_path and os.path.exists(empty_path):
             empty_tmpl = self._load_template(empty_path)
+            empty_mask = template_store.load_mask(empty_path)
 
         has_digits = self.digit_recognizer.is_loaded()
         logger.debug(f"数字模板已加载: {has_digits}")
@@ -216,7 +251,7 @@ class BackpackReader:
         count_no_qty = 0
         count_empty = 0
 
-        slots = []
+        cells = []
         for row in range(GRID_ROWS):
             for col in range(GRID_COLS):
                 x_start = col * cell_w
@@ -231,22 +266,18 @@ class BackpackReader:
                     x_start : x_start + cell_w
                 ].copy()
 
-                center_x, center_y = grid_info.get_cell_center(col, row)
-
                 # 空格子判断
                 is_empty = False
                 empty_conf = 0.0
                 if empty_tmpl is not None:
                     eh, ew = empty_tmpl.shape[:2]
                     if cell_img.shape[0] >= eh and cell_img.shape[1] >= ew:
-                        mr = cv2.matchTemplate(
-                            cell_img, empty_tmpl, cv2.TM_CCOEFF_NORMED)
-                        _, mv, _, _ = cv2.minMaxLoc(mr)
+                        mv, _ = matching.exhaustive_match(
+                            cell_img, empty_tmpl, empty_mask)
                         empty_conf = mv
                         is_empty = mv >= 0.85
 
-                # 数字识别
-                quantity = None
+                # 数字区域
                 digit_img = None
                 if has_digits and not is_empty:
                     if (digit_rx >= 0 and digit_ry >= 0
@@ -256,66 +287,86 @@ class BackpackReader:
                             digit_ry : digit_ry + digit_rh,
                             digit_rx : digit_rx + digit_rw
                         ].copy()
-                        label = f'({col},{row})' if debug else ''
-                        quantity = self.digit_recognizer.recognize(
-                            digit_img, debug_label=label)
-
-                # 记录结果
-                if is_empty:
-                    count_empty += 1
-                elif quantity is not None:
-                    count_with_qty += 1
-                else:
-                    count_no_qty += 1
-                    logger.info(f"  格子({col},{row}): 数量未识别 "
-                                f"(空格子置信度:{empty_conf:.2f})")
+                cells.append((col, row, cell_img, is_empty, empty_conf,
+                              digit_img))
+
+        # 数字识别: 所有格子的数字区域一起识别, 每个数字模板只匹配一次;
+        # 与上次扫描像素相同的数字区域直接用缓存的数量
+        digit_cells = [c for c in cells if c[5] is not None]
+        hits_before = self.digit_recognizer.cache_hits
+        quantities = self.digit_recognizer.recognize_batch(
+            [c[5] for c in digit_cells],
+            debug_labels=[f'({c[0]},{c[1]})' if debug else ''
+                          for c in digit_cells]) if digit_cells else []
+        cache_hits = self.digit_recognizer.cache_hits - hits_before
+        quantity_of = {(c[0], c[1]): q for c, q in zip(digit_cells, quantities)}
 
-                if debug:
-                    name = f'cell_{row}_{col}'
+        slots = []
+        for col, row, cell_img, is_empty, empty_conf, digit_img in cells:
+            center_x, center_y = grid_info.get_cell_center(col, row)
+            quantity = quantity_of.get((col, row))
+
+            # 记录结果
+            if is_empty:
+                count_empty += 1
+            elif quantity is not None:
+                count_with_qty += 1
+            else:
+                count_no_qty += 1
+                logger.info(f"  格子({col},{row}): 数量未识别 "
+                            f"(空格子置信度:{empty_conf:.2f})")
+
+            if debug:
+                name = f'cell_{row}_{col}'
+                cv2.imwrite(
+                    os.path.join(debug_dir, f'{name}.png'), cell_img)
+                if digit_img is not None:
+                    cv2.imwrite(
+                        os.path.join(debug_dir, f'{name}_digit.png'),
+                        digit_img)
+                    gray = cv2.cvtColor(digit_img, cv2.COLOR_BGR2GRAY)
+                    _, binary = cv2.threshold(
+                        gray, 0, 255,
+                        cv2.THRESH_BINARY + cv2.THRESH_OTSU)
                     cv2.imwrite(
-                        os.path.join(debug_dir, f'{name}.png'), cell_img)
-                    if digit_img is not None:
-                        cv2.imwrite(
-                            os.path.join(debug_dir, f'{name}_digit.png'),
-                            digit_img)
-                        gray = cv2.cvtColor(digit_img, cv2.COLOR_BGR2GRAY)
-                        _, binary = cv2.threshold(
-                            gray, 0, 255,
-                            cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-                        cv2.imwrite(
-                            os.path.join(debug_dir, f'{name}_binary.png'),
-                            binary)
-
-                slots.append(BackpackSlot(
-                    col, row, center_x, center_y,
-                    cell_img, quantity, is_empty))
-
-        self._log(f"扫描完成: {count_with_qty}个有数量, "
-                  f"{count_no_qty}个数量未识别, {count_empty}个空格子")
+                        os.path.join(debug_dir, f'{name}_binary.png'),
+                        binary)
+
+            slots.append(BackpackSlot(
+                col, row, center_x, center_y,
+                cell_img, quantity, is_empty))
+
+        line = (f"扫描完成: {count_with_qty}个有数量, "
+                f"{count_no_qty}个数量未识别, {count_empty}个空格子")
+        if digit_cells:
+            line += f", 数量缓存命中 {cache_hits}/{len(digit_cells)}"
+        self._log(line)
         return slots
 
     def _load_competing_templates(self, paths):
-        """加载竞争材料模板列表"""
+        """加载竞争材料模板列表 [(模板, 掩码或 None), ...]"""
         templates = []
         for path in paths:
             if not path or not os.path.exists(path):
                 continue
             tmpl = self._load_template(path)
-            templates.append(tmpl)
+            templates.append((tmpl, template_store.load_mask(path)))
         return templates
 
-    def _color_distance(self, icon, tmpl):
+    def _color_distance(self, icon, tmpl, max_loc=None, mask=None):
         """计算模板在格子中最佳匹配位置的颜色均值距离
 
         在匹配位置裁剪出ROI，比较ROI与模板的BGR均值欧氏距离。
         距离越小说明颜色越接近，用于区分形状相似但颜色不同的材料。
+        max_loc: 已经匹配过时传入最佳位置, 不再重复 matchTemplate
+        mask: 模板掩码, 只比较掩码内的像素
         """
-        result = cv2.matchTemplate(icon, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, _, _, max_loc = cv2.minMaxLoc(result)
+        if max_loc is None:
+            _, _, _, max_loc = cv2.minMaxLoc(_match_map(icon, tmpl, mask))
         th, tw = tmpl.shape[:2]
         roi = icon[max_loc[1]:max_loc[1]+th, max_loc[0]:max_loc[0]+tw]
-        mean_roi = np.mean(roi.astype(float), axis=(0, 1))
-        mean_tmpl = np.mean(tmpl.astype(float), axis=(0, 1))
+        mean_roi = np.array(cv2.mean(roi, mask)[:3])
+        mean_tmpl = np.array(cv2.mean(tmpl, mask)[:3])
         return float(np.linalg.norm(mean_roi - mean_tmpl))
 
     def match_item(self, slots, material_image_path, required_quantity,
@@ -328,11 +379,12 @@ class BackpackReader:
             competing_image_paths: 配方中其他材料的图片路径列表，用于竞争匹配
                 通过比较颜色均值距离判断格子更可能属于哪种材料
         """
-        pil_tmpl = Image.open(material_image_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
+        tmpl = template_store.load_bgr(material_image_path)
+        mask = template_store.load_mask(material_image_path)
+        tmpl_sig = None
+        if self.settings.get('color_prefilter', True):
+            tmpl_sig = self._template_signature(material_image_path, tmpl, mask)
+        prefiltered = 0
 
         # 加载竞争模板
         competing_tmpls = []
@@ -355,19 +407,24 @@ class BackpackReader:
             if icon.shape[0] < tmpl.shape[0] or icon.shape[1] < tmpl.shape[1]:
                 continue
 
-            result = cv2.matchTemplate(icon, tmpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
+            # 颜色签名明显对不上的格子不做相关运算
+            if (tmpl_sig is not None and signature_overlap(
+                    slot.signature(), tmpl_sig) < SIGNATURE_MIN_OVERLAP):
+                prefiltered += 1
+                continue
+
+            _, max_val, _, max_loc = cv2.minMaxLoc(_match_map(icon, tmpl, mask))
 
             if max_val >= confidence:
                 # 竞争匹配：用颜色均值距离判断格子更像哪种材料
                 if competing_tmpls:
-                    target_cd = self._color_distance(icon, tmpl)
+                    target_cd = self._color_distance(icon, tmpl, max_loc, mask)
                     best_competing_cd = float('inf')
-                    for c_tmpl in competing_tmpls:
+                    for c_tmpl, c_mask in competing_tmpls:
                         if (icon.shape[0] < c_tmpl.shape[0] or
                                 icon.shape[1] < c_tmpl.shape[1]):
                             continue
-                        c_cd = self._color_distance(icon, c_tmpl)
+                        c_cd = self._color_distance(icon, c_tmpl, mask=c_mask)
                         if c_cd < best_competing_cd:
                             best_competing_cd = c_cd
 
@@ -393,6 +450,9 @@ class BackpackReader:
                 else:
                     candidates.append((slot, max_val))
 
+        if prefiltered:
+            logger.debug(f"  颜色签名预筛排除 {prefiltered} 个格子")
+
         if candidates:
             candidates.sort(key=lambda x: x[1], reverse=True)
             slot = candidates[0][0]
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+背包格子颜色签名预筛: 对 match_item 结果的影响 + 耗时
+
+语料: 给出录制的格子图目录 (扫描时 debug=True 写出的 cell_*.png, 可以是多次
+扫描的子目录) 和材料模板目录就用它们; 否则生成合成背包: 若干种材料图标
+(同形状不同颜色的成对出现, 模拟需要竞争匹配的材料), 随机摆进 5x4 格子,
+加 ±1 像素偏移、噪声和右下角数量。
+
+对每次扫描、每个材料模板, 开 / 关预筛各跑一遍 match_item, 统计:
+    - 结果不同的次数 (预筛必须为 0);
+    - 本该匹配上却被预筛掉的格子数 (必须为 0): 格子里的材料以所有模板中
+      matchTemplate 分数最高且 ≥ 阈值的那个为准;
+    - 同形异色、分数也过了阈值的别的材料被预筛提前排除的格子数
+      (原来要靠竞争匹配的颜色距离排除);
+    - 被预筛掉的格子比例和 match_item 耗时。
+
+用法:
+    python benchmarks/bench_backpack_prefilter.py [格子图目录 模板目录]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import backpack_reader  # noqa: E402
+import template_store  # noqa: E402
+from backpack_reader import (BackpackReader, BackpackSlot, GRID_COLS,  # noqa: E402
+                             signature_overlap)
+from capture_backends import IMAGE_EXTS  # noqa: E402
+
+CONFIDENCE = 0.8
+CELL = 40
+SHAPES = ('circle', 'square', 'triangle', 'diamond', 'ring')
+
+
+def draw_icon(shape, color, size=32):
+    icon = np.full((size, size, 3), (40, 34, 30), np.uint8)
+    c, r = size // 2, size // 2 - 3
+    dark = tuple(int(v * 0.55) for v in color)
+    if shape == 'circle':
+        cv2.circle(icon, (c, c), r, dark, -1)
+        cv2.circle(icon, (c - 3, c - 3), r - 5, color, -1)
+    elif shape == 'square':
+        cv2.rectangle(icon, (4, 4), (size - 5, size - 5), dark, -1)
+        cv2.rectangle(icon, (7, 7), (size - 10, size - 10), color, -1)
+    elif shape == 'ring':
+        cv2.circle(icon, (c, c), r, color, 5)
+        cv2.circle(icon, (c, c), r - 7, dark, -1)
+    else:
+        if shape == 'triangle':
+            pts = [(c, 3), (size - 4, size - 5), (3, size - 5)]
+        else:
+            pts = [(c, 2), (size - 3, c), (c, size - 3), (2, c)]
+        cv2.fillPoly(icon, [np.array(pts, np.int32)], dark)
+        cv2.fillPoly(icon, [(np.array(pts) * 0.7 + c * 0.3).astype(np.int32)], color)
+    cv2.line(icon, (8, size - 9), (size - 9, 8), (230, 230, 230), 1)
+    return icon
+
+
+def synthetic_corpus(scans=12, seed=0):
+    rng = np.random.default_rng(seed)
+    materials = []
+    for shape in SHAPES:
+        for _ in range(2):
+            color = tuple(int(v) for v in rng.integers(60, 256, 3))
+            materials.append(draw_icon(shape, color))
+    # 模板: 截图框一般比图标略小
+    templates = {f'material_{i}': icon[2:30, 2:30].copy()
+                 for i, icon in enumerate(materials)}
+    backpacks = []
+    for _ in range(scans):
+        cells = []
+        for _ in range(20):
+            cell = np.full((CELL, CELL, 3), (28, 24, 22), np.uint8)
+            cv2.rectangle(cell, (0, 0), (CELL - 1, CELL - 1), (70, 62, 55), 1)
+            if rng.random() < 0.85:
+                dx, dy = (int(v) for v in rng.integers(3, 6, 2))
+                cell[dy:dy + 32, dx:dx + 32] = materials[int(rng.integers(len(materials)))]
+                cv2.putText(cell, str(int(rng.integers(1, 99))), (20, 37),
+                            cv2.FONT_HERSHEY_PLAIN, 0.8, (255, 255, 255), 1)
+            noise = rng.integers(-4, 5, cell.shape)
+            cells.append(np.clip(cell.astype(int) + noise, 0, 255).astype(np.uint8))
+        backpacks.append(cells)
+    return backpacks, templates
+
+
+def load_corpus(cells_dir, templates_dir):
+    backpacks = []
+    for root, _, names in sorted(os.walk(cells_dir)):
+        cells = [cv2.imread(os.path.join(root, n), cv2.IMREAD_COLOR)
+                 for n in sorted(names)
+                 if n.startswith('cell_') and n.endswith('.png')
+                 and '_digit' not in n and '_binary' not in n]
+        if cells:
+            backpacks.append(cells)
+    templates = {n: cv2.imread(os.path.join(templates_dir, n), cv2.IMREAD_COLOR)
+                 for n in sorted(os.listdir(templates_dir))
+                 if n.lower().endswith(IMAGE_EXTS)}
+    return backpacks, templates
+
+
+def make_slots(cells):
+    return [BackpackSlot(i % GRID_COLS, i // GRID_COLS, 0, 0, cell, 1)
+            for i, cell in enumerate(cells)]
+
+
+def main():
+    if len(sys.argv) == 3:
+        backpacks, templates = load_corpus(sys.argv[1], sys.argv[2])
+    else:
+        backpacks, templates = synthetic_corpus()
+    tmp_dir = tempfile.mkdtemp()
+    paths = []
+    for name, tmpl in templates.items():
+        path = os.path.join(tmp_dir, os.path.splitext(name)[0] + '.png')
+        cv2.imwrite(path, tmpl)
+        paths.append(path)
+
+    on = BackpackReader(None, {'color_prefilter': True})
+    off = BackpackReader(None, {'color_prefilter': False})
+    t_on = t_off = 0.0
+    differ = lost = lookalike = filtered = cells_checked = 0
+    min_true_overlap = 1.0
+    try:
+        for cells in backpacks:
+            # 同一次扫描的格子给所有材料共用 (与 CraftEngine 相同), 签名只算一次
+            slots_on, slots_off = make_slots(cells), make_slots(cells)
+            scores = [[cv2.minMaxLoc(cv2.matchTemplate(
+                cell, template_store.load_bgr(path), cv2.TM_CCOEFF_NORMED))[1]
+                for path in paths] for cell in cells]
+            for i, path in enumerate(paths):
+                # 配方里的其他材料当竞争模板; 合成语料里相邻两个是同形状异色
+                competing = [paths[i ^ 1]] if i ^ 1 < len(paths) else []
+                start = time.perf_counter()
+                r_off = off.match_item(slots_off, path, 0, CONFIDENCE,
+                                       competing_image_paths=competing)
+                t_off += time.perf_counter() - start
+                start = time.perf_counter()
+                r_on = on.match_item(slots_on, path, 0, CONFIDENCE,
+                                     competing_image_paths=competing)
+                t_on += time.perf_counter() - start
+                pick_off = r_off[0] and (r_off[0].grid_x, r_off[0].grid_y)
+                pick_on = r_on[0] and (r_on[0].grid_x, r_on[0].grid_y)
+                differ += pick_off != pick_on
+
+                sig = on._template_signature(path, template_store.load_bgr(path))
+                for slot, cell_scores in zip(slots_on, scores):
+                    cells_checked += 1
+                    overlap = signature_overlap(slot.signature(), sig)
+                    rejected = overlap < backpack_reader.SIGNATURE_MIN_OVERLAP
+                    filtered += rejected
+                    if cell_scores[i] < CONFIDENCE:
+                        continue
+                    if cell_scores[i] == max(cell_scores):
+                        min_true_overlap = min(min_true_overlap, overlap)
+                        lost += rejected
+                    else:
+                        lookalike += rejected
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    runs = len(backpacks) * len(paths)
+    print(f"{len(backpacks)} 次扫描 x {len(paths)} 个模板, "
+          f"包含比例阈值 {backpack_reader.SIGNATURE_MIN_OVERLAP}")
+    print(f"结果不同 {differ}/{runs}, 该匹配却被预筛掉的格子 {lost}, "
+          f"本材料格子的最低包含比例 {min_true_overlap:.2f}")
+    print(f"同形异色过了阈值、被预筛提前排除的格子 {lookalike}")
+    print(f"预筛排除 {filtered}/{cells_checked} 格 "
+          f"({filtered / cells_checked * 100:.0f}%)")
+    print(f"match_item 关 {t_off / runs * 1000:.3f}ms  开 {t_on / runs * 1000:.3f}ms  "
+          f"加速 {t_off / t_on:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+背包数量识别: 逐格 recognize() vs 拼图 recognize_batch() 的结果一致性 + 耗时
+
+语料: 给出数字模板目录和录制的格子图目录 (扫描时 debug=True 写出的
+cell_*_digit.png, 可以是多次扫描的子目录) 就用它们; 否则生成合成模板
+(白字 / 青字两套, 青字会加载 G-R 通道模板) 和合成背包: 每次扫描 20 格,
+数字区域 30x20, 随机底色、1~3 位数、±2 像素偏移和噪声。
+
+每次扫描两种方式各识别一遍 (关掉数量缓存), 统计结果不同的格子数 (必须为 0)、
+每次扫描的 matchTemplate 调用次数和耗时。
+
+用法:
+    python benchmarks/bench_digit_batch.py [数字模板目录 格子图目录]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import digit_recognizer  # noqa: E402
+from digit_recognizer import DigitRecognizer  # noqa: E402
+
+SCANS = 30
+CELLS = 20
+
+
+def synthetic_templates(directory, color):
+    for digit in range(10):
+        img = Image.new('RGB', (10, 14), color=(40, 30, 30))
+        ImageDraw.Draw(img).text((1, 0), str(digit), fill=color)
+        img.save(os.path.join(directory, f'{digit}.png'))
+
+
+def synthetic_scans(color, seed=0):
+    rng = np.random.default_rng(seed)
+    scans = []
+    for _ in range(SCANS):
+        regions = []
+        for _ in range(CELLS):
+            bg = tuple(int(v) for v in rng.integers(20, 70, 3))
+            img = Image.new('RGB', (30, 20), color=bg)
+            ImageDraw.Draw(img).text(
+                (int(rng.integers(2, 8)), int(rng.integers(1, 5))),
+                str(int(rng.integers(1, 999))), fill=color)
+            region = np.asarray(img)[:, :, ::-1]
+            noise = rng.integers(-5, 6, region.shape)
+            regions.append(np.clip(region.astype(int) + noise, 0, 255).astype(np.uint8))
+        scans.append(regions)
+    return scans
+
+
+def load_scans(cells_dir):
+    scans = []
+    for root, _, names in sorted(os.walk(cells_dir)):
+        regions = [cv2.imread(os.path.join(root, n), cv2.IMREAD_COLOR)
+                   for n in sorted(names)
+                   if n.startswith('cell_') and n.endswith('_digit.png')]
+        if regions:
+            scans.append(regions)
+    return scans
+
+
+def run(name, recognizer, scans):
+    t_cell = t_batch = 0.0
+    differ = found = total = 0
+    with mock.patch.object(digit_recognizer.cv2, 'matchTemplate',
+                           wraps=cv2.matchTemplate) as mt:
+        for regions in scans:
+            start = time.perf_counter()
+            expected = [recognizer.recognize(r) for r in regions]
+            t_cell += time.perf_counter() - start
+            start = time.perf_counter()
+            got = recognizer.recognize_batch(regions)
+            t_batch += time.perf_counter() - start
+            differ += sum(a != b for a, b in zip(expected, got))
+            found += sum(q is not None for q in expected)
+            total += len(regions)
+        calls = mt.call_count
+    # 每次扫描两种方式的调用次数: 逐格的数得出, 总数减去它就是拼图的
+    per_cell_calls = sum(
+        len(recognizer.templates)
+        + (len(recognizer.templates_gr) if r.ndim == 3 else 0)
+        for regions in scans for r in regions)
+    n = len(scans)
+    print(f"{name}: {n} 次扫描 {total} 格, 识别出 {found} 格, 结果不同 {differ}")
+    print(f"  matchTemplate/扫描  逐格 {per_cell_calls / n:.0f}  "
+          f"拼图 {(calls - per_cell_calls) / n:.0f}")
+    print(f"  耗时/扫描  逐格 {t_cell / n * 1000:.2f}ms  "
+          f"拼图 {t_batch / n * 1000:.2f}ms  加速 {t_cell / t_batch:.1f}x")
+
+
+def main():
+    if len(sys.argv) == 3:
+        run(sys.argv[1], DigitRecognizer(sys.argv[1], cache_size=0),
+            load_scans(sys.argv[2]))
+        return
+    for name, color in (('白字模板', (255, 255, 255)), ('青字模板', (0, 255, 255))):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            synthetic_templates(tmp_dir, color)
+            run(name, DigitRecognizer(tmp_dir, cache_size=0), synthetic_scans(color))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
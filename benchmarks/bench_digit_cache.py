@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+背包数量缓存: 模拟连续制造时的扫描, 统计缓存命中率、结果一致性和每次扫描耗时
+
+合成背包 20 格 (青字模板, 含 G-R 通道), 每格的数字区域只由数量决定
+(同一格同一数量画出来的像素完全相同, 与游戏静止画面一致)。
+每轮制造消耗 2~3 种材料、成品格数量 +1, 每轮扫描两次 (放材料前的
+检查 + 选材料), 带缓存 / 不带缓存的识别器各跑一遍。
+--jitter 给每次扫描加 ±1 的噪声, 模拟画面有动态效果: 此时缓存应该
+几乎不命中, 也不能给出错误结果。
+
+用法:
+    python benchmarks/bench_digit_cache.py [--rounds 30] [--jitter]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_digit_batch import synthetic_templates  # noqa: E402
+from digit_recognizer import DigitRecognizer  # noqa: E402
+
+CELLS = 20
+CYAN = (0, 255, 255)
+
+
+def draw_region(cell, quantity):
+    bg = ((cell * 37) % 50 + 20, (cell * 53) % 50 + 20, (cell * 71) % 50 + 20)
+    img = Image.new('RGB', (30, 20), color=bg)
+    ImageDraw.Draw(img).text((3 + cell % 4, 2 + cell % 3), str(quantity), fill=CYAN)
+    region = np.asarray(img)[:, :, ::-1].astype(int)
+    noise = np.random.default_rng(cell * 1000 + quantity).integers(-5, 6, region.shape)
+    return np.clip(region + noise, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--jitter', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    quantities = [int(q) for q in rng.integers(20, 999, CELLS)]
+    product = CELLS - 1
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        synthetic_templates(tmp_dir, CYAN)
+        cached = DigitRecognizer(tmp_dir, path_policy='gray_first')
+        plain = DigitRecognizer(tmp_dir, path_policy='gray_first', cache_size=0)
+        t_cached = t_plain = 0.0
+        differ = wrong = scans = 0
+        for _ in range(args.rounds):
+            for _ in range(2):
+                regions = [draw_region(i, q) for i, q in enumerate(quantities)]
+                if args.jitter:
+                    regions = [np.clip(r.astype(int) + rng.integers(-1, 2, r.shape),
+                                       0, 255).astype(np.uint8) for r in regions]
+                start = time.perf_counter()
+                a = cached.recognize_batch(regions)
+                t_cached += time.perf_counter() - start
+                start = time.perf_counter()
+                b = plain.recognize_batch(regions)
+                t_plain += time.perf_counter() - start
+                differ += sum(x != y for x, y in zip(a, b))
+                wrong += sum(x != q for x, q in zip(a, quantities))
+                scans += 1
+            for cell in rng.choice(CELLS - 1, int(rng.integers(2, 4)), replace=False):
+                quantities[cell] = max(1, quantities[cell] - int(rng.integers(1, 4)))
+            quantities[product] += 1
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    looked = cached.cache_hits + cached.cache_misses
+    print(f"{args.rounds} 轮制造 {scans} 次扫描 x {CELLS} 格"
+          f"{' (每次扫描加噪声)' if args.jitter else ''}")
+    print(f"缓存命中 {cached.cache_hits}/{looked} "
+          f"({cached.cache_hits / looked * 100:.0f}%), "
+          f"与不缓存结果不同 {differ} 格, 识别错误 {wrong} 格")
+    print(f"耗时/扫描  不缓存 {t_plain / scans * 1000:.2f}ms  "
+          f"缓存 {t_cached / scans * 1000:.2f}ms  加速 {t_plain / t_cached:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
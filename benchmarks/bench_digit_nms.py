@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数字匹配去重: 逐点收集 + O(n²) 比较 (原实现) vs 按列取最大值 + numpy 一维 NMS
+
+语料同 bench_digit_batch.py: 给出数字模板目录和录制的格子图目录
+(cell_*_digit.png) 就用它们, 否则用合成模板和合成格子; 另外每格再加一份
+强噪声版本, 模拟低阈值下大量过阈值点的情形。
+每格先算好各数字模板的结果图, 再在不同阈值下两种去重各跑一遍, 统计
+过阈值点数、结果不同的格子数 (必须为 0) 和去重耗时。
+
+用法:
+    python benchmarks/bench_digit_nms.py [数字模板目录 格子图目录]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_digit_batch import load_scans, synthetic_scans, synthetic_templates  # noqa: E402
+from digit_recognizer import DigitRecognizer  # noqa: E402
+
+CONFIDENCES = (0.3, 0.45, 0.6, 0.8)
+
+
+def pointwise_select(results, templates, confidence):
+    """原实现"""
+    widths = [t.shape[1] for t in templates.values()]
+    min_spacing = sum(widths) / len(widths) * 0.5
+    all_matches = []
+    for digit, result in results.items():
+        locations = np.where(result >= confidence)
+        for idx in range(len(locations[0])):
+            pt_x, pt_y = locations[1][idx], locations[0][idx]
+            all_matches.append((pt_x, digit, float(result[pt_y, pt_x])))
+    if not all_matches:
+        return []
+    all_matches.sort(key=lambda m: (-m[2]))
+    selected = []
+    for x, digit, conf in all_matches:
+        if not any(abs(x - sx) < min_spacing for sx, _, _ in selected):
+            selected.append((x, digit, conf))
+    selected.sort(key=lambda m: m[0])
+    return selected
+
+
+def score_maps(recognizer, region):
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+    padded = recognizer._pad_image(recognizer._clahe.apply(gray))
+    return {d: cv2.matchTemplate(padded, t, cv2.TM_CCOEFF_NORMED)
+            for d, t in recognizer.templates.items()
+            if t.shape[0] <= padded.shape[0] and t.shape[1] <= padded.shape[1]}
+
+
+def main():
+    tmp_dir = None
+    if len(sys.argv) == 3:
+        recognizer = DigitRecognizer(sys.argv[1])
+        regions = [r for scan in load_scans(sys.argv[2]) for r in scan]
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        synthetic_templates(tmp_dir, (255, 255, 255))
+        recognizer = DigitRecognizer(tmp_dir)
+        regions = [r for scan in synthetic_scans((255, 255, 255))[:10] for r in scan]
+    rng = np.random.default_rng(3)
+    regions += [np.clip(r.astype(int) + rng.integers(-60, 61, r.shape), 0, 255)
+                .astype(np.uint8) for r in regions]
+    maps = [score_maps(recognizer, r) for r in regions]
+    templates = recognizer.templates
+    print(f"{len(regions)} 格 (一半加强噪声), {len(templates)} 个数字模板")
+    print(f"{'阈值':>6}{'过阈值点/格':>12}{'原实现':>10}{'向量化':>10}{'加速':>8}{'不同':>6}")
+    try:
+        for confidence in CONFIDENCES:
+            t_old = t_new = 0.0
+            points = differ = 0
+            for results in maps:
+                points += sum(int((r >= confidence).sum()) for r in results.values())
+                start = time.perf_counter()
+                old = pointwise_select(results, templates, confidence)
+                t_old += time.perf_counter() - start
+                start = time.perf_counter()
+                new = recognizer._select_matches(results, templates, confidence)
+                t_new += time.perf_counter() - start
+                differ += [(int(x), d, c) for x, d, c in old] != new
+            n = len(maps)
+            print(f"{confidence:>6.2f}{points / n:>12.0f}{t_old / n * 1e6:>8.0f}us"
+                  f"{t_new / n * 1e6:>8.0f}us{t_old / t_new:>7.1f}x{differ:>6}")
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+数字识别路径策略: 'both' (灰度和 G-R 都跑) vs 'gray_first' (灰度先行, 按学到的
+下限跳过 G-R) 在带标注语料上的准确率、路径使用次数和耗时
+
+语料: 给出数字模板目录和带标注的数字区域图目录就用它们; 标注写在文件名里,
+"<数量>_任意.png" (如把扫描时 debug=True 写出的 cell_*_digit.png 按实际数量
+改名), 子目录当作一次扫描。否则生成青字合成模板和合成背包: 一部分格子是
+深色底 (灰度就能认), 一部分是与青字亮度接近的暖色底 (灰度对比度很低,
+要靠 G-R 通道)。
+
+两种策略各用一个新的识别器按扫描顺序跑 recognize_batch, 统计准确率、
+两者结果不同的格子数、只跑灰度 / 两条路径都跑的格子数和每次扫描耗时。
+
+用法:
+    python benchmarks/bench_digit_paths.py [数字模板目录 标注图目录]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_digit_batch import synthetic_templates  # noqa: E402
+from digit_recognizer import DigitRecognizer  # noqa: E402
+
+SCANS = 60
+CELLS = 20
+CYAN = (0, 255, 255)
+
+
+def synthetic_labeled(seed=0, color=CYAN):
+    rng = np.random.default_rng(seed)
+    scans = []
+    for _ in range(SCANS):
+        scan = []
+        for _ in range(CELLS):
+            if rng.random() < 0.2:
+                # 暖色底, 灰度亮度与青字接近
+                bg = (int(rng.integers(190, 215)), int(rng.integers(160, 180)),
+                      int(rng.integers(140, 170)))
+            else:
+                bg = tuple(int(v) for v in rng.integers(20, 70, 3))
+            label = int(rng.integers(1, 999))
+            img = Image.new('RGB', (30, 20), color=bg)
+            ImageDraw.Draw(img).text(
+                (int(rng.integers(2, 8)), int(rng.integers(1, 5))),
+                str(label), fill=color)
+            region = np.asarray(img)[:, :, ::-1]
+            noise = rng.integers(-5, 6, region.shape)
+            region = np.clip(region.astype(int) + noise, 0, 255).astype(np.uint8)
+            scan.append((region, label))
+        scans.append(scan)
+    return scans
+
+
+def load_labeled(directory):
+    scans = []
+    for root, _, names in sorted(os.walk(directory)):
+        scan = []
+        for name in sorted(names):
+            head = name.split('_')[0]
+            if name.endswith('.png') and head.isdigit():
+                scan.append((cv2.imread(os.path.join(root, name), cv2.IMREAD_COLOR),
+                             int(head)))
+        if scan:
+            scans.append(scan)
+    return scans
+
+
+def run(templates_dir, scans):
+    results = {}
+    print(f"{len(scans)} 次扫描 {sum(len(s) for s in scans)} 格")
+    print(f"{'策略':>12}{'准确率':>10}{'仅灰度':>8}{'两条路径':>10}"
+          f"{'G-R改变':>9}{'耗时/扫描':>12}")
+    for policy in ('both', 'gray_first'):
+        recognizer = DigitRecognizer(templates_dir, path_policy=policy,
+                                     cache_size=0)
+        got, elapsed = [], 0.0
+        for scan in scans:
+            start = time.perf_counter()
+            got += recognizer.recognize_batch([r for r, _ in scan])
+            elapsed += time.perf_counter() - start
+        labels = [label for scan in scans for _, label in scan]
+        correct = sum(a == b for a, b in zip(got, labels))
+        results[policy] = got
+        print(f"{policy:>12}{correct / len(labels) * 100:>9.1f}%"
+              f"{recognizer.gray_only:>8}{recognizer.both_paths:>10}"
+              f"{recognizer.gr_changed:>9}{elapsed / len(scans) * 1000:>10.2f}ms")
+    differ = sum(a != b for a, b in zip(results['both'], results['gray_first']))
+    print(f"两种策略结果不同 {differ} 格")
+
+
+def main():
+    if len(sys.argv) == 3:
+        run(sys.argv[1], load_labeled(sys.argv[2]))
+        return
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        synthetic_templates(tmp_dir, CYAN)
+        run(tmp_dir, synthetic_labeled())
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
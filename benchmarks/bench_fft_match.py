@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+频域 NCC vs cv2.matchTemplate(TM_CCOEFF_NORMED): 结果一致性 + 各尺寸耗时
+
+语料同 bench_pyramid_match.py: 给录制帧目录就用它, 否则用合成帧。
+每个模板尺寸随机截若干块有纹理的区域, 在整帧里找回来, 比较:
+    - 最佳位置相同、分数差 < 1e-4 才算一致;
+    - 空间域 / 频域 (模板频谱已缓存) / 频域且画面预处理共用 (match_many 的情形) 三种耗时;
+    - prefer_fft() 对该尺寸的选择。
+
+用法:
+    python benchmarks/bench_fft_match.py [录制帧目录]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np  # noqa: E402
+
+from bench_pyramid_match import load_frames, pick_templates, synthetic_frames  # noqa: E402
+import fft_match  # noqa: E402
+from matching import exhaustive_match  # noqa: E402
+
+SIZES = ((24, 16), (60, 25), (100, 40), (160, 60), (300, 100))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    frames = load_frames(sys.argv[1]) if len(sys.argv) > 1 else synthetic_frames()
+    rng = np.random.default_rng(1)
+    fh, fw = frames[0].shape[:2]
+    print(f"{len(frames)} 帧 {fw}x{fh}")
+    print(f"{'模板':>8}{'空间域':>10}{'频域':>10}{'共用画面':>10}"
+          f"{'加速':>8}{'一致':>8}{'自动选':>8}")
+    for w, h in SIZES:
+        t_cv = t_fft = t_shared = 0.0
+        agree = total = 0
+        for frame in frames:
+            shared = fft_match.FrameSpectra(frame)
+            for tmpl in pick_templates(frame, w, h, rng):
+                fft_match.fft_match(frame, tmpl, shared)    # 预热: 缓存模板频谱
+                (v_cv, loc_cv), dt = timed(lambda: exhaustive_match(frame, tmpl))
+                t_cv += dt
+                (v_fft, loc_fft), dt = timed(lambda: fft_match.fft_match(frame, tmpl))
+                t_fft += dt
+                _, dt = timed(lambda: fft_match.fft_match(frame, tmpl, shared))
+                t_shared += dt
+                total += 1
+                if loc_cv == loc_fft and abs(v_cv - v_fft) < 1e-4:
+                    agree += 1
+        chosen = '频域' if fft_match.prefer_fft(frames[0].shape, (h, w)) else '空间域'
+        print(f"{w:>4}x{h:<3}{t_cv / total * 1000:>9.2f}ms"
+              f"{t_fft / total * 1000:>9.2f}ms{t_shared / total * 1000:>9.2f}ms"
+              f"{t_cv / t_fft:>7.1f}x{agree:>5}/{total}{chosen:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+帧转换微基准: take_screenshot + np.array + cvtColor 旧路径 vs grab_bgr 新路径
+
+不依赖真实屏幕: 用一块随机 BGRX 缓冲区模拟 mss / BitBlt 返回的原始字节,
+只测"原始字节 → cv2 可用的 BGR 数组"这一段的耗时和分配量。
+
+用法:
+    python benchmarks/bench_grab_bgr.py [宽 高 次数]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def old_path(raw, w, h):
+    """旧: BGRX 字节 → PIL RGB → numpy RGB → numpy BGR"""
+    img = Image.frombytes('RGB', (w, h), raw, 'raw', 'BGRX')
+    rgb = np.array(img)
+    img.close()
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [w * h * 4, rgb.nbytes]
+
+
+def new_path(raw, w, h):
+    """新: BGRX 字节 → numpy 视图 (零拷贝) → numpy BGR"""
+    bgra = np.frombuffer(raw, dtype=np.uint8).reshape(h, w, 4)
+    return cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR), []
+
+
+def bench(fn, raw, w, h, rounds):
+    fn(raw, w, h)  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(raw, w, h)
+    per_frame = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    out, intermediates = fn(raw, w, h)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # PIL 的内部像素缓冲不经过 Python 分配器, tracemalloc 看不到,
+    # 所以额外按中间缓冲区尺寸累计一份
+    allocated = out.nbytes + sum(intermediates)
+    return per_frame, allocated, peak, out
+
+
+def main():
+    w, h, rounds = 800, 600, 200
+    if len(sys.argv) == 4:
+        w, h, rounds = (int(a) for a in sys.argv[1:])
+
+    rng = np.random.default_rng(0)
+    raw = rng.integers(0, 256, size=w * h * 4, dtype=np.uint8).tobytes()
+
+    t_old, a_old, p_old, out_old = bench(old_path, raw, w, h, rounds)
+    t_new, a_new, p_new, out_new = bench(new_path, raw, w, h, rounds)
+    assert np.array_equal(out_old, out_new), "两条路径结果不一致"
+
+    print(f"帧尺寸 {w}x{h}, {rounds} 次")
+    print(f"{'路径':<8}{'耗时/帧':>12}{'分配字节/帧':>16}{'tracemalloc峰值':>18}")
+    print(f"{'旧':<8}{t_old * 1000:>10.3f}ms{a_old:>16,}{p_old:>18,}")
+    print(f"{'新':<8}{t_new * 1000:>10.3f}ms{a_new:>16,}{p_new:>18,}")
+    print(f"加速 {t_old / t_new:.1f}x, 分配减少 {1 - a_new / a_old:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+mss 抓屏延迟基准: 每次新建 mss.mss() vs 线程内复用 (screenshot_util._mss_capture)
+
+需要一个可用的显示。Linux 上可以用虚拟帧缓冲跑:
+    xvfb-run -s "-screen 0 1280x800x24" python benchmarks/bench_mss_grab.py
+
+用法:
+    python benchmarks/bench_mss_grab.py [次数]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+import mss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import screenshot_util  # noqa: E402
+
+REGIONS = {
+    '数字条 30x20': (100, 100, 30, 20),
+    '背包网格 200x160': (100, 100, 200, 160),
+    '窗口 800x600': (0, 0, 800, 600),
+}
+
+
+def grab_fresh(region):
+    """旧实现: 每次截图都打开/关闭一个 mss 实例"""
+    left, top, width, height = region
+    with mss.mss() as sct:
+        shot = sct.grab(
+            {"left": left, "top": top, "width": width, "height": height})
+        return np.frombuffer(shot.raw, dtype=np.uint8).reshape(
+            shot.height, shot.width, 4)
+
+
+def grab_cached(region):
+    return screenshot_util._mss_capture(region)
+
+
+def measure(fn, region, rounds):
+    fn(region)  # 预热 (缓存路径在这里建好实例)
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(region)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"每项 {rounds} 次, 单位 ms (中位数 / p95)")
+    print(f"{'区域':<18}{'每次新建':>18}{'线程内复用':>18}{'加速':>8}")
+    for name, region in REGIONS.items():
+        fresh_med, fresh_p95 = measure(grab_fresh, region, rounds)
+        cached_med, cached_p95 = measure(grab_cached, region, rounds)
+        print(f"{name:<18}"
+              f"{fresh_med * 1000:>9.3f} / {fresh_p95 * 1000:<6.3f}"
+              f"{cached_med * 1000:>9.3f} / {cached_p95 * 1000:<6.3f}"
+              f"{fresh_med / cached_med:>7.1f}x")
+    screenshot_util.close_thread_capture()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+exists() 快速路径 (灰度缩小粗判) vs 原分辨率 BGR 判定: 结论一致性、复核率、耗时
+
+背景语料同 bench_pyramid_match.py。模拟"按钮还在不在"的轮询: 每帧每个尺寸
+画几个按钮 (色块 + 边框 + 文字) 当模板, 贴到背景的随机位置当"在屏上",
+原背景当"不在屏上", 两种 exists 各判一遍。
+同时打印粗判分数的分布 (在屏上的最低分 / 不在屏上的最高分),
+用来校准 matching.PRESENCE_BAND: 两类分数都应离阈值超过带宽, 才不必复核。
+
+用法:
+    python benchmarks/bench_presence.py [录制帧目录] [--threshold 0.7]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+
+from bench_pyramid_match import PER_FRAME, load_frames, synthetic_frames  # noqa: E402
+import matching  # noqa: E402
+import screenshot_util  # noqa: E402
+from capture_backends import SyntheticBackend  # noqa: E402
+
+SIZES = ((24, 16), (40, 24), (60, 25), (100, 40), (160, 60))
+
+
+def make_button(w, h, rng):
+    color = tuple(int(c) for c in rng.integers(0, 256, 3))
+    button = np.full((h, w, 3), color, np.uint8)
+    cv2.rectangle(button, (0, 0), (w - 1, h - 1), (255, 255, 255), 1)
+    cv2.putText(button, str(int(rng.integers(10, 99))), (w // 4, h * 3 // 4),
+                cv2.FONT_HERSHEY_SIMPLEX, h / 40, (20, 20, 20), 1)
+    return button
+
+
+def with_button(frame, button, rng):
+    fh, fw = frame.shape[:2]
+    h, w = button.shape[:2]
+    x, y = int(rng.integers(0, fw - w)), int(rng.integers(0, fh - h))
+    shown = frame.copy()
+    shown[y:y + h, x:x + w] = button
+    return shown
+
+
+def presence_score(frame, tmpl):
+    """与 Matcher._presence 相同的粗判分数"""
+    scale = matching.PRESENCE_SCALE
+    while scale > 1 and min(tmpl.shape[:2]) // scale < matching.PRESENCE_MIN_SIDE:
+        scale //= 2
+    return matching.exhaustive_match(matching._gray_small(frame, scale),
+                                     matching._gray_small(tmpl, scale))[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('frames', nargs='?')
+    parser.add_argument('--threshold', type=float, default=0.7)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames()
+    rng = np.random.default_rng(2)
+    current = [frames[0]]
+    screenshot_util.set_capture_backend(SyntheticBackend(lambda i, t: current[0]))
+    fh, fw = frames[0].shape[:2]
+    region = (0, 0, fw, fh)
+    print(f"{len(frames)} 帧 {fw}x{fh}, 阈值 {args.threshold}, "
+          f"灰度 1/{matching.PRESENCE_SCALE}, 带宽 ±{matching.PRESENCE_BAND}")
+    print(f"{'模板':>8}{'BGR':>10}{'快速':>10}{'加速':>8}{'一致':>9}{'复核':>8}"
+          f"{'在屏最低':>10}{'不在最高':>10}")
+    for w, h in SIZES:
+        t_full = t_fast = 0.0
+        agree = total = 0
+        low_present, high_absent = 1.0, -1.0
+        fast = matching.Matcher(remember=False)
+        full = matching.Matcher(remember=False, fast_exists=False)
+        for background in frames:
+            for _ in range(PER_FRAME):
+                tmpl = make_button(w, h, rng)
+                cases = ((with_button(background, tmpl, rng), True),
+                         (background, False))
+                for frame, present in cases:
+                    current[0] = frame
+                    start = time.perf_counter()
+                    a = full.exists(tmpl, region, args.threshold)
+                    t_full += time.perf_counter() - start
+                    start = time.perf_counter()
+                    b = fast.exists(tmpl, region, args.threshold)
+                    t_fast += time.perf_counter() - start
+                    total += 1
+                    agree += a == b
+                    score = presence_score(frame, tmpl)
+                    if present:
+                        low_present = min(low_present, score)
+                    else:
+                        high_absent = max(high_absent, score)
+        print(f"{w:>4}x{h:<3}{t_full / total * 1000:>9.2f}ms"
+              f"{t_fast / total * 1000:>9.2f}ms{t_full / t_fast:>7.1f}x"
+              f"{agree:>5}/{total}{fast.presence_escalations:>5}/{total}"
+              f"{low_present:>10.2f}{high_absent:>10.2f}")
+    screenshot_util.set_capture_backend(None)
+
+
+if __name__ == '__main__':
+    main()
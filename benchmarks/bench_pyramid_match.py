@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+金字塔粗到细匹配 vs 原分辨率穷举: 结果一致性 + 各模板尺寸的加速比
+
+语料: 给一个录制帧目录 (png/bmp/jpg, 可以直接用 ReplayBackend 的录像目录)
+就用它; 否则生成一组仿 UI 的合成帧 (平滑背景 + 随机色块 + 文字)。
+每帧每个尺寸随机截若干块有纹理的区域当模板, 在整帧里找回来:
+两种方法的最佳位置一致 (误差 ≤1 像素) 才算一致。
+
+用法:
+    python benchmarks/bench_pyramid_match.py [录制帧目录] [--scale 2|4]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from capture_backends import IMAGE_EXTS  # noqa: E402
+from matching import exhaustive_match, pyramid_match  # noqa: E402
+
+SIZES = ((24, 16), (40, 24), (60, 25), (100, 40), (160, 60))
+PER_FRAME = 4
+
+
+def synthetic_frames(count=6, w=800, h=600):
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        img = rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8)
+        img = cv2.resize(img, (w, h), interpolation=cv2.INTER_CUBIC)
+        for _ in range(40):
+            x, y = int(rng.integers(0, w - 80)), int(rng.integers(0, h - 40))
+            color = tuple(int(c) for c in rng.integers(0, 256, 3))
+            cv2.rectangle(img, (x, y), (x + int(rng.integers(20, 120)),
+                                        y + int(rng.integers(10, 50))), color, -1)
+            cv2.putText(img, str(int(rng.integers(0, 99999))), (x, y + 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+        frames.append(img)
+    return frames
+
+
+def load_frames(path):
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTS))
+    return [cv2.imread(os.path.join(path, n), cv2.IMREAD_COLOR) for n in names]
+
+
+def pick_templates(frame, w, h, rng):
+    fh, fw = frame.shape[:2]
+    picked = []
+    while len(picked) < PER_FRAME:
+        x, y = int(rng.integers(0, fw - w)), int(rng.integers(0, fh - h))
+        tmpl = frame[y:y + h, x:x + w]
+        if tmpl.std() > 20:
+            picked.append(tmpl.copy())
+    return picked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('frames', nargs='?')
+    parser.add_argument('--scale', type=int, default=2)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames()
+    rng = np.random.default_rng(1)
+    print(f"{len(frames)} 帧 {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"金字塔 1/{args.scale}")
+    print(f"{'模板':>8}{'穷举':>10}{'金字塔':>10}{'加速':>8}{'一致':>10}")
+    for w, h in SIZES:
+        t_full = t_pyr = 0.0
+        agree = total = 0
+        for frame in frames:
+            for tmpl in pick_templates(frame, w, h, rng):
+                start = time.perf_counter()
+                v_full, loc_full = exhaustive_match(frame, tmpl)
+                t_full += time.perf_counter() - start
+                start = time.perf_counter()
+                v_pyr, loc_pyr = pyramid_match(frame, tmpl, args.scale)
+                t_pyr += time.perf_counter() - start
+                total += 1
+                if (abs(loc_full[0] - loc_pyr[0]) <= 1
+                        and abs(loc_full[1] - loc_pyr[1]) <= 1):
+                    agree += 1
+        print(f"{w:>4}x{h:<3}{t_full / total * 1000:>9.2f}ms"
+              f"{t_pyr / total * 1000:>9.2f}ms{t_full / t_pyr:>7.1f}x"
+              f"{agree:>6}/{total}")
+
+
+if __name__ == '__main__':
+    main()
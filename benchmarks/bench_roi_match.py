@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+上次位置优先匹配的微基准: 整帧搜索 vs Matcher 记住位置后的小区域搜索
+
+用随机纹理模拟一帧游戏窗口, 在固定位置贴一个"按钮", 截出来当模板。
+每轮都是同一帧, 相当于按钮每轮出现在同一位置的理想情况。
+
+用法:
+    python benchmarks/bench_roi_match.py [窗口宽 高 按钮宽 高 次数]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from matching import Matcher  # noqa: E402
+
+
+def bench(matcher, tmpl, screen, region, rounds):
+    matcher.match(tmpl, region, screen=screen)  # 预热 (并让记位置的匹配器记住位置)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        m = matcher.match(tmpl, region, screen=screen)
+    return (time.perf_counter() - start) / rounds, m
+
+
+def main():
+    w, h, bw, bh, rounds = 800, 600, 60, 25, 200
+    if len(sys.argv) == 6:
+        w, h, bw, bh, rounds = (int(a) for a in sys.argv[1:])
+
+    rng = np.random.default_rng(0)
+    screen = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    bx, by = w * 2 // 3, h * 3 // 4
+    tmpl = screen[by:by + bh, bx:bx + bw].copy()
+    region = (0, 0, w, h)
+
+    t_full, m_full = bench(Matcher(remember=False), tmpl, screen, region, rounds)
+    remembering = Matcher()
+    t_roi, m_roi = bench(remembering, tmpl, screen, region, rounds)
+    assert m_full.box == m_roi.box, "两种搜索结果位置不一致"
+
+    print(f"窗口 {w}x{h}, 模板 {bw}x{bh}, {rounds} 次")
+    print(f"整帧搜索     {t_full * 1000:8.3f}ms/次")
+    print(f"上次位置附近 {t_roi * 1000:8.3f}ms/次  "
+          f"(命中 {remembering.roi_hits}/{remembering.roi_hits + remembering.roi_misses})")
+    print(f"加速 {t_full / t_roi:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
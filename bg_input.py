@@ -18,6 +18,8 @@ import time
 import ctypes
 import ctypes.wintypes
 
+import screenshot_util
+
 user32 = ctypes.windll.user32
 
 WM_MOUSEMOVE = 0x0200
@@ -90,6 +92,8 @@ def _pack_lparam(x, y):
 def _post(hwnd, msg, wparam, lparam):
     # PostMessage lparam 必须是有符号 LPARAM, 负客户区坐标要保留低 32 位
     user32.PostMessageW(hwnd, msg, wparam, ctypes.c_long(lparam & 0xFFFFFFFF).value)
+    # 输入之后画面会变, 之前缓存的整窗口帧不能再用
+    screenshot_util.invalidate_frame_cache()
 
 
 def _key_lparam_down(vk, repeat=1):
@@ -92,6 +92,12 @@ a = Analysis(
         'digit_recognizer',
         'hotkey_manager',
         'screenshot_util',
+        'capture_stream',
+        'capture_backends',
+        'template_store',
+        'matching',
+        'fft_match',
+        'digit_segmenter',
         'bg_input',
         'mss',
         'win32gui',
@@ -194,6 +200,12 @@ def build_exe():
             "--hidden-import=digit_recognizer",
             "--hidden-import=hotkey_manager",
             "--hidden-import=screenshot_util",
+            "--hidden-import=capture_stream",
+            "--hidden-import=capture_backends",
+            "--hidden-import=template_store",
+            "--hidden-import=matching",
+            "--hidden-import=fft_match",
+            "--hidden-import=digit_segmenter",
             "--hidden-import=bg_input",
             "--hidden-import=mss",
             "--hidden-import=win32gui",
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+可替换的截图后端
+
+screenshot_util.grab_bgr / take_screenshot 最终都走当前后端的
+grab_bgra(region, fresh)。除了默认的桌面后端 (BitBlt + mss) 之外:
+
+    ReplayBackend     从一个图片目录或视频文件回放录好的整屏画面
+    SyntheticBackend  由脚本逐帧生成画面
+
+两者都把"屏幕"看作原点在 (0, 0) 的整帧图像, region 按屏幕坐标直接从中切出,
+所以同一套识别代码不需要游戏、不需要显示器就能在 Linux 上跑基准和回归。
+
+选择方式 (环境变量优先于设置项 capture_backend):
+    desktop
+    replay:<目录或视频>[@timestamp]
+    synthetic:<脚本.py>        脚本需定义 render(index, elapsed) → BGR/BGRA/灰度图
+"""
+
+import os
+import runpy
+import time
+
+import cv2
+import numpy as np
+
+import screenshot_util
+from screenshot_util import CAPTURE_BACKEND_ENV, DesktopBackend, window_crop
+
+IMAGE_EXTS = ('.png', '.bmp', '.jpg', '.jpeg')
+REPLAY_MODES = ('sequence', 'timestamp')
+
+
+def _to_bgra(image):
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    return image
+
+
+def _crop_screen(frame, region):
+    """按屏幕坐标 region 从原点 (0, 0) 的整帧中切出。
+
+    部分越出画面时越界部分补黑 (与 mss 截到屏幕外一样), 结果总是 region
+    的大小, 左上角对应 region[:2], 调用方按 region 原点换算坐标不会错位;
+    完全落在画面外时报错 (桌面后端会退回整屏截图, 回放画面之外没有东西可截)"""
+    if region is None:
+        return frame
+    h, w = frame.shape[:2]
+    c = window_crop(region, (0, 0, w, h))
+    if c is None:
+        raise ValueError(f"截图区域 {tuple(region)} 不在画面 {w}x{h} 范围内")
+    x, y, cw, ch = c
+    crop = frame[y:y + ch, x:x + cw]
+    left, top, width, height = region
+    if (cw, ch) == (width, height):
+        return crop
+    pad_left, pad_top = x - left, y - top
+    return cv2.copyMakeBorder(crop, pad_top, height - ch - pad_top,
+                              pad_left, width - cw - pad_left,
+                              cv2.BORDER_CONSTANT, value=0)
+
+
+class ReplayBackend:
+    """回放录好的画面
+
+    mode='sequence': 每次截图取下一帧, 结果与调用时机无关, 适合回归测试;
+    mode='timestamp': 按第一次截图以来经过的时间选帧, 还原录制时的节奏。
+
+    目录回放时文件按名字排序; 文件名 (不含扩展名) 是整数时视为毫秒时间戳,
+    否则按 fps 推算。视频的时间戳取自容器帧率。
+    """
+
+    name = 'replay'
+
+    def __init__(self, source, mode='sequence', fps=10.0, loop=True):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"未知的回放模式: {mode}")
+        self.source = source
+        self.mode = mode
+        self.loop = loop
+        self._video = None
+        self._video_pos = 0
+        self._cached = (None, None)     # (帧下标, BGRA)
+        self._index = 0
+        self._started = None
+
+        if os.path.isdir(source):
+            names = sorted(n for n in os.listdir(source)
+                           if n.lower().endswith(IMAGE_EXTS))
+            if not names:
+                raise ValueError(f"目录里没有图片: {source}")
+            self._files = [os.path.join(source, n) for n in names]
+            stems = [os.path.splitext(n)[0] for n in names]
+            if all(s.isdigit() for s in stems):
+                base = int(stems[0])
+                self._times = [(int(s) - base) / 1000.0 for s in stems]
+            else:
+                self._times = [i / fps for i in range(len(names))]
+        else:
+            self._files = None
+            self._video = cv2.VideoCapture(source)
+            if not self._video.isOpened():
+                raise ValueError(f"无法打开视频: {source}")
+            count = int(self._video.get(cv2.CAP_PROP_FRAME_COUNT))
+            video_fps = self._video.get(cv2.CAP_PROP_FPS) or fps
+            if count <= 0:
+                raise ValueError(f"视频没有帧: {source}")
+            self._times = [i / video_fps for i in range(count)]
+
+    def __len__(self):
+        return len(self._times)
+
+    def _next_index(self):
+        n = len(self._times)
+        if self.mode == 'sequence':
+            idx = self._index
+            self._index += 1
+        else:
+            now = time.monotonic()
+            if self._started is None:
+                self._started = now
+            elapsed = now - self._started
+            span = self._times[-1] + (self._times[1] - self._times[0]
+                                      if n > 1 else 0.0)
+            if self.loop and span > 0:
+                elapsed %= span
+            idx = int(np.searchsorted(self._times, elapsed, side='right')) - 1
+            idx = max(idx, 0)
+        if idx >= n:
+            idx = idx % n if self.loop else n - 1
+        return idx
+
+    def _read(self, idx):
+        if self._cached[0] == idx:
+            return self._cached[1]
+        if self._files is not None:
+            image = cv2.imread(self._files[idx], cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise ValueError(f"无法读取图片: {self._files[idx]}")
+        else:
+            if idx != self._video_pos:
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            ok, image = self._video.read()
+            if not ok:
+                raise ValueError(f"无法读取视频第 {idx} 帧: {self.source}")
+            self._video_pos = idx + 1
+        frame = _to_bgra(image)
+        self._cached = (idx, frame)
+        return frame
+
+    def grab_bgra(self, region, fresh=False):
+        return _crop_screen(self._read(self._next_index()), region)
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+
+class SyntheticBackend:
+    """由 render(index, elapsed) 逐帧生成整屏画面, 每次截图 index 加一"""
+
+    name = 'synthetic'
+
+    def __init__(self, render):
+        if isinstance(render, str):
+            render = runpy.run_path(render)['render']
+        self._render = render
+        self._index = 0
+        self._started = None
+
+    def grab_bgra(self, region, fresh=False):
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        image = self._render(self._index, now - self._started)
+        self._index += 1
+        return _crop_screen(_to_bgra(np.asarray(image)), region)
+
+    def close(self):
+        pass
+
+
+def create_backend(spec):
+    """按描述串创建后端, 格式见模块说明"""
+    spec = (spec or 'desktop').strip()
+    kind, _, arg = spec.partition(':')
+    kind = kind.lower()
+    if kind == 'desktop':
+        return DesktopBackend()
+    if kind == 'replay':
+        path, _, mode = arg.rpartition('@')
+        if not path or mode not in REPLAY_MODES:
+            path, mode = arg, 'sequence'
+        return ReplayBackend(path, mode=mode)
+    if kind == 'synthetic':
+        return SyntheticBackend(arg)
+    raise ValueError(f"未知的截图后端: {spec}")
+
+
+def configure(spec=None):
+    """按环境变量 / 设置项选择截图后端并安装到 screenshot_util, 返回该后端"""
+    backend = create_backend(os.environ.get(CAPTURE_BACKEND_ENV) or spec)
+    screenshot_util.set_capture_backend(backend)
+    return backend
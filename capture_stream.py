@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+后台采集线程
+
+默认情况下各引擎在自己的轮询循环里同步截图, 截图耗时直接叠加到每次判断上。
+开启后 (设置项 capture_stream_fps > 0), 每个绑定窗口起一个采集线程按 FPS
+上限持续抓整窗口, 写进预分配的环形缓冲区, 每帧带单调递增的序号和时间戳;
+引擎只需要取"最新帧"或"比序号 N 更新的帧"。
+
+同一窗口的采集线程按引用计数共享: CraftEngine 与 GetMaterialEngine
+同时运行时只有一个线程在抓屏。
+
+环形缓冲区的槽位循环使用, 但只回收没有交给过使用者的帧的数组; 交出去的帧
+(latest / wait_newer / wait_current / grab 返回的图像和切片) 采集线程不会再
+写, 绕回该槽位时另分配一块, 所以匹配耗时再长也不会读到正被覆盖的画面。
+"""
+
+import threading
+import time
+
+import screenshot_util
+from screenshot_util import grab_bgr, window_crop
+
+DEFAULT_SLOTS = 4
+
+_default_fps = 0.0
+_streams = {}          # {hwnd: CaptureStream}
+_streams_lock = threading.Lock()
+
+
+class Frame:
+    """环形缓冲区中的一帧"""
+
+    def __init__(self, seq, timestamp, epoch, rect, image):
+        self.seq = seq              # 单调递增序号, 从 1 开始
+        self.timestamp = timestamp  # time.time()
+        self.epoch = epoch          # 抓取时的 screenshot_util.frame_epoch()
+        self.rect = rect            # 抓取时的窗口 (left, top, width, height)
+        self.image = image          # numpy BGR, 整窗口
+        self.shared = False         # 交给过使用者后不再回收 image
+
+    def crop(self, region):
+        """切出屏幕坐标 region 对应的部分; 窗口位置变了或无交集返回 None"""
+        left, top, width, height = self.rect
+        if region is None:
+            return self.image
+        c = window_crop(region, (left, top, left + width, top + height))
+        if c is None:
+            return None
+        x, y, w, h = c
+        if (w, h) != tuple(region[2:]):
+            return None
+        return self.image[y:y + h, x:x + w]
+
+
+class CaptureStream:
+    """单个窗口的采集线程 + 环形帧缓冲"""
+
+    def __init__(self, rect_fn, fps=10.0, slots=DEFAULT_SLOTS, grab=None):
+        """
+        Args:
+            rect_fn: 返回窗口 (left, top, width, height) 的函数, 失败返回 None
+            fps: 采集帧率上限
+            slots: 环形缓冲区槽位数
+            grab: 截图函数 (region, out) → BGR 数组, 默认走 screenshot_util
+        """
+        self._rect_fn = rect_fn
+        self._interval = 1.0 / fps if fps > 0 else 0.0
+        self._grab = grab or (
+            lambda region, out: grab_bgr(region=region, fresh=True, out=out))
+        self._slots = [None] * slots
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._refs = 0
+
+    @property
+    def seq(self):
+        """最新一帧的序号, 还没有帧时为 0"""
+        return self._seq
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def latest(self):
+        """最新一帧, 还没有帧时返回 None"""
+        with self._cond:
+            return self._hand_out(self._frame_at(self._seq))
+
+    def wait_newer(self, seq, timeout=1.0):
+        """等待并返回序号大于 seq 的最新一帧; 超时 / 已停止返回 None"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self._seq > seq or self._stop_event.is_set(),
+                timeout)
+            if self._seq > seq:
+                return self._hand_out(self._frame_at(self._seq))
+            return None
+
+    def wait_current(self, timeout=1.0):
+        """等待一帧在最近一次输入之后开始抓取的帧 (epoch 追上当前纪元)。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                frame = self._frame_at(self._seq)
+                if (frame is not None
+                        and frame.epoch >= screenshot_util.frame_epoch()):
+                    return self._hand_out(frame)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop_event.is_set():
+                    return None
+                self._cond.wait(remaining)
+
+    @staticmethod
+    def _hand_out(frame):
+        """标记帧已交给使用者 (调用方持有 _cond), 其数组此后不再回收"""
+        if frame is not None:
+            frame.shared = True
+        return frame
+
+    def _frame_at(self, seq):
+        if seq <= 0:
+            return None
+        frame = self._slots[(seq - 1) % len(self._slots)]
+        if frame is None or frame.seq != seq:
+            return None
+        return frame
+
+    def _run(self):
+        try:
+            while not self._stop_event.is_set():
+                started = time.monotonic()
+                self._capture_one()
+                wait = self._interval - (time.monotonic() - started)
+                if wait > 0:
+                    self._stop_event.wait(wait)
+        finally:
+            screenshot_util.close_thread_capture()
+
+    def _capture_one(self):
+        rect = self._rect_fn()
+        if not rect:
+            return
+        epoch = screenshot_util.frame_epoch()
+        out = None
+        with self._cond:
+            idx = self._seq % len(self._slots)
+            old = self._slots[idx]
+            if old is not None and not old.shared:
+                # 先摘下槽位, 写入期间不会再被交出去
+                self._slots[idx] = None
+                out = old.image
+        try:
+            image = self._grab(rect, out)
+        except Exception:
+            return
+        if image is None:
+            return
+        with self._cond:
+            self._seq += 1
+            self._slots[idx] = Frame(
+                self._seq, time.time(), epoch, tuple(rect), image)
+            self._cond.notify_all()
+
+
+def set_default_fps(fps):
+    """设置后台采集帧率, 0 = 关闭 (各引擎回到同步截图)。"""
+    global _default_fps
+    _default_fps = max(0.0, float(fps or 0))
+
+
+def acquire(hwnd, rect_fn):
+    """为窗口取得 (必要时启动) 共享的采集线程; 未开启时返回 None。"""
+    if not hwnd or _default_fps <= 0:
+        return None
+    with _streams_lock:
+        stream = _streams.get(hwnd)
+        if stream is None:
+            stream = CaptureStream(rect_fn, fps=_default_fps)
+            _streams[hwnd] = stream
+            stream.start()
+        stream._refs += 1
+        return stream
+
+
+def release(stream):
+    """归还 acquire() 得到的采集线程, 最后一个使用者归还时停止线程。"""
+    if stream is None:
+        return
+    with _streams_lock:
+        stream._refs -= 1
+        if stream._refs > 0:
+            return
+        for hwnd, s in list(_streams.items()):
+            if s is stream:
+                del _streams[hwnd]
+    stream.stop()
+
+
+def grab(stream, region, timeout=1.0):
+    """从采集线程取 region 的 BGR 图像 (需是最近一次输入之后的帧);
+    未开启采集线程 / 等不到合适的帧时回退到同步 grab_bgr。"""
+    if stream is not None:
+        frame = stream.wait_current(timeout)
+        if frame is not None:
+            image = frame.crop(region)
+            if image is not None:
+                return image
+    return grab_bgr(region=region)
@@ -9,11 +9,9 @@
 import os
 import time
 import threading
-import cv2
-import numpy as np
-from PIL import Image
+import capture_stream
+import matching
 import screenshot_util
-from screenshot_util import take_screenshot
 import bg_input
 
 
@@ -36,6 +34,8 @@ class CraftEngine:
         self.success_count = 0
         self.fail_count = 0
         self._thread = None
+        self._stream = None
+        self._matcher = None
 
     def start(self, recipe, settings):
         """启动制造循环
@@ -71,7 +71,17 @@ class CraftEngine:
 
     def _craft_loop(self, recipe, settings):
         """制造主循环"""
-        screenshot_util.set_capture_hwnd(self.window_manager.hwnd)
+        bound_hwnd = screenshot_util.acquire_capture_hwnd(
+            self.window_manager.hwnd)
+        self._stream = capture_stream.acquire(
+            self.window_manager.hwnd, self.window_manager.get_window_rect)
+        # 找/点按钮前等黑帧过去; 轮询完成/执行按钮时绝大多数帧和上一帧相同,
+        # 画面未变就复用上次匹配结果
+        self._matcher = matching.Matcher(
+            self._stream, settle=True, skip_unchanged=True,
+            stop_check=self._check_stop)
+        self.backpack_reader.digit_recognizer.reset_stats()
+        capture_run = screenshot_util.begin_capture_run()
         try:
             materials = recipe['materials']
             craft_time = recipe.get('craft_time', 10.0)
@@ -82,6 +92,8 @@ class CraftEngine:
             click_interval = settings.get('click_interval', 100) / 1000.0
             organize_button_path = settings.get('organize_button_image')
             recipe_dir = settings.get('recipe_dir', '')
+            screenshot_util.set_frame_cache_ttl(
+                settings.get('frame_cache_ms', 30) / 1000.0)
 
             while not self._check_stop():
                 # 1. 检查窗口有效性
@@ -146,12 +158,17 @@ class CraftEngine:
                         if not window_rect:
                             self._log("错误: 无法获取窗口坐标")
                             break
-                        # 重选前再扫一次残留的制造完成按钮 (无限重试 = 无限补救机会)
+                        # 重选前再扫一次残留的制造完成按钮 (无限重试 = 无限补救机会);
+                        # 残留按钮和开始制造按钮在同一帧里一起匹配
+                        stuck, button_visible = self._scan_buttons(
+                            completion_image_path, execute_button_path,
+                            window_rect)
                         if self._try_clear_stuck_completion_button(
-                                completion_image_path, window_rect):
+                                completion_image_path, window_rect,
+                                found=stuck):
+                            button_visible = False
                             continue
-                        if self._find_template(execute_button_path, window_rect):
-                            button_visible = True
+                        if button_visible:
                             break
                         self._log("未找到开始制造按钮，重新选择材料...")
                         if not self._try_select_and_place_materials(
@@ -199,12 +216,11 @@ class CraftEngine:
                             self._click_template(completion_image_path, window_rect)
                             bg_input.post_move(hwnd, window_rect[0] + 50, window_rect[1] + 50)
                             time.sleep(0.5)
-                            # 连续 2 次都找不到才算真消失 (防黑帧/过渡帧 false-negative)
+                            # _find_template 只在非黑帧上判定, 黑帧/过渡帧会短间隔
+                            # 重抓, 所以一次找不到就是真消失 (不再固定 sleep 复查)
                             if not self._find_template(completion_image_path, window_rect):
-                                time.sleep(0.3)
-                                if not self._find_template(completion_image_path, window_rect):
-                                    self._log("确认: 完成按钮已消失")
-                                    break
+                                self._log("确认: 完成按钮已消失")
+                                break
                             self._log("完成按钮仍存在，重新点击...")
                         self.success_count += 1
                         time.sleep(1.0)  # 等待画面恢复到背包界面
@@ -226,8 +242,19 @@ class CraftEngine:
         except Exception as e:
             self._log(f"制造出错: {str(e)}")
         finally:
-            screenshot_util.set_capture_hwnd(None)
+            capture_stream.release(self._stream)
+            self._stream = None
+            screenshot_util.release_capture_hwnd(bound_hwnd)
+            screenshot_util.close_thread_capture()
             self.is_running = False
+            for line in screenshot_util.end_capture_run(capture_run):
+                self._log(line)
+            summary = self._matcher.summary()
+            if summary:
+                self._log(summary)
+            summary = self.backpack_reader.digit_recognizer.summary()
+            if summary:
+                self._log(summary)
             self._log("制造已停止")
 
     def _match_materials(self, slots, materials, all_mat_paths, recipe_dir):
@@ -373,22 +400,27 @@ class CraftEngine:
     STUCK_BUTTON_THRESHOLD = 0.9
 
     def _try_clear_stuck_completion_button(self, completion_image_path,
-                                            window_rect):
+                                            window_rect, found=None):
         """如果检测到残留的"制造完成"按钮, 点一下并 sleep 等画面恢复。
 
         步骤 9 的双次确认仍可能因连续黑帧 / 长动画 false-negative 漏点,
         让游戏停在制作完成画面。本方法在每次选材前 (主循环顶部 + 7.5
         重选 while 内部) 再扫一次, 把残留状态点掉再继续。
 
+        Args:
+            found: 调用方已在同一帧里判定过时传入结果, 不再单独匹配
+
         Returns:
             bool: True = 找到并点了, 调用方应刷新 window_rect;
                   False = 按钮不在屏上 / 未配置 completion_image_path。
         """
         if not completion_image_path:
             return False
-        if not self._find_template(
+        if found is None:
+            found = self._find_template(
                 completion_image_path, window_rect,
-                threshold=self.STUCK_BUTTON_THRESHOLD):
+                threshold=self.STUCK_BUTTON_THRESHOLD)
+        if not found:
             return False
         self._log("检测到残留的制造完成按钮, 先点掉再继续...")
         hwnd = self.window_manager.hwnd
@@ -430,52 +462,35 @@ class CraftEngine:
         Returns:
             bool: 是否找到并点击
         """
-        screenshot = take_screenshot(region=window_rect)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
-
-        result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+        m = self._matcher.match(template_path, window_rect)
 
         name = os.path.basename(template_path)
-        if max_val >= 0.7:
-            th, tw = tmpl.shape[:2]
-            click_x = window_rect[0] + max_loc[0] + tw // 2
-            click_y = window_rect[1] + max_loc[1] + th // 2
-            self._log(f"[点击] {name} 置信度:{max_val:.2f} 坐标:({click_x},{click_y})")
+        if m.confidence >= 0.7:
+            self._log(f"[点击] {name} 置信度:{m.confidence:.2f} 坐标:({m.x},{m.y})")
             hwnd = self.window_manager.hwnd
             if long_press:
-                bg_input.post_long_press(hwnd, click_x, click_y,
+                bg_input.post_long_press(hwnd, m.x, m.y,
                                          pre_delay=pre_delay, hold_time=0.5)
             else:
-                bg_input.post_click(hwnd, click_x, click_y, pre_delay=pre_delay)
+                bg_input.post_click(hwnd, m.x, m.y, pre_delay=pre_delay)
             return True
-        self._log(f"[点击] {name} 未找到，最高置信度:{max_val:.2f}")
+        self._log(f"[点击] {name} 未找到，最高置信度:{m.confidence:.2f}")
         return False
 
     def _find_template(self, template_path, window_rect, threshold=0.7):
         """检查模板是否存在于窗口中（不点击）"""
-        screenshot = take_screenshot(region=window_rect)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
+        return self._matcher.exists(template_path, window_rect, threshold)
 
-        result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, _ = cv2.minMaxLoc(result)
-        return max_val >= threshold
+    def _scan_buttons(self, completion_image_path, execute_button_path,
+                      window_rect):
+        """同一帧里判定 (残留的制造完成按钮, 开始制造按钮) 是否在屏上"""
+        if not completion_image_path:
+            return False, self._find_template(execute_button_path, window_rect)
+        stuck, execute = self._matcher.match_many(
+            [completion_image_path, execute_button_path], window_rect,
+            threshold=[self.STUCK_BUTTON_THRESHOLD, 0.7])
+        return (stuck.confidence >= self.STUCK_BUTTON_THRESHOLD,
+                execute.confidence >= 0.7)
 
     def _wait_for_template(self, template_path, window_rect, timeout=30):
         """等待模板出现
@@ -488,28 +503,5 @@ class CraftEngine:
         Returns:
             bool: 是否在超时前找到
         """
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
-
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if self._check_stop():
-                return False
-
-            screenshot = take_screenshot(region=window_rect)
-            screen_np = np.array(screenshot)
-            screenshot.close()
-            screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-            result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(result)
-
-            if max_val >= 0.7:
-                return True
-
-            time.sleep(0.5)
-
-        return False
+        return self._matcher.wait_for(
+            template_path, window_rect, timeout=timeout) is not None
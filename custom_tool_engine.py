@@ -9,13 +9,11 @@
 
 import time
 import threading
-import cv2
-import numpy as np
-from PIL import Image
 
 import bg_input
+import capture_stream
+import matching
 import screenshot_util
-from screenshot_util import take_screenshot
 
 
 class CustomToolEngine:
@@ -25,6 +23,8 @@ class CustomToolEngine:
         self.should_stop = False
         self.is_running = False
         self._thread = None
+        self._stream = None
+        self._matcher = matching.Matcher()
         self._last_target = None
 
     def start(self, tool_data):
@@ -44,9 +44,14 @@ class CustomToolEngine:
             self.status_callback(message)
 
     def _run(self, tool_data):
-        screenshot_util.set_capture_hwnd(self.window_manager.hwnd)
+        bound_hwnd = screenshot_util.acquire_capture_hwnd(
+            self.window_manager.hwnd)
+        self._stream = capture_stream.acquire(
+            self.window_manager.hwnd, self.window_manager.get_window_rect)
+        self._matcher = matching.Matcher(self._stream)
         # 上一次实际定位过的屏幕坐标; 供 mouse 步骤 coord_mode='current' 使用
         self._last_target = None
+        capture_run = screenshot_util.begin_capture_run()
         try:
             if not self.window_manager.is_window_valid():
                 self._log("错误: 未绑定游戏窗口")
@@ -68,8 +73,16 @@ class CustomToolEngine:
         except Exception as e:
             self._log(f"自定义工具出错: {e}")
         finally:
-            screenshot_util.set_capture_hwnd(None)
+            capture_stream.release(self._stream)
+            self._stream = None
+            screenshot_util.release_capture_hwnd(bound_hwnd)
+            screenshot_util.close_thread_capture()
             self.is_running = False
+            for line in screenshot_util.end_capture_run(capture_run):
+                self._log(line)
+            summary = self._matcher.summary()
+            if summary:
+                self._log(summary)
             self._log("自定义工具已停止")
 
     def _execute_steps(self, steps):
@@ -182,28 +195,6 @@ class CustomToolEngine:
             time.sleep(0.05)
         return True
 
-    def _find_template(self, template_path, window_rect, threshold):
-        screenshot = take_screenshot(region=window_rect)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
-
-        result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-        if max_val >= threshold:
-            th, tw = tmpl.shape[:2]
-            cx = window_rect[0] + max_loc[0] + tw // 2
-            cy = window_rect[1] + max_loc[1] + th // 2
-            return (cx, cy, max_val)
-        return None
-
     _IMAGE_ACTION_MAP = {
         'click': bg_input.post_click,
         'double_click': bg_input.post_double_click,
@@ -242,9 +233,9 @@ class CustomToolEngine:
             return False
 
         # 首次尝试 + retry_seconds 内反复重试 (0 = 不重试, 只看一次)
-        pos = self._find_template(path, rect, threshold)
+        pos = self._matcher.find(path, rect, threshold)
         if pos:
-            tx, ty = pos[0] + ox, pos[1] + oy
+            tx, ty = pos.x + ox, pos.y + oy
             self._apply_image_action(tx, ty, on_found)
             self._log(f"  步骤{idx+1}: 图片找到 → {on_found} ({tx},{ty})")
             return True
@@ -258,9 +249,9 @@ class CustomToolEngine:
                 if not rect:
                     self._log(f"  步骤{idx+1}: 重试期间窗口失效, 停止")
                     return False
-                pos = self._find_template(path, rect, threshold)
+                pos = self._matcher.find(path, rect, threshold)
                 if pos:
-                    tx, ty = pos[0] + ox, pos[1] + oy
+                    tx, ty = pos.x + ox, pos.y + oy
                     self._apply_image_action(tx, ty, on_found)
                     self._log(
                         f"  步骤{idx+1}: 重试找到 → {on_found} ({tx},{ty})")
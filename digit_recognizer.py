@@ -4,26 +4,146 @@
 """
 数字识别模块
 使用0-9模板匹配识别背包物品数量
+
+背包一次扫描 20 格, recognize_batch() 把所有格子的数字区域拼成一张图,
+每个模板只匹配一次再切回各格, 结果与逐格 recognize() 相同。
+两轮制造之间大部分格子不变, 识别结果按数字区域像素的指纹缓存 (LRU),
+像素完全相同的区域直接返回上次的数量。
+
+识别引擎 (engine):
+    'template'    0-9 模板在整个区域上逐个做相关 (下面的路径策略只对它有效)
+    'projection'  二值化后按列投影切字, 每个字与归一化模板做一次最近邻比较,
+                  见 digit_segmenter.py
+
+路径策略 (path_policy):
+    'both'        灰度和 G-R 两条路径都跑, 再挑结果 (原行为)
+    'gray_first'  先跑灰度, 灰度结果的置信度够高、位数也学过时跳过 G-R;
+                  跳不跳由 PathGate 从两条都跑过的样本里学出来
 """
 
 import os
 import logging
+import zlib
+from collections import OrderedDict, deque
+
 import cv2
 import numpy as np
 from PIL import Image
 
+from digit_segmenter import ProjectionClassifier
+
 logger = logging.getLogger('digit_recognizer')
 
+# 批量识别拼图时各区域之间的间隔像素
+MOSAIC_GUTTER = 2
+
+# 数量缓存条数 (一次扫描 20 格, 够记住几轮制造里出现过的数字区域)
+QUANTITY_CACHE_SIZE = 256
+
+ENGINES = ('template', 'projection')
+PATH_POLICIES = ('both', 'gray_first')
+# 某个位数的灰度结果, 两条路径都跑过这么多次以后才可能单用灰度
+GATE_MIN_SAMPLES = 20
+# 灰度置信度要比该位数出现过分歧的最高灰度置信度再高出这么多
+GATE_MARGIN = 0.05
+# 还没出现过分歧的位数, 灰度置信度至少要这么高
+GATE_MIN_CONF = 0.7
+# 灰度结果相邻两位的间距超过通常间距 (学到的中位数) 的这么多倍, 视为中间漏了一位
+GATE_GAP_RATIO = 1.5
+# 学习数字间距时保留的最近样本数
+GATE_STEP_HISTORY = 200
+# 可以跳过 G-R 时, 每这么多次仍跑一次两条路径, 继续学习
+GATE_AUDIT_EVERY = 10
+
+
+class PathGate:
+    """灰度先行时判断能否跳过 G-R 路径
+
+    两条路径都跑过的样本里, 最终结果与灰度结果不同 (G-R 识别出更多位数
+    或置信度更高且读数不同) 时, 记下当时的灰度置信度, 按灰度结果的位数
+    分别保存最高值作为下限。灰度结果的位数样本足够, 且置信度高于该位数的
+    下限 + margin (没分歧过时为 min_conf) 时, 才只用灰度结果。
+    置信度反映不出中间漏认一位, 所以另外从一致的结果里学相邻两位的通常
+    间距, 灰度结果里间距明显偏大的不跳过。
+    """
+
+    def __init__(self, min_samples=GATE_MIN_SAMPLES, margin=GATE_MARGIN,
+                 audit_every=GATE_AUDIT_EVERY, min_conf=GATE_MIN_CONF):
+        self.min_samples = min_samples
+        self.margin = margin
+        self.min_conf = min_conf
+        self.audit_every = audit_every
+        self.samples = {}     # 位数 → 两条路径都跑过的次数
+        self.bounds = {}      # 位数 → 出现过分歧的最高灰度置信度
+        self.steps = deque(maxlen=GATE_STEP_HISTORY)   # 相邻两位的x间距
+        self._skippable = 0
+
+    @staticmethod
+    def _steps(selected):
+        return [b[0] - a[0] for a, b in zip(selected, selected[1:])]
+
+    def has_gap(self, selected):
+        """灰度匹配结果 [(x, digit, conf)] 里是否有明显偏大的间距"""
+        if not self.steps:
+            return False
+        max_step = float(np.median(self.steps)) * GATE_GAP_RATIO
+        return any(step > max_step for step in self._steps(selected))
+
+    def skip_gr(self, value, conf):
+        """灰度结果 (value, conf) 是否足以单独采用"""
+        if value is None:
+            return False
+        digits = len(str(value))
+        if self.samples.get(digits, 0) < self.min_samples:
+            return False
+        bound = self.bounds.get(digits)
+        if conf < (self.min_conf if bound is None else bound + self.margin):
+            return False
+        self._skippable += 1
+        return self._skippable % self.audit_every != 0
+
+    def learn(self, selected, value, conf, final):
+        """记录一次两条路径都跑过的结果; selected 为灰度匹配结果"""
+        if value is None:
+            return
+        digits = len(str(value))
+        self.samples[digits] = self.samples.get(digits, 0) + 1
+        if final != value:
+            self.bounds[digits] = max(self.bounds.get(digits, conf), conf)
+        else:
+            self.steps.extend(self._steps(selected))
+
 
 class DigitRecognizer:
     """数字识别器 — 模板匹配方式"""
 
-    def __init__(self, templates_dir='templates/digits'):
+    def __init__(self, templates_dir='templates/digits', path_policy='both',
+                 cache_size=QUANTITY_CACHE_SIZE, engine='template'):
+        if path_policy not in PATH_POLICIES:
+            raise ValueError(f"未知的数字识别路径策略: {path_policy}")
+        if engine not in ENGINES:
+            raise ValueError(f"未知的数字识别引擎: {engine}")
         self.templates_dir = templates_dir
         self.templates = {}       # {digit_int: CLAHE-enhanced gray numpy_array}
         self.templates_gr = {}    # {digit_int: CLAHE-enhanced G-R channel}
         self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
+        self.path_policy = path_policy
+        self.gate = PathGate()
+        # 各路径使用次数
+        self.gray_only = 0        # 只跑了灰度 (跳过 G-R 或非彩色图)
+        self.both_paths = 0       # 两条路径都跑了
+        self.gr_changed = 0       # 其中最终结果与灰度结果不同
+        self.projected = 0        # 投影分割引擎识别的次数
+        # 数量缓存: (尺寸, crc32, 置信度阈值) → (数量, 置信度); 0 表示不缓存
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.engine = engine
         self._load_templates()
+        self._projector = None
+        if engine == 'projection':
+            self._projector = ProjectionClassifier(self.templates)
 
     @staticmethod
     def _compute_gr_channel(bgr_image):
@@ -73,35 +193,105 @@ class DigitRecognizer:
             list: [(x_position, digit, confidence)] 按x排序
         """
         h, w = padded.shape
-        tmpl_widths = [t.shape[1] for t in templates.values()]
-        avg_tw = sum(tmpl_widths) / len(tmpl_widths) if tmpl_widths else 10
-
-        all_matches = []
+        results = {}
         for digit, tmpl in templates.items():
             th, tw = tmpl.shape
             if th > h or tw > w:
                 continue
-            result = cv2.matchTemplate(padded, tmpl, cv2.TM_CCOEFF_NORMED)
-            locations = np.where(result >= confidence)
-            for idx in range(len(locations[0])):
-                pt_x = locations[1][idx]
-                pt_y = locations[0][idx]
-                match_val = result[pt_y, pt_x]
-                all_matches.append((pt_x, digit, float(match_val)))
-
-        if not all_matches:
+            results[digit] = cv2.matchTemplate(padded, tmpl, cv2.TM_CCOEFF_NORMED)
+        return self._select_matches(results, templates, confidence)
+
+    def _select_matches(self, results, templates, confidence):
+        """各模板的结果图 {digit: result} → 去重后的 [(x, digit, conf)], 按x排序
+
+        去重只看x, 同一列上只有最高分的匹配可能被保留, 所以先把所有结果图
+        按列取最大值叠成 (数字数, 宽) 的数组, 每列只留一个候选, 再在 numpy
+        里做一维非极大值抑制。同分时的先后与逐点收集后稳定排序一致:
+        数字顺序、行、列。
+        """
+        tmpl_widths = [t.shape[1] for t in templates.values()]
+        avg_tw = sum(tmpl_widths) / len(tmpl_widths) if tmpl_widths else 10
+
+        results = {d: r for d, r in results.items() if r.size}
+        if not results:
+            return []
+        digits = list(results)
+        maps = list(results.values())
+        if len({r.shape for r in maps}) == 1:
+            stacked = np.stack(maps)
+        else:
+            # 模板尺寸不一时结果图大小不同, 补 -inf 对齐
+            h = max(r.shape[0] for r in maps)
+            w = max(r.shape[1] for r in maps)
+            stacked = np.full((len(maps), h, w), -np.inf, np.float32)
+            for i, r in enumerate(maps):
+                stacked[i, :r.shape[0], :r.shape[1]] = r
+        col_max = stacked.max(axis=1)
+
+        # 每列最高分的数字 (同分取靠前的数字)
+        best = col_max.argmax(axis=0)
+        xs = np.flatnonzero(col_max[best, np.arange(len(best))] >= confidence)
+        if not len(xs):
             return []
+        best = best[xs]
+        confs = col_max[best, xs]
+        rows = stacked[best, :, xs].argmax(axis=1)
 
         # 去重：在每个位置区间内保留最高置信度的匹配
         min_spacing = avg_tw * 0.5
-        all_matches.sort(key=lambda m: (-m[2]))
+        order = np.lexsort((xs, rows, best, -confs))
+        xs, best, confs = xs[order], best[order], confs[order]
+        suppressed = np.zeros(len(xs), bool)
         selected = []
-        for x, digit, conf in all_matches:
-            if not any(abs(x - sx) < min_spacing for sx, _, _ in selected):
-                selected.append((x, digit, conf))
+        while not suppressed.all():
+            i = int(np.argmin(suppressed))
+            selected.append((int(xs[i]), digits[best[i]], float(confs[i])))
+            suppressed |= np.abs(xs - xs[i]) < min_spacing
         selected.sort(key=lambda m: m[0])
         return selected
 
+    def _match_mosaic(self, padded_list, templates, confidence):
+        """把多张padded图拼成一张大图, 每个模板只 matchTemplate 一次,
+        再按各图的位置切回各自的结果图。
+
+        每张图占一个格位, 格位之间留 MOSAIC_GUTTER 像素的空隙; 只取模板窗口
+        完全落在某张图内的位置, 与逐张匹配得到的结果图同尺寸、同取值。
+
+        Returns:
+            list: 与 padded_list 对应的 _match_templates 结果
+        """
+        if not padded_list:
+            return []
+        slot_h = max(p.shape[0] for p in padded_list) + MOSAIC_GUTTER
+        slot_w = max(p.shape[1] for p in padded_list) + MOSAIC_GUTTER
+        cols = int(np.ceil(np.sqrt(len(padded_list))))
+        rows = (len(padded_list) + cols - 1) // cols
+        mosaic = np.zeros((rows * slot_h, cols * slot_w), np.uint8)
+        offsets = []
+        for i, padded in enumerate(padded_list):
+            oy, ox = (i // cols) * slot_h, (i % cols) * slot_w
+            mosaic[oy:oy + padded.shape[0], ox:ox + padded.shape[1]] = padded
+            offsets.append((oy, ox))
+
+        maps = {}
+        for digit, tmpl in templates.items():
+            th, tw = tmpl.shape
+            if th > slot_h or tw > slot_w:
+                continue
+            maps[digit] = cv2.matchTemplate(mosaic, tmpl, cv2.TM_CCOEFF_NORMED)
+
+        selected = []
+        for padded, (oy, ox) in zip(padded_list, offsets):
+            h, w = padded.shape
+            results = {}
+            for digit, result in maps.items():
+                th, tw = templates[digit].shape
+                if th > h or tw > w:
+                    continue
+                results[digit] = result[oy:oy + h - th + 1, ox:ox + w - tw + 1]
+            selected.append(self._select_matches(results, templates, confidence))
+        return selected
+
     def _decode_matches(self, selected):
         """将匹配结果解码为数字"""
         if not selected:
@@ -113,11 +303,39 @@ class DigitRecognizer:
         except ValueError:
             return None, 0.0
 
+    def _prepare_gray(self, region_image):
+        """灰度 + CLAHE增强并加边距
+
+        CLAHE按图分块, 必须逐张做; 批量识别只把之后的匹配合并。"""
+        if len(region_image.shape) == 3:
+            gray = cv2.cvtColor(region_image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = region_image.copy()
+        return self._pad_image(self._clahe.apply(gray))
+
+    def _prepare_gr(self, region_image):
+        """G-R通道 + CLAHE增强并加边距; 非彩色图或没有G-R模板时返回 None"""
+        if len(region_image.shape) != 3 or len(self.templates_gr) == 0:
+            return None
+        gr = self._compute_gr_channel(region_image)
+        return self._pad_image(self._clahe.apply(gr))
+
+    def _wants_gr(self, region_image, selected_gray):
+        """是否还要跑 G-R 路径"""
+        if len(region_image.shape) != 3 or len(self.templates_gr) == 0:
+            return False
+        if self.path_policy == 'both':
+            return True
+        if self.gate.has_gap(selected_gray):
+            return True
+        return not self.gate.skip_gr(*self._decode_matches(selected_gray))
+
     def recognize(self, region_image, confidence=0.6, debug_label=''):
         """识别图片区域中的数字
 
-        同时使用灰度匹配和G-R颜色通道匹配（突出青色数字），
-        选择识别位数更多或置信度更高的结果。
+        使用灰度匹配和G-R颜色通道匹配（突出青色数字），
+        选择识别位数更多或置信度更高的结果; 'gray_first' 策略下
+        灰度结果足够可信时不跑G-R。
         自动添加边距防止边缘数字被截断。
 
         Args:
@@ -130,30 +348,175 @@ class DigitRecognizer:
         """
         if len(self.templates) == 0:
             return None
-
-        is_color = len(region_image.shape) == 3
+        key = self._cache_key(region_image, confidence)
+        hit = self._cache_get(key, debug_label)
+        if hit is not None:
+            return hit[0]
+        if self._projector is not None:
+            return self._project(key, region_image, confidence, debug_label)
 
         # --- 方法1: 灰度 + CLAHE ---
-        if is_color:
-            gray = cv2.cvtColor(region_image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = region_image.copy()
-        gray = self._clahe.apply(gray)
-        padded_gray = self._pad_image(gray)
         selected_gray = self._match_templates(
-            padded_gray, self.templates, confidence)
-        result_gray, conf_gray = self._decode_matches(selected_gray)
-
+            self._prepare_gray(region_image), self.templates, confidence)
         # --- 方法2: G-R颜色通道 + CLAHE (仅彩色图) ---
-        result_gr, conf_gr = None, 0.0
-        selected_gr = []
-        if is_color and len(self.templates_gr) > 0:
-            gr = self._compute_gr_channel(region_image)
-            gr = self._clahe.apply(gr)
-            padded_gr = self._pad_image(gr)
+        selected_gr = None
+        if self._wants_gr(region_image, selected_gray):
             selected_gr = self._match_templates(
-                padded_gr, self.templates_gr, confidence)
-            result_gr, conf_gr = self._decode_matches(selected_gr)
+                self._prepare_gr(region_image), self.templates_gr, confidence)
+        return self._finish(key, selected_gray, selected_gr, debug_label)
+
+    def recognize_batch(self, regions, confidence=0.6, debug_labels=None):
+        """一次识别多个区域 (如背包全部格子的数字区域), 结果与逐个 recognize 相同
+
+        所有区域拼成一张带间隔的大图, 每个数字模板在灰度 / G-R 两张大图上
+        各只匹配一次 (逐格要 20 格 x 20 次), 再按格切回各自的结果。
+        'gray_first' 策略下只有需要 G-R 的格子进 G-R 拼图; 这一批的结果
+        在最后才用于学习, 所以与逐个 recognize 只在学习进度上有先后差别。
+
+        Args:
+            regions: numpy array 列表 (BGR 或灰度)
+            confidence: 匹配置信度阈值
+            debug_labels: 与 regions 对应的调试标签列表
+
+        Returns:
+            list: 每个区域的数字或 None
+        """
+        if len(self.templates) == 0:
+            return [None] * len(regions)
+        labels = debug_labels or [''] * len(regions)
+
+        # 缓存命中的格子不再识别
+        quantities = [None] * len(regions)
+        todo = []
+        for i, (region, label) in enumerate(zip(regions, labels)):
+            key = self._cache_key(region, confidence)
+            hit = self._cache_get(key, label)
+            if hit is not None:
+                quantities[i] = hit[0]
+            else:
+                todo.append((i, key))
+        if not todo:
+            return quantities
+        if self._projector is not None:
+            for i, key in todo:
+                quantities[i] = self._project(
+                    key, regions[i], confidence, labels[i])
+            return quantities
+        pending = [regions[i] for i, _ in todo]
+
+        all_gray = self._match_mosaic(
+            [self._prepare_gray(r) for r in pending], self.templates, confidence)
+        gr_idx = [j for j, (r, g) in enumerate(zip(pending, all_gray))
+                  if self._wants_gr(r, g)]
+        all_gr = [None] * len(pending)
+        for j, selected in zip(gr_idx, self._match_mosaic(
+                [self._prepare_gr(pending[j]) for j in gr_idx],
+                self.templates_gr, confidence)):
+            all_gr[j] = selected
+        for (i, key), g, gr in zip(todo, all_gray, all_gr):
+            quantities[i] = self._finish(key, g, gr, labels[i])
+        return quantities
+
+    def _finish(self, key, selected_gray, selected_gr, debug_label=''):
+        """选出最终数字, 记录路径统计、让 PathGate 学习并写入缓存
+
+        selected_gr 为 None 表示没跑 G-R 路径。"""
+        if selected_gr is None:
+            self.gray_only += 1
+            final, final_conf = self._choose(selected_gray, [], debug_label)
+        else:
+            final, final_conf = self._choose(
+                selected_gray, selected_gr, debug_label)
+            value, conf = self._decode_matches(selected_gray)
+            self.both_paths += 1
+            self.gr_changed += final != value
+            self.gate.learn(selected_gray, value, conf, final)
+        self._cache_put(key, (final, final_conf))
+        return final
+
+    def _project(self, key, region_image, confidence, debug_label=''):
+        """投影分割引擎: 灰度和G-R (彩色图) 里挑分得最开的通道切字识别"""
+        if len(region_image.shape) == 3:
+            channels = [cv2.cvtColor(region_image, cv2.COLOR_BGR2GRAY),
+                        self._compute_gr_channel(region_image)]
+        else:
+            channels = [region_image]
+        selected = self._projector.read(channels, confidence)
+        value, conf = self._decode_matches(selected)
+        self.projected += 1
+        if debug_label:
+            logger.info(
+                f'{debug_label} 投影分割: '
+                f'{[(d, f"{c:.2f}") for _, d, c in selected]} → {value}')
+        self._cache_put(key, (value, conf))
+        return value
+
+    # ── 数量缓存 ──
+
+    @staticmethod
+    def _cache_key(region_image, confidence):
+        if not region_image.flags.c_contiguous:
+            region_image = np.ascontiguousarray(region_image)
+        return region_image.shape, zlib.crc32(region_image), confidence
+
+    def _cache_get(self, key, debug_label=''):
+        """命中返回 (数量, 置信度), 否则 None"""
+        if not self.cache_size:
+            return None
+        entry = self._cache.get(key)
+        if entry is None:
+            self.cache_misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.cache_hits += 1
+        if debug_label:
+            logger.info(f'{debug_label} 缓存命中: {entry[0]} '
+                        f'(置信度 {entry[1]:.2f})')
+        return entry
+
+    def _cache_put(self, key, entry):
+        if not self.cache_size:
+            return
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self):
+        return {'gray_only': self.gray_only, 'both_paths': self.both_paths,
+                'gr_changed': self.gr_changed, 'projected': self.projected,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses}
+
+    def reset_stats(self):
+        """清零统计 (PathGate 学到的下限和数量缓存保留)"""
+        self.gray_only = self.both_paths = self.gr_changed = 0
+        self.projected = 0
+        self.cache_hits = self.cache_misses = 0
+
+    def summary(self):
+        """一行统计, 供扫描结束时写日志; 没识别过返回空串"""
+        total = (self.gray_only + self.both_paths + self.projected
+                 + self.cache_hits)
+        if not total:
+            return ''
+        parts = []
+        if self.projected:
+            parts.append(f"投影分割 {self.projected}")
+        if self.gray_only or self.both_paths:
+            parts.append(f"仅灰度 {self.gray_only}, "
+                         f"灰度+G-R {self.both_paths} "
+                         f"(G-R改变结果 {self.gr_changed})")
+        looked = self.cache_hits + self.cache_misses
+        if looked:
+            parts.append(f"缓存命中 {self.cache_hits}/{looked} "
+                         f"({self.cache_hits / looked * 100:.0f}%)")
+        return f"数量识别 {total}格: " + ', '.join(parts)
+
+    def _choose(self, selected_gray, selected_gr, debug_label=''):
+        """在灰度和G-R两种结果中选最终数字 → (数字, 置信度)"""
+        result_gray, conf_gray = self._decode_matches(selected_gray)
+        result_gr, conf_gr = self._decode_matches(selected_gr)
 
         # --- 选择最佳结果 ---
         # 优先选识别出更多位数的，位数相同选置信度高的
@@ -188,7 +551,7 @@ class DigitRecognizer:
             logger.info(
                 f'{debug_label} 最终({method}): {final}')
 
-        return final
+        return final, self._decode_matches(selected)[1]
 
     def is_loaded(self):
         """检查模板是否已加载"""
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+频域归一化互相关 (与 cv2.TM_CCOEFF_NORMED 同义)
+
+大模板在整窗口里找 (背包标题栏、整理按钮等) 时, 空间域 matchTemplate 很费时。
+这里把相关运算搬到频域:
+    - 模板去均值后按帧的 DFT 尺寸补零做 DFT, 结果按 (模板, 尺寸) 缓存;
+    - 每次调用只对画面做 DFT, 各通道频谱相乘累加后一次逆变换得到分子;
+    - 分母 (窗口内方差) 用积分图算, 与模板大小无关。
+画面的 DFT 和积分图由 FrameSpectra 持有, 同一帧匹配多个模板时共用。
+
+结果与 TM_CCOEFF_NORMED 一致到 float32 精度 (多通道时按所有通道合计),
+平坦窗口 (方差为 0) 的分数为 0。是否走这条路由 prefer_fft() 按尺寸决定。
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# 模板频谱缓存的字节上限 (每条约 帧宽 x 帧高 x 通道 x 8 字节, 整窗口一条就有
+# 几 MB), 与 TemplateStore 一样按 LRU 淘汰
+SPECTRA_CACHE_BYTES = 32 * 1024 * 1024
+# 模板面积至少这么大才考虑频域; 小模板空间域更快
+FFT_MIN_TEMPLATE_AREA = 32 * 32
+# 画面面积至少是模板的这么多倍; 否则结果图很小, 空间域更快
+FFT_MIN_AREA_RATIO = 8
+
+# {(id(模板), DFT 尺寸): (模板弱引用, [各通道频谱], 模板平方和, 字节数)}
+# 只弱引用模板, 缓存不会让已经不用的模板数组一直活着
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def prefer_fft(image_shape, tmpl_shape):
+    """按尺寸判断频域是否比 cv2.matchTemplate 划算"""
+    th, tw = tmpl_shape[:2]
+    ih, iw = image_shape[:2]
+    area = tw * th
+    return area >= FFT_MIN_TEMPLATE_AREA and iw * ih >= FFT_MIN_AREA_RATIO * area
+
+
+def _channels(image):
+    f = image.astype(np.float32)
+    return [f] if f.ndim == 2 else cv2.split(f)
+
+
+def _dft_shape(image_shape):
+    h, w = image_shape[:2]
+    return cv2.getOptimalDFTSize(h), cv2.getOptimalDFTSize(w)
+
+
+def _pad_dft(channel, shape):
+    h, w = channel.shape
+    padded = cv2.copyMakeBorder(channel, 0, shape[0] - h, 0, shape[1] - w,
+                                cv2.BORDER_CONSTANT, value=0)
+    # nonzeroRows 实测反而更慢, 不用
+    return cv2.dft(padded)
+
+
+def _template_spectra(tmpl, shape):
+    key = (id(tmpl), shape)
+    with _cache_lock:
+        entry = _cache.get(key)
+        # id 可能被回收后的新数组复用, 所以还要确认是同一个对象
+        if entry is not None and entry[0]() is tmpl:
+            _cache.move_to_end(key)
+            return entry[1], entry[2]
+    spectra = []
+    norm = 0.0
+    for c in _channels(tmpl):
+        c = c - float(c.mean())
+        norm += float((c.astype(np.float64) ** 2).sum())
+        spectra.append(_pad_dft(c, shape))
+    _cache_put(key, (weakref.ref(tmpl), spectra, norm,
+                     sum(s.nbytes for s in spectra)))
+    return spectra, norm
+
+
+def _cache_put(key, entry):
+    global _cache_bytes
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[3]
+        _cache[key] = entry
+        _cache_bytes += entry[3]
+        # 至少保留刚放进来的这一条
+        while _cache_bytes > SPECTRA_CACHE_BYTES and len(_cache) > 1:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= evicted[3]
+
+
+def cache_bytes():
+    """模板频谱缓存当前占用的字节数"""
+    return _cache_bytes
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+class FrameSpectra:
+    """一帧画面的各通道 DFT 和积分图, 按需计算一次, 供多个模板共用"""
+
+    def __init__(self, image):
+        self.image = image
+        self.shape = _dft_shape(image.shape)
+        self._channels = None
+        self._spectra = None
+        self._integrals = None
+        self._lock = threading.Lock()
+
+    def _split(self):
+        if self._channels is None:
+            self._channels = _channels(self.image)
+        return self._channels
+
+    def spectra(self):
+        with self._lock:
+            if self._spectra is None:
+                self._spectra = [_pad_dft(c, self.shape) for c in self._split()]
+            return self._spectra
+
+    def integrals(self):
+        """([各通道像素和积分图], 各通道平方和合计的积分图), 均为 float64"""
+        with self._lock:
+            if self._integrals is None:
+                chans = self._split()
+                # uint8 的平方和最大 3*255^2, float32 可精确表示
+                sq = cv2.multiply(chans[0], chans[0])
+                for c in chans[1:]:
+                    sq = cv2.add(sq, cv2.multiply(c, c))
+                sums = [cv2.integral(c, sdepth=cv2.CV_64F) for c in chans]
+                self._integrals = (sums, cv2.integral(sq, sdepth=cv2.CV_64F))
+            return self._integrals
+
+
+def _box(integral, h, w):
+    """积分图 → 每个 h x w 窗口的和 (窗口左上角坐标)"""
+    return (integral[h:, w:] - integral[:-h, w:]
+            - integral[h:, :-w] + integral[:-h, :-w])
+
+
+def fft_match_map(image, tmpl, frame=None):
+    """完整的 TM_CCOEFF_NORMED 结果图 (H-th+1, W-tw+1)"""
+    if frame is None:
+        frame = FrameSpectra(image)
+    th, tw = tmpl.shape[:2]
+    ih, iw = image.shape[:2]
+    t_spectra, t_norm = _template_spectra(tmpl, frame.shape)
+
+    acc = None
+    for f_spec, t_spec in zip(frame.spectra(), t_spectra):
+        prod = cv2.mulSpectrums(f_spec, t_spec, 0, conjB=True)
+        acc = prod if acc is None else cv2.add(acc, prod)
+    num = cv2.idft(acc, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+    num = num[:ih - th + 1, :iw - tw + 1].astype(np.float64)
+
+    sums, sq = frame.integrals()
+    var = _box(sq, th, tw)
+    for integral in sums:
+        s = _box(integral, th, tw)
+        var -= s * s / (tw * th)
+    den = np.sqrt(np.maximum(var, 0.0) * t_norm)
+
+    result = np.zeros(num.shape, np.float32)
+    valid = den > 1e-6 * max(t_norm, 1.0)
+    np.divide(num, den, out=result, where=valid, casting='unsafe')
+    # 数值误差造成的轻微越界夹回去, 明显越界 (几乎平坦的窗口) 视为 0
+    result[np.abs(result) > 1.125] = 0.0
+    np.clip(result, -1.0, 1.0, out=result)
+    return result
+
+
+def fft_match(image, tmpl, frame=None):
+    """返回 (最高分, 左上角), 与 cv2.minMaxLoc(TM_CCOEFF_NORMED) 相同"""
+    _, max_val, _, max_loc = cv2.minMaxLoc(fft_match_map(image, tmpl, frame))
+    return max_val, max_loc
@@ -9,10 +9,12 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import time
 import os
+import cv2
+import numpy as np
 
 from recipe_manager import RecipeManager
 from recipe_dialog import RecipeDialog
-from settings_dialog import SettingsDialog, load_settings
+from settings_dialog import SettingsDialog, load_settings, make_digit_recognizer
 from window_manager import WindowManager
 from backpack_reader import BackpackReader
 from digit_recognizer import DigitRecognizer
@@ -22,7 +24,12 @@ from hotkey_dialog import HotkeySettingsDialog
 from tool_dialog import (AutoEncounterDialog, LoopHealingDialog,
                          GetMaterialDialog, load_tool_config)
 from tool_scripts import AutoEncounterEngine, LoopHealingEngine, GetMaterialEngine
+import screenshot_util
 from screenshot_util import take_screenshot
+import capture_stream
+import capture_backends
+import matching
+import template_store
 from custom_tool_manager import CustomToolManager
 from custom_tool_engine import CustomToolEngine
 from custom_tool_dialog import CustomToolDialog
@@ -68,9 +75,10 @@ class CraftAssistantGUI:
 
         # 初始化管理器
         self.settings = load_settings()
+        self._apply_capture_settings()
         self.recipe_manager = RecipeManager('recipes')
         self.window_manager = WindowManager()
-        self.digit_recognizer = DigitRecognizer('templates/digits')
+        self.digit_recognizer = self._make_digit_recognizer()
         self.backpack_reader = BackpackReader(
             self.digit_recognizer, self.settings, self._log_message)
         self.craft_engine = CraftEngine(
@@ -953,13 +961,36 @@ class CraftAssistantGUI:
 
     # ── 设置 ──
 
+    def _apply_capture_settings(self):
+        """截图后端 / 后台采集帧率 / 截图统计 / 匹配模式"""
+        capture_stream.set_default_fps(
+            self.settings.get('capture_stream_fps', 0))
+        screenshot_util.enable_capture_stats(
+            self.settings.get('capture_stats', True))
+        matching.set_default_pyramid(self.settings.get('match_pyramid', 0))
+        try:
+            capture_backends.configure(
+                self.settings.get('capture_backend', 'desktop'))
+        except (ValueError, OSError, KeyError) as e:
+            self._log_message(f"截图后端配置无效, 使用桌面截图: {e}")
+            capture_backends.configure('desktop')
+
+    def _make_digit_recognizer(self):
+        """按设置的识别引擎和路径策略创建数字识别器"""
+        try:
+            return make_digit_recognizer(self.settings)
+        except ValueError as e:
+            self._log_message(f"{e}, 使用模板匹配 (灰度+G-R两条路径)")
+            return DigitRecognizer('templates/digits')
+
     def _open_settings(self):
         """打开设置对话框"""
         dialog = SettingsDialog(
             self.root, self._screenshot_region, self.window_manager)
         if dialog.result:
             self.settings = dialog.result
-            self.digit_recognizer = DigitRecognizer('templates/digits')
+            self._apply_capture_settings()
+            self.digit_recognizer = self._make_digit_recognizer()
             self.backpack_reader = BackpackReader(
                 self.digit_recognizer, self.settings, self._log_message)
             self.craft_engine = CraftEngine(
@@ -967,8 +998,17 @@ class CraftAssistantGUI:
 
     # ── 截图工具 ──
 
-    def _screenshot_region(self, save_path):
-        """截图并保存到指定路径"""
+    # 多次截取生成掩码: 截取次数和间隔
+    MASK_CAPTURE_FRAMES = 8
+    MASK_CAPTURE_INTERVAL = 0.3
+
+    def _screenshot_region(self, save_path, mask=None):
+        """截图并保存到指定路径
+
+        框选时按 M 切换"多次截取生成掩码" (默认值 mask, 未给出时取设置
+        template_mask_capture):
+        开启后松开鼠标会在同一位置再截 MASK_CAPTURE_FRAMES 次, 只保留各次都
+        不变的像素, 存成带 alpha 的 PNG, 随场景变化的背景不参与匹配。"""
         try:
             self.root.iconify()
             self.root.update()
@@ -988,7 +1028,22 @@ class CraftAssistantGUI:
             canvas.pack(fill=tk.BOTH, expand=True)
             canvas.create_image(0, 0, anchor=tk.NW, image=bg_photo)
 
-            state = {'start': None, 'rect_id': None, 'success': False}
+            state = {'start': None, 'rect_id': None, 'success': False,
+                     'mask': bool(self.settings.get('template_mask_capture')
+                                  if mask is None else mask),
+                     'rect': None}
+
+            def hint_text():
+                mode = '开' if state['mask'] else '关'
+                return f"拖动框选模板    M: 多次截取生成掩码 [{mode}]    Esc: 取消"
+
+            hint_id = canvas.create_text(
+                12, 12, anchor=tk.NW, text=hint_text(), fill='yellow',
+                font=('Microsoft YaHei', 12, 'bold'))
+
+            def on_toggle_mask(event):
+                state['mask'] = not state['mask']
+                canvas.itemconfigure(hint_id, text=hint_text())
 
             def on_press(event):
                 state['start'] = (event.x, event.y)
@@ -1012,14 +1067,7 @@ class CraftAssistantGUI:
                 width = abs(x1 - x0)
                 height = abs(y1 - y0)
                 if width > 5 and height > 5:
-                    cropped = screenshot.crop(
-                        (left, top, left + width, top + height))
-                    save_dir = os.path.dirname(save_path)
-                    if save_dir:
-                        os.makedirs(save_dir, exist_ok=True)
-                    cropped.save(save_path)
-                    cropped.close()
-                    state['success'] = True
+                    state['rect'] = (left, top, width, height)
                 overlay.destroy()
 
             def on_escape(event):
@@ -1029,8 +1077,15 @@ class CraftAssistantGUI:
             canvas.bind('<B1-Motion>', on_drag)
             canvas.bind('<ButtonRelease-1>', on_release)
             overlay.bind('<Escape>', on_escape)
+            overlay.bind('<KeyPress-m>', on_toggle_mask)
+            overlay.bind('<KeyPress-M>', on_toggle_mask)
+            overlay.focus_force()
 
             overlay.wait_window()
+            if state['rect'] is not None:
+                self._save_template(screenshot, state['rect'], save_path,
+                                    state['mask'])
+                state['success'] = True
             screenshot.close()
             self.root.deiconify()
             return state['success']
@@ -1040,6 +1095,41 @@ class CraftAssistantGUI:
             self.root.deiconify()
             return False
 
+    def _save_template(self, screenshot, rect, save_path, with_mask):
+        """保存框选的模板; with_mask 时再多截几次, 按稳定像素生成掩码"""
+        left, top, width, height = rect
+        cropped = screenshot.crop((left, top, left + width, top + height))
+        save_dir = os.path.dirname(save_path)
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        # 重新截取后旧的掩码文件对不上新图, 一并作废
+        companion = template_store.mask_path(save_path)
+        if os.path.exists(companion):
+            os.remove(companion)
+        mask = None
+        if with_mask:
+            first = cv2.cvtColor(np.array(cropped), cv2.COLOR_RGB2BGR)
+            frames = [first]
+            # rect 是整屏截图 (虚拟屏幕) 上的坐标, 换成屏幕坐标再截
+            origin_x, origin_y = screenshot_util.screen_origin()
+            region = (left + origin_x, top + origin_y, width, height)
+            for _ in range(self.MASK_CAPTURE_FRAMES):
+                time.sleep(self.MASK_CAPTURE_INTERVAL)
+                frames.append(screenshot_util.grab_bgr(region=region))
+            mask = template_store.derive_mask(frames)
+            if mask is None:
+                self._log_message(
+                    "多次截取的画面几乎全部不变 (或几乎全在变), 未生成掩码")
+            else:
+                template_store.save_with_mask(save_path, first, mask)
+                kept = np.count_nonzero(mask) / mask.size * 100
+                self._log_message(f"模板掩码: 保留 {kept:.0f}% 稳定像素")
+        if mask is None:
+            cropped.save(save_path)
+        cropped.close()
+        # 重新截取的模板 (设置 / 配方 / 自定义工具) 不能再用旧缓存
+        template_store.invalidate(save_path)
+
     # ── 日志 ──
 
     def _log_message(self, message):
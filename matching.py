@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模板匹配服务
+
+所有引擎的"截图 → 取模板 → matchTemplate → minMaxLoc → 换算屏幕坐标"
+都走这里, 缓存 / 搜索区域 / 帧共享 / 统计也只在这一处实现。
+
+    find(template, region, threshold=0.7, roi=None)  → Match 或 None
+    exists(template, region, threshold=0.7, roi=None) → bool
+    wait_for(template, region, threshold=0.7, timeout=30) → Match 或 None
+    match_many(templates, region)    → 同一帧里每个模板一个 Match
+    wait_for_any(templates, region)  → (下标, Match) 或 None
+
+template 可以是模板图片路径 (经 template_store 缓存) 或 BGR 数组;
+region 是被搜索画面的屏幕区域 (通常是窗口矩形), roi 可进一步限定
+只在 region 内的某个屏幕子矩形里找。返回的 Match 坐标都是屏幕坐标。
+
+模块级函数用一个同步截图的默认 Matcher; 引擎按自己的需求各建一个
+Matcher (后台采集线程、黑帧等待、画面未变时复用结果、停止检查)。
+
+按钮 / 技能图标这类 UI 每轮几乎出现在同一位置: Matcher 按 (模板, 画面尺寸)
+记住上次命中的位置, 下次先只在它周围 LAST_HIT_PADDING 像素的小区域里找,
+达到阈值即采用, 否则再搜整个区域。800x600 窗口里找 60x25 的按钮,
+小区域匹配比整帧快一个数量级以上 (benchmarks/bench_roi_match.py)。
+
+可选金字塔模式 (设置项 match_pyramid = 2 / 4, 0 = 关闭): 先把画面和模板缩小
+到 1/2 或 1/4 粗匹配, 只在前几个候选峰值附近用原分辨率 TM_CCOEFF_NORMED 精修。
+模板太小或搜索区域不比模板大多少时自动退回穷举
+(一致性和加速比见 benchmarks/bench_pyramid_match.py)。
+
+不开金字塔时, 大模板在大画面里找 (背包标题栏、整窗口找整理按钮) 按
+fft_match.prefer_fft() 的尺寸判断自动改走频域 NCC: 模板频谱按画面尺寸缓存,
+每次只变换画面, 结果与 TM_CCOEFF_NORMED 相同 (benchmarks/bench_fft_match.py)。
+
+exists() 只要是/否, 默认走快速路径: 单通道灰度、缩小 PRESENCE_SCALE 倍先粗判,
+峰值低于阈值超过 PRESENCE_BAND 直接判不在, 否则只在几个峰附近用 BGR 确认,
+仍下不了结论才整区域 BGR 复核 (带宽和加速比见 benchmarks/bench_presence.py)。
+
+画面静止时 (等制造倒计时、未识别状态的重试循环) 同样的匹配会反复算。
+Matcher 按 (模板, 搜索区域, 区域像素的 CRC32) 记最近 MEMO_SIZE 条结果,
+像素没变就直接返回, 不做相关运算。与 skip_unchanged 不同, 它不依赖逐帧的
+变化检测, 画面变了又变回来 (弹窗开关) 也能命中。
+
+带掩码的模板 (PNG alpha 或 <文件名>_mask.png, 见 template_store) 只用掩码内的
+像素算 TM_CCOEFF_NORMED, 按钮四周随场景变化的背景不再拉低分数。
+掩码匹配总是原分辨率穷举 (不走金字塔 / 频域 / 灰度粗判)。
+"""
+
+import os
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import capture_stream
+import fft_match
+import template_store
+from screenshot_util import FrameChangeDetector, grab_bgr, is_blank_frame, window_crop
+
+DEFAULT_THRESHOLD = 0.7
+
+# 黑帧/过渡帧判定: 切场景时游戏会先黑屏再淡入, 这段时间的帧上任何模板
+# 都匹配不到。采样点亮度全低于该值即视为过渡帧, 按 BLANK_RECHECK_INTERVAL
+# 重抓, 最多等 BLANK_RECHECK_TIMEOUT 秒。
+TRANSITION_FRAME_LEVEL = 16
+BLANK_RECHECK_INTERVAL = 0.05
+BLANK_RECHECK_TIMEOUT = 1.0
+
+# 上次命中位置四周各扩出的像素数
+LAST_HIT_PADDING = 24
+
+# 金字塔模式: 缩小后模板短边至少这么多像素, 否则降低倍数 / 退回穷举
+PYRAMID_MIN_SIDE = 8
+# 粗匹配取前几个峰值去精修
+PYRAMID_TOP_K = 3
+# 搜索区域不到模板面积这么多倍时直接穷举, 缩放的开销不划算
+PYRAMID_MIN_AREA_RATIO = 16
+
+# exists() 快速路径: 灰度缩小倍数, 以及粗判峰值低于阈值多少才直接判不在
+PRESENCE_SCALE = 2
+PRESENCE_BAND = 0.15
+# 缩小后模板短边至少这么多像素; 粗判最多看几个峰
+PRESENCE_MIN_SIDE = 12
+PRESENCE_PEAKS = 16
+
+# 匹配结果备忘条数上限; 每条只存分数和位置, 256 条不到 100KB
+MEMO_SIZE = 256
+
+_default_pyramid = 0
+
+
+class Match(namedtuple('Match', 'x y confidence box')):
+    """一次匹配结果
+
+    x, y: 模板中心的屏幕坐标 (点击位置)
+    confidence: TM_CCOEFF_NORMED 最高分
+    box: 模板所在的屏幕矩形 (left, top, width, height)
+    """
+    __slots__ = ()
+
+
+def set_default_pyramid(scale):
+    """设置金字塔缩小倍数 (2 / 4), 0 或 1 = 关闭; 对未显式指定的 Matcher 生效"""
+    global _default_pyramid
+    _default_pyramid = int(scale or 0)
+
+
+def exhaustive_match(image, tmpl, mask=None):
+    """原分辨率 TM_CCOEFF_NORMED, 返回 (最高分, 左上角); mask 为 0 的模板像素不参与"""
+    if mask is None:
+        result = cv2.matchTemplate(image, tmpl, cv2.TM_CCOEFF_NORMED)
+    else:
+        result = masked_match_map(image, tmpl, mask)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_val, max_loc
+
+
+def masked_match_map(image, tmpl, mask):
+    """带掩码的 TM_CCOEFF_NORMED 结果图。
+
+    窗口内 (掩码部分) 平坦时 cv2 给出 NaN / 极大值, 这里与 fft_match 一样
+    视为 0 分, 轻微越界的夹回 [-1, 1]。"""
+    result = cv2.matchTemplate(image, tmpl, cv2.TM_CCOEFF_NORMED, mask=mask)
+    result = np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0)
+    result[np.abs(result) > 1.125] = 0.0
+    np.clip(result, -1.0, 1.0, out=result)
+    return result
+
+
+def pyramid_match(image, tmpl, scale=2, top_k=PYRAMID_TOP_K, shrink=None):
+    """先缩小 scale 倍粗匹配, 再在前 top_k 个峰值附近原分辨率精修。
+
+    返回值与 exhaustive_match 相同; 条件不满足时直接穷举。
+    shrink(scale) 可提供已缩好的 image (多模板共用同一帧时)。"""
+    th, tw = tmpl.shape[:2]
+    ih, iw = image.shape[:2]
+    while scale > 1 and min(th, tw) // scale < PYRAMID_MIN_SIDE:
+        scale //= 2
+    if scale <= 1 or iw * ih < PYRAMID_MIN_AREA_RATIO * tw * th:
+        return exhaustive_match(image, tmpl)
+
+    small = shrink(scale) if shrink is not None else _shrink(image, scale)
+    small_t = cv2.resize(tmpl, (tw // scale, th // scale),
+                         interpolation=cv2.INTER_AREA)
+    coarse = cv2.matchTemplate(small, small_t, cv2.TM_CCOEFF_NORMED)
+    sth, stw = small_t.shape[:2]
+    margin = 2 * scale
+    best_val, best_loc = -1.0, (0, 0)
+    for peak, (px, py) in _top_peaks(coarse, top_k, stw, sth):
+        if peak <= -1.0:
+            break
+        x0 = max(0, px * scale - margin)
+        y0 = max(0, py * scale - margin)
+        x1 = min(iw, px * scale + tw + margin)
+        y1 = min(ih, py * scale + th + margin)
+        val, (lx, ly) = exhaustive_match(image[y0:y1, x0:x1], tmpl)
+        if val > best_val:
+            best_val, best_loc = val, (x0 + lx, y0 + ly)
+    return best_val, best_loc
+
+
+def _top_peaks(coarse, k, tw, th):
+    """依次给出 coarse 上最高的 k 个峰 (peak, (x, y))。
+
+    每给出一个就把它附近 (tw x th 范围) 压成 -1, 下一个候选取别处;
+    会原地改 coarse。"""
+    for _ in range(k):
+        _, peak, _, (px, py) = cv2.minMaxLoc(coarse)
+        yield peak, (px, py)
+        coarse[max(0, py - th // 2):py + th // 2 + 1,
+               max(0, px - tw // 2):px + tw // 2 + 1] = -1.0
+
+
+def _shrink(image, scale):
+    h, w = image.shape[:2]
+    return cv2.resize(image, (w // scale, h // scale),
+                      interpolation=cv2.INTER_AREA)
+
+
+def _gray_small(image, scale):
+    """单通道灰度并缩小 scale 倍 (scale=1 只转灰度)"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return _shrink(image, scale) if scale > 1 else image
+
+
+class _SharedFrame:
+    """一次 match_many 的画面, 以及各模板共用、按需只算一次的预处理"""
+
+    def __init__(self, image, region, generation):
+        self.image = image
+        self.left, self.top = (region[0], region[1]) if region else (0, 0)
+        self.generation = generation
+        self._small = {}
+        self._gray = {}
+        self._spectra = None
+        self._lock = threading.Lock()
+
+    def shrink(self, scale):
+        with self._lock:
+            small = self._small.get(scale)
+            if small is None:
+                small = self._small[scale] = _shrink(self.image, scale)
+            return small
+
+    def gray_small(self, scale):
+        with self._lock:
+            small = self._gray.get(scale)
+            if small is None:
+                small = self._gray[scale] = _gray_small(self.image, scale)
+            return small
+
+    def spectra(self):
+        """整帧的频域预处理 (DFT + 积分图), 各模板共用"""
+        with self._lock:
+            if self._spectra is None:
+                self._spectra = fft_match.FrameSpectra(self.image)
+            return self._spectra
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """多模板匹配共用的线程池, 首次使用时创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=min(4, os.cpu_count() or 1),
+                thread_name_prefix='matching')
+        return _pool
+
+
+def _content_hash(image):
+    """画面像素的快速指纹 (非加密; 整帧 800x600 约 1ms)"""
+    if not image.flags.c_contiguous:
+        image = np.ascontiguousarray(image)
+    return image.shape, zlib.crc32(image)
+
+
+def _load(template):
+    """返回 (BGR 数组, 缓存键, 掩码或 None); 数组模板没有掩码"""
+    if isinstance(template, str):
+        return (template_store.load_bgr(template), template,
+                template_store.load_mask(template))
+    return template, id(template), None
+
+
+class Matcher:
+    """带状态的匹配器, 每个引擎一个"""
+
+    def __init__(self, stream=None, settle=False, skip_unchanged=False,
+                 stop_check=None, remember=True, pyramid=None, fast_exists=True,
+                 memo=True):
+        """
+        Args:
+            stream: capture_stream.acquire() 得到的采集线程, None = 同步截图
+            settle: 截到黑帧 / 过渡帧时短间隔重抓, 等画面稳定再匹配
+            skip_unchanged: 自上次匹配同一模板以来画面没变就直接复用上次结果
+            stop_check: 返回 True 时中止等待 (黑帧重抓 / wait_for)
+            remember: 先在上次命中位置附近找, 没找到再搜整个区域
+            pyramid: 金字塔缩小倍数, None = 跟随 set_default_pyramid()
+            fast_exists: exists() 先用灰度缩小图粗判, 接近阈值才 BGR 复核
+            memo: 搜索区域像素与之前某次完全相同时直接复用那次的结果
+        """
+        self.stream = stream
+        self.settle = settle
+        self.stop_check = stop_check or (lambda: False)
+        self.pyramid = pyramid
+        self.fast_exists = fast_exists
+        self._changes = FrameChangeDetector() if skip_unchanged else None
+        self._last = {}     # {(模板键, 搜索区域): (generation, max_val, max_loc)}
+        self._hits = {} if remember else None   # {(模板键, 画面宽高): 帧内左上角}
+        # {(模板键, 搜索区域, 方式, 像素指纹): (模板数组的弱引用, 结果)}, LRU;
+        # 只弱引用模板, 不让 TemplateStore 已淘汰的数组一直活着
+        self._memo = OrderedDict() if memo else None
+        self._lock = threading.Lock()
+        self.matches = 0
+        self.skipped = 0
+        self.match_time = 0.0
+        self.roi_hits = 0       # 上次位置附近直接命中
+        self.roi_misses = 0     # 附近没找到, 退回整个区域
+        self.presence_checks = 0        # exists() 灰度粗判次数
+        self.presence_escalations = 0   # 其中退回整个区域 BGR 复核的次数
+        self.memo_hits = 0      # 像素没变, 直接用备忘的结果
+        self.memo_misses = 0
+
+    def stats(self):
+        return {'matches': self.matches, 'skipped': self.skipped,
+                'match_time': self.match_time,
+                'roi_hits': self.roi_hits, 'roi_misses': self.roi_misses,
+                'presence_checks': self.presence_checks,
+                'presence_escalations': self.presence_escalations,
+                'memo_hits': self.memo_hits, 'memo_misses': self.memo_misses}
+
+    def summary(self):
+        """一行统计, 供引擎停止时写日志; 没匹配过返回空串"""
+        total = (self.matches + self.skipped + self.presence_checks
+                 + self.memo_hits)
+        if not total:
+            return ''
+        tried = self.roi_hits + self.roi_misses
+        rate = self.roi_hits / tried * 100 if tried else 0.0
+        line = (f"模板匹配 {self.matches}次 (耗时{self.match_time * 1000:.0f}ms), "
+                f"画面未变跳过 {self.skipped}次, "
+                f"上次位置命中 {self.roi_hits}/{tried} ({rate:.0f}%)")
+        if self.presence_checks:
+            line += (f", 存在性粗判 {self.presence_checks}次 "
+                     f"(复核 {self.presence_escalations}次)")
+        looked = self.memo_hits + self.memo_misses
+        if looked:
+            line += (f", 结果备忘命中 {self.memo_hits}/{looked} "
+                     f"({self.memo_hits / looked * 100:.0f}%)")
+        return line
+
+    # ── 结果备忘 ──
+
+    def _memo_get(self, key, tmpl):
+        """命中返回备忘的结果, 否则 None; 模板数组换了 (重新截图) 不算命中"""
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None and entry[0]() is tmpl:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return entry[1]
+            self.memo_misses += 1
+        return None
+
+    def _memo_put(self, key, tmpl, result):
+        with self._lock:
+            self._memo[key] = (weakref.ref(tmpl), result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+
+    # ── 取帧 ──
+
+    def grab(self, region):
+        """截取 region 的 BGR 画面 (开了采集线程时取输入之后的最新帧)"""
+        frame = capture_stream.grab(self.stream, region)
+        if not self.settle:
+            return frame
+        deadline = time.time() + BLANK_RECHECK_TIMEOUT
+        while (is_blank_frame(frame, threshold=TRANSITION_FRAME_LEVEL)
+               and time.time() < deadline and not self.stop_check()):
+            time.sleep(BLANK_RECHECK_INTERVAL)
+            frame = capture_stream.grab(self.stream, region)
+        return frame
+
+    # ── 匹配 ──
+
+    def match(self, template, region, roi=None, *,
+              threshold=DEFAULT_THRESHOLD, screen=None):
+        """在 region 画面 (或给定的 screen) 中匹配模板, 总是返回 Match;
+        搜索区域比模板还小时 confidence 为 0。
+
+        threshold 只决定上次位置附近的结果够不够好、要不要退回整个区域。
+        threshold / screen 只能按关键字传, 与模块级 match() 写法一致。"""
+        return self.match_many([template], region, roi, threshold=threshold,
+                               screen=screen)[0]
+
+    def match_many(self, templates, region, roi=None, *,
+                   threshold=DEFAULT_THRESHOLD, screen=None):
+        """同一帧里一次匹配多个模板, 按顺序返回各自的 Match。
+
+        只截一次图、只更新一次变化检测, 缩小图等预处理各模板共用;
+        多个模板时在线程池里并行 (cv2.matchTemplate 会释放 GIL)。
+        threshold 可以是单个值或与 templates 等长的序列。"""
+        if screen is None:
+            screen = self.grab(region)
+        if isinstance(threshold, (list, tuple)):
+            thresholds = threshold
+        else:
+            thresholds = [threshold] * len(templates)
+        frame = self._frame(screen, region)
+        if len(templates) == 1:
+            return [self._match_one(frame, templates[0], roi, thresholds[0])]
+        return list(_executor().map(
+            lambda args: self._match_one(frame, args[0], roi, args[1]),
+            zip(templates, thresholds)))
+
+    def _frame(self, screen, region):
+        generation = None
+        if self._changes is not None:
+            with self._lock:
+                generation = self._changes.update(screen)
+        return _SharedFrame(screen, region, generation)
+
+    @staticmethod
+    def _search_area(frame, roi, tw, th):
+        """搜索区域 (帧内坐标); 放不下模板时返回 (None, 空结果 Match)"""
+        left, top = frame.left, frame.top
+        sh, sw = frame.image.shape[:2]
+        area = (0, 0, sw, sh)
+        if roi is not None:
+            area = window_crop(roi, (left, top, left + sw, top + sh))
+            if area is None:
+                return None, Match(left, top, 0.0, (left, top, tw, th))
+        ax, ay, aw, ah = area
+        if aw < tw or ah < th:
+            return None, Match(left + ax, top + ay, 0.0,
+                               (left + ax, top + ay, tw, th))
+        return area, None
+
+    def _match_one(self, frame, template, roi, threshold):
+        tmpl, key, mask = _load(template)
+        left, top = frame.left, frame.top
+        sh, sw = frame.image.shape[:2]
+        th, tw = tmpl.shape[:2]
+
+        area, empty = self._search_area(frame, roi, tw, th)
+        if area is None:
+            return empty
+
+        hit_key = (key, sw, sh)
+        last_hit = None
+        if self._hits is not None:
+            with self._lock:
+                last_hit = self._hits.get(hit_key)
+        if last_hit is not None:
+            near = self._near(last_hit, tw, th, area)
+            if near is not None:
+                max_val, loc = self._best(frame, tmpl, key, near, mask)
+                with self._lock:
+                    if max_val >= threshold:
+                        self.roi_hits += 1
+                        # 跟着目标走: 缓慢移动的元素下次仍以新位置为中心搜
+                        self._hits[hit_key] = (near[0] + loc[0], near[1] + loc[1])
+                    else:
+                        self.roi_misses += 1
+                if max_val >= threshold:
+                    return self._result(left, top, near, loc, max_val, tw, th)
+
+        max_val, loc = self._best(frame, tmpl, key, area, mask)
+        if self._hits is not None and max_val >= threshold:
+            with self._lock:
+                self._hits[hit_key] = (area[0] + loc[0], area[1] + loc[1])
+        return self._result(left, top, area, loc, max_val, tw, th)
+
+    @staticmethod
+    def _near(last_hit, tw, th, area):
+        """上次命中位置外扩 LAST_HIT_PADDING 后与搜索区域的交集 (帧内坐标);
+        比搜索区域小不了多少时返回 None, 直接搜整个区域"""
+        pad = LAST_HIT_PADDING
+        ax, ay, aw, ah = area
+        x0 = max(ax, last_hit[0] - pad)
+        y0 = max(ay, last_hit[1] - pad)
+        x1 = min(ax + aw, last_hit[0] + tw + pad)
+        y1 = min(ay + ah, last_hit[1] + th + pad)
+        if x1 - x0 < tw or y1 - y0 < th:
+            return None
+        if (x1 - x0) * (y1 - y0) * 2 > aw * ah:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    @staticmethod
+    def _result(left, top, area, loc, max_val, tw, th):
+        bx, by = left + area[0] + loc[0], top + area[1] + loc[1]
+        return Match(bx + tw // 2, by + th // 2, max_val, (bx, by, tw, th))
+
+    def _best(self, frame, tmpl, key, area, mask=None):
+        """area (帧内坐标) 里的最高分和位置 (相对 area); 开了 skip_unchanged 时
+        该区域自上次匹配同一模板以来没变就复用上次结果"""
+        ax, ay, aw, ah = area
+        key = (key, area)
+        generation = frame.generation
+        if generation is not None:
+            with self._lock:
+                last = self._last.get(key)
+                if last is not None and not self._changes.changed_since(
+                        last[0], area):
+                    self.skipped += 1
+                    return last[1], last[2]
+        screen = frame.image
+        image = screen[ay:ay + ah, ax:ax + aw]
+        scale = self.pyramid if self.pyramid is not None else _default_pyramid
+        memo_key = None
+        if self._memo is not None:
+            memo_key = (key, scale, _content_hash(image))
+            hit = self._memo_get(memo_key, tmpl)
+            if hit is not None:
+                if generation is not None:
+                    with self._lock:
+                        self._last[key] = (generation,) + hit
+                return hit
+        started = time.perf_counter()
+        if mask is not None:
+            max_val, max_loc = exhaustive_match(image, tmpl, mask)
+        elif scale > 1:
+            # 整帧搜索时缩小图各模板共用
+            shrink = frame.shrink if image.shape == screen.shape else None
+            max_val, max_loc = pyramid_match(image, tmpl, scale, shrink=shrink)
+        elif fft_match.prefer_fft(image.shape, tmpl.shape):
+            spectra = frame.spectra() if image.shape == screen.shape else None
+            max_val, max_loc = fft_match.fft_match(image, tmpl, spectra)
+        else:
+            max_val, max_loc = exhaustive_match(image, tmpl)
+        with self._lock:
+            self.matches += 1
+            self.match_time += time.perf_counter() - started
+            if generation is not None:
+                self._last[key] = (generation, max_val, max_loc)
+        if memo_key is not None:
+            self._memo_put(memo_key, tmpl, (max_val, max_loc))
+        return max_val, max_loc
+
+    def find(self, template, region, threshold=DEFAULT_THRESHOLD, roi=None):
+        """找到 (confidence >= threshold) 返回 Match, 否则 None"""
+        m = self.match(template, region, roi, threshold=threshold)
+        return m if m.confidence >= threshold else None
+
+    def exists(self, template, region, threshold=DEFAULT_THRESHOLD, roi=None):
+        """模板是否在画面里。fast_exists 时先走灰度缩小图粗判 (_presence),
+        粗判下不了结论才退回整个区域的 BGR 匹配"""
+        if not self.fast_exists:
+            return self.find(template, region, threshold, roi) is not None
+        frame = self._frame(self.grab(region), region)
+        tmpl, key, mask = _load(template)
+        th, tw = tmpl.shape[:2]
+        area, _ = self._search_area(frame, roi, tw, th)
+        if area is None:
+            return False
+        memo_key = None
+        if self._memo is not None:
+            ax, ay, aw, ah = area
+            memo_key = ('exists', key, area, threshold,
+                        _content_hash(frame.image[ay:ay + ah, ax:ax + aw]))
+            hit = self._memo_get(memo_key, tmpl)
+            if hit is not None:
+                return hit
+        verdict = None
+        if mask is None:
+            verdict = self._presence(frame, template, tmpl, area, threshold)
+            if verdict is None:
+                with self._lock:
+                    self.presence_escalations += 1
+        if verdict is None:
+            verdict = self._match_one(frame, template, roi,
+                                      threshold).confidence >= threshold
+        if memo_key is not None:
+            self._memo_put(memo_key, tmpl, verdict)
+        return verdict
+
+    def _presence(self, frame, template, tmpl, area, threshold):
+        """灰度缩小图上的粗判。
+
+        从最高峰往下看: 峰值低于 threshold - PRESENCE_BAND 就判不在 (缩小和
+        去色都会压低分数, 留出带宽); 否则在该峰附近用 BGR 原图确认, 够阈值
+        判在。看了 PRESENCE_PEAKS 个峰仍下不了结论返回 None。"""
+        th, tw = tmpl.shape[:2]
+        # 缩小后模板太小分数不可靠, 降低倍数 (1 = 只转灰度)
+        scale = PRESENCE_SCALE
+        while scale > 1 and min(th, tw) // scale < PRESENCE_MIN_SIDE:
+            scale //= 2
+        if isinstance(template, str):
+            gray = template_store.load_gray(template)
+            small_t = _shrink(gray, scale) if scale > 1 else gray
+        else:
+            small_t = _gray_small(tmpl, scale)
+        sth, stw = small_t.shape[:2]
+        ax, ay, aw, ah = area
+        if aw // scale < stw or ah // scale < sth:
+            return None
+
+        started = time.perf_counter()
+        screen = frame.image
+        if (aw, ah) == (screen.shape[1], screen.shape[0]):
+            small = frame.gray_small(scale)
+        else:
+            small = _gray_small(screen[ay:ay + ah, ax:ax + aw], scale)
+        coarse = cv2.matchTemplate(small, small_t, cv2.TM_CCOEFF_NORMED)
+        verdict = None
+        margin = 2 * scale
+        for peak, (px, py) in _top_peaks(coarse, PRESENCE_PEAKS, stw, sth):
+            if peak < threshold - PRESENCE_BAND:
+                verdict = False
+                break
+            x0 = max(ax, ax + px * scale - margin)
+            y0 = max(ay, ay + py * scale - margin)
+            x1 = min(ax + aw, ax + px * scale + tw + margin)
+            y1 = min(ay + ah, ay + py * scale + th + margin)
+            if exhaustive_match(screen[y0:y1, x0:x1], tmpl)[0] >= threshold:
+                verdict = True
+                break
+        with self._lock:
+            self.presence_checks += 1
+            self.match_time += time.perf_counter() - started
+        return verdict
+
+    def wait_for(self, template, region, threshold=DEFAULT_THRESHOLD,
+                 roi=None, timeout=30, interval=0.5):
+        """反复匹配直到模板出现; 超时 / stop_check 为真返回 None。"""
+        hit = self.wait_for_any([template], region, threshold, roi,
+                                timeout=timeout, interval=interval)
+        return hit[1] if hit is not None else None
+
+    def wait_for_any(self, templates, region, threshold=DEFAULT_THRESHOLD,
+                     roi=None, timeout=30, interval=0.5):
+        """反复匹配直到任一模板出现, 返回 (下标, Match); 超时 / 停止返回 None。
+        同一帧里有多个达标时取排在前面的。
+
+        开了采集线程时每次取比上次更新的帧, 不在这里同步截图。"""
+        if isinstance(threshold, (list, tuple)):
+            thresholds = threshold
+        else:
+            thresholds = [threshold] * len(templates)
+        start_time = time.time()
+        last_seq = 0
+        while time.time() - start_time < timeout:
+            if self.stop_check():
+                return None
+            screen = None
+            if self.stream is not None:
+                frame = self.stream.wait_newer(last_seq, timeout=1.0)
+                if frame is not None:
+                    last_seq = frame.seq
+                    screen = frame.crop(region)
+            if screen is None:
+                screen = grab_bgr(region=region)
+            results = self.match_many(templates, region, roi, screen=screen,
+                                      threshold=thresholds)
+            for i, m in enumerate(results):
+                if m.confidence >= thresholds[i]:
+                    return i, m
+            time.sleep(interval)
+        return None
+
+
+_default = Matcher()
+
+
+def match(template, region, roi=None, *, threshold=DEFAULT_THRESHOLD, screen=None):
+    return _default.match(template, region, roi, screen=screen,
+                          threshold=threshold)
+
+
+def match_many(templates, region, roi=None, *, threshold=DEFAULT_THRESHOLD,
+               screen=None):
+    return _default.match_many(templates, region, roi, screen=screen,
+                               threshold=threshold)
+
+
+def find(template, region, threshold=DEFAULT_THRESHOLD, roi=None):
+    return _default.find(template, region, threshold, roi)
+
+
+def exists(template, region, threshold=DEFAULT_THRESHOLD, roi=None):
+    return _default.exists(template, region, threshold, roi)
+
+
+def wait_for(template, region, threshold=DEFAULT_THRESHOLD, roi=None,
+             timeout=30, interval=0.5):
+    return _default.wait_for(template, region, threshold, roi,
+                             timeout=timeout, interval=interval)
+
+
+def wait_for_any(templates, region, threshold=DEFAULT_THRESHOLD, roi=None,
+                 timeout=30, interval=0.5):
+    return _default.wait_for_any(templates, region, threshold, roi,
+                                 timeout=timeout, interval=interval)
@@ -11,16 +11,39 @@
 
 用法:
     引擎启动时 set_capture_hwnd(hwnd) 绑定游戏窗口,
-    之后 take_screenshot(region=...) 会优先用 BitBlt 抓窗口再裁剪 region;
+    之后 take_screenshot(region=...) 会优先用 BitBlt 只抓窗口内 region 对应的子矩形;
     BitBlt 失败 / 返回黑屏时自动回退到 mss。
-    引擎停止时 set_capture_hwnd(None) 解绑。
+    引擎停止时 set_capture_hwnd(None) 解绑, 并调用 close_thread_capture()
+    关闭本线程缓存的 mss 实例。几个引擎可能同时运行时改用
+    acquire_capture_hwnd / release_capture_hwnd, 最后一个归还时才解绑。
+    只做 cv2 处理的调用方用 grab_bgr(region=...) 直接拿 numpy BGR, 省掉 PIL 中转。
+
+    绑定期间 DC / 位图由 WindowCaptureSession 持有并跨帧复用,
+    窗口尺寸变化时才重建 DC, 解绑时释放。
+    整窗口帧在 FRAME_CACHE_TTL 内共享: 同一轮循环里几次区域截图只抓一次屏,
+    投递输入后 (bg_input) 缓存自动失效。
+
+截图后端可替换 (set_capture_backend / 环境变量 ANJIAN_CAPTURE_BACKEND):
+    默认 DesktopBackend 即上面的 BitBlt + mss; capture_backends 另提供
+    目录/视频回放和脚本合成两种后端, 让识别流程能在无显示的 Linux 上跑基准和回归。
+
+截图统计 (enable_capture_stats / get_capture_stats):
+    按来源 (bitblt / mss / cache / 回放等后端) 记录次数、耗时直方图、拷贝字节数,
+    以及 BitBlt → mss 回退次数和黑屏次数。关闭时每次截图只多一次 None 判断。
 """
 
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
 import mss
 import mss.tools
+import numpy as np
 from PIL import Image
 
 try:
+    import win32api
     import win32gui
     import win32ui
     import win32con
@@ -30,77 +53,76 @@ except ImportError:
 
 
 _bound_hwnd = None
+_session = None
+_session_lock = threading.Lock()
+# acquire_capture_hwnd 的引用计数 {hwnd: 使用者数}
+_bind_refs = {}
+_bind_lock = threading.Lock()
+_mss_local = threading.local()
 
+# 整窗口帧缓存: (hwnd, window_rect, monotonic 时间戳, bgra_frame)
+FRAME_CACHE_TTL = 0.03
+_frame_cache_ttl = FRAME_CACHE_TTL
+_frame_cache = None
+_frame_epoch = 0
 
-def set_capture_hwnd(hwnd):
-    """绑定游戏窗口。绑定后 take_screenshot(region=...) 会优先用 BitBlt
-    从该窗口抓像素, 即使被遮挡也能截。传 None 解绑, 恢复到 mss 屏幕截图。"""
-    global _bound_hwnd
-    _bound_hwnd = hwnd if hwnd else None
+# 截图后端, 见 set_capture_backend / capture_backends
+CAPTURE_BACKEND_ENV = 'ANJIAN_CAPTURE_BACKEND'
+_backend = None
 
+# 截图统计, None = 关闭
+_stats = None
+# 耗时直方图的桶上界 (毫秒), 最后一桶收纳更慢的
+STATS_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100)
 
-def get_capture_hwnd():
-    return _bound_hwnd
+# GetSystemMetrics: 虚拟屏幕 left/top/width/height + 显示器个数
+_DISPLAY_METRICS = (76, 77, 78, 79, 80)
 
 
-def _capture_window(hwnd):
-    """用 BitBlt 从窗口 DC 拷贝整个窗口 (含标题栏), 返回 PIL.Image 或 None。
-    BitBlt 不发 WM_PRINT, 不触发游戏重绘, 所以无闪烁;
-    被遮挡时通过 DWM 重定向位图通常仍可拿到画面。
-    None 表示尺寸异常 / 异常 / 全黑。"""
-    if not _HAS_WIN32 or not hwnd:
-        return None
+class _Win32Gdi:
+    """真实的 GDI 调用层。
 
-    hwnd_dc = None
-    mfc_dc = None
-    save_dc = None
-    bmp = None
-    try:
-        left, top, right, bottom = win32gui.GetWindowRect(hwnd)
-        w, h = right - left, bottom - top
-        if w <= 0 or h <= 0:
-            return None
+    WindowCaptureSession 只通过这几个方法碰平台 API, 测试时换成假实现
+    即可在 Linux 上验证 DC / 位图的复用与重建逻辑。
+    """
+
+    def get_window_rect(self, hwnd):
+        return win32gui.GetWindowRect(hwnd)
 
+    def open_dc(self, hwnd):
+        """创建窗口 DC + 兼容 DC, 返回句柄元组。"""
         hwnd_dc = win32gui.GetWindowDC(hwnd)
         mfc_dc = win32ui.CreateDCFromHandle(hwnd_dc)
         save_dc = mfc_dc.CreateCompatibleDC()
+        return (hwnd_dc, mfc_dc, save_dc)
+
+    def create_bitmap(self, dcs, width, height):
         bmp = win32ui.CreateBitmap()
-        bmp.CreateCompatibleBitmap(mfc_dc, w, h)
+        bmp.CreateCompatibleBitmap(dcs[1], width, height)
+        return bmp
+
+    def blit(self, dcs, bmp, size, src):
+        """把窗口 DC 中以 src 为左上角、size 大小的矩形 BitBlt 到 bmp,
+        返回 BGRX 原始字节。"""
+        _, mfc_dc, save_dc = dcs
         save_dc.SelectObject(bmp)
+        save_dc.BitBlt((0, 0), size, mfc_dc, src, win32con.SRCCOPY)
+        return bmp.GetBitmapBits(True)
 
-        save_dc.BitBlt((0, 0), (w, h), mfc_dc, (0, 0), win32con.SRCCOPY)
-
-        info = bmp.GetInfo()
-        bits = bmp.GetBitmapBits(True)
-        img = Image.frombytes(
-            'RGB', (info['bmWidth'], info['bmHeight']),
-            bits, 'raw', 'BGRX', 0, 1,
-        )
-
-        # 黑屏检测: 49 个采样点全部近乎纯黑才判失败, 否则接受
-        sample = [
-            img.getpixel((img.width * i // 8, img.height * j // 8))
-            for i in range(1, 8) for j in range(1, 8)
-        ]
-        if all(max(p[:3]) < 3 for p in sample):
-            return None
-        return img
-    except Exception:
-        return None
-    finally:
+    def delete_bitmap(self, bmp):
         try:
-            if bmp is not None:
-                win32gui.DeleteObject(bmp.GetHandle())
+            win32gui.DeleteObject(bmp.GetHandle())
         except Exception:
             pass
+
+    def close_dc(self, hwnd, dcs):
+        hwnd_dc, mfc_dc, save_dc = dcs
         try:
-            if save_dc is not None:
-                save_dc.DeleteDC()
+            save_dc.DeleteDC()
         except Exception:
             pass
         try:
-            if mfc_dc is not None:
-                mfc_dc.DeleteDC()
+            mfc_dc.DeleteDC()
         except Exception:
             pass
         try:
@@ -110,47 +132,686 @@ def _capture_window(hwnd):
             pass
 
 
+def window_crop(region, window_rect):
+    """把屏幕坐标 region 换算成窗口 DC 内的源矩形, 并裁剪到窗口范围内。
+
+    Args:
+        region: (left, top, width, height) 屏幕坐标; None 表示整窗口。
+        window_rect: GetWindowRect 的 (left, top, right, bottom)。
+
+    Returns:
+        tuple: (src_x, src_y, width, height), 与窗口无交集时返回 None。
+    """
+    win_left, win_top, win_right, win_bottom = window_rect
+    win_w, win_h = win_right - win_left, win_bottom - win_top
+    if region is None:
+        return (0, 0, win_w, win_h) if win_w > 0 and win_h > 0 else None
+    r_left, r_top, r_w, r_h = region
+    crop_l = max(0, r_left - win_left)
+    crop_t = max(0, r_top - win_top)
+    crop_r = min(win_w, r_left - win_left + r_w)
+    crop_b = min(win_h, r_top - win_top + r_h)
+    if crop_r <= crop_l or crop_b <= crop_t:
+        return None
+    return (crop_l, crop_t, crop_r - crop_l, crop_b - crop_t)
+
+
+class WindowCaptureSession:
+    """绑定到一个窗口的长生命周期 BitBlt 会话。
+
+    DC 在首帧时创建并跨帧复用, 只有 GetWindowRect 报告的尺寸变了才释放
+    重建; close() 时统一释放。轮询循环每秒截好几次、一跑几小时, 省掉的是
+    每帧 4 次 GDI 对象创建/销毁。
+
+    grab(region) 只 BitBlt 请求的子矩形, 位图按尺寸缓存 (背包网格、数字条、
+    整窗口等常用尺寸各一张), 小区域不再拷贝整窗口。
+    """
+
+    MAX_BITMAPS = 4
+
+    def __init__(self, hwnd, gdi=None):
+        self.hwnd = hwnd
+        self._gdi = gdi if gdi is not None else _Win32Gdi()
+        self._dcs = None
+        self._size = None
+        self._bitmaps = OrderedDict()   # {(w, h): bitmap}, LRU
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def grab(self, region=None):
+        """抓一帧。
+
+        Args:
+            region: (left, top, width, height) 屏幕坐标, None = 整窗口 (含标题栏)。
+
+        Returns:
+            tuple: (window_rect, src, width, height, bgrx_bytes), 其中
+                window_rect 为 GetWindowRect 的 (left, top, right, bottom),
+                src 为子矩形在窗口内的左上角;
+                会话已关闭 / 尺寸异常 / 与窗口无交集 / GDI 出错时返回 None。
+        """
+        with self._lock:
+            if self._closed:
+                return None
+            try:
+                rect = self._gdi.get_window_rect(self.hwnd)
+                left, top, right, bottom = rect
+                size = (right - left, bottom - top)
+                crop = window_crop(region, rect)
+                if crop is None:
+                    return None
+                if self._dcs is None or self._size != size:
+                    self._release()
+                    self._dcs = self._gdi.open_dc(self.hwnd)
+                    self._size = size
+                src_x, src_y, w, h = crop
+                bits = self._gdi.blit(
+                    self._dcs, self._bitmap(w, h), (w, h), (src_x, src_y))
+                return tuple(rect), (src_x, src_y), w, h, bits
+            except Exception:
+                # DC 可能已随窗口失效, 丢掉让下一帧重建
+                self._release()
+                return None
+
+    def window_rect(self):
+        """当前窗口的 (left, top, right, bottom); 取不到返回 None。"""
+        try:
+            return tuple(self._gdi.get_window_rect(self.hwnd))
+        except Exception:
+            return None
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._release()
+
+    def _bitmap(self, width, height):
+        key = (width, height)
+        bmp = self._bitmaps.get(key)
+        if bmp is not None:
+            self._bitmaps.move_to_end(key)
+            return bmp
+        bmp = self._gdi.create_bitmap(self._dcs, width, height)
+        self._bitmaps[key] = bmp
+        while len(self._bitmaps) > self.MAX_BITMAPS:
+            _, old = self._bitmaps.popitem(last=False)
+            self._gdi.delete_bitmap(old)
+        return bmp
+
+    def _release(self):
+        if self._dcs is not None:
+            dcs, self._dcs, self._size = self._dcs, None, None
+            self._gdi.close_dc(self.hwnd, dcs)
+        while self._bitmaps:
+            _, bmp = self._bitmaps.popitem()
+            self._gdi.delete_bitmap(bmp)
+
+
+def set_capture_hwnd(hwnd):
+    """绑定游戏窗口。绑定后 take_screenshot(region=...) 会优先用 BitBlt
+    从该窗口抓像素, 即使被遮挡也能截。传 None 解绑, 恢复到 mss 屏幕截图。
+
+    同一窗口重复绑定会沿用已有的 WindowCaptureSession; 换窗口或解绑时
+    释放旧会话持有的 DC / 位图。"""
+    global _bound_hwnd, _session
+    hwnd = hwnd if hwnd else None
+    with _session_lock:
+        old = _session
+        if old is not None and old.hwnd == hwnd:
+            _bound_hwnd = hwnd
+            return
+        _session = (WindowCaptureSession(hwnd)
+                    if hwnd is not None and _HAS_WIN32 else None)
+        _bound_hwnd = hwnd
+        invalidate_frame_cache()
+    if old is not None:
+        old.close()
+
+
+def acquire_capture_hwnd(hwnd):
+    """按引用计数绑定游戏窗口 (与 capture_stream.acquire 一样), 返回绑定的 hwnd。
+
+    同时运行的引擎各自 acquire, 一个引擎停止时 release 不会关掉另一个
+    还在用的 WindowCaptureSession; 最后一个使用者归还时才解绑。"""
+    hwnd = hwnd if hwnd else None
+    with _bind_lock:
+        if hwnd is not None:
+            _bind_refs[hwnd] = _bind_refs.get(hwnd, 0) + 1
+        set_capture_hwnd(hwnd)
+    return hwnd
+
+
+def release_capture_hwnd(hwnd):
+    """归还 acquire_capture_hwnd() 的绑定; 该窗口没有使用者后, 改绑仍在用的
+    其他窗口, 都没有了就解绑。"""
+    with _bind_lock:
+        if hwnd is not None and hwnd in _bind_refs:
+            _bind_refs[hwnd] -= 1
+            if _bind_refs[hwnd] > 0:
+                return
+            del _bind_refs[hwnd]
+        if _bound_hwnd is not None and _bound_hwnd in _bind_refs:
+            return
+        set_capture_hwnd(next(iter(_bind_refs), None))
+
+
+def get_capture_hwnd():
+    return _bound_hwnd
+
+
+def set_frame_cache_ttl(seconds):
+    """设置整窗口帧缓存的保鲜时间 (秒), 0 关闭缓存。"""
+    global _frame_cache_ttl
+    _frame_cache_ttl = max(0.0, float(seconds))
+    invalidate_frame_cache()
+
+
+def invalidate_frame_cache():
+    """丢弃缓存帧, 下一次截图必然重新抓取。
+
+    bg_input 每次投递输入消息后都会调用, 保证点击之后不会再拿到点击前的画面。
+    同时递增 frame_epoch(), 后台采集线程据此区分输入前/后的帧。"""
+    global _frame_cache, _frame_epoch
+    _frame_cache = None
+    _frame_epoch += 1
+
+
+def frame_epoch():
+    """输入纪元: 每次 invalidate_frame_cache() 加一。"""
+    return _frame_epoch
+
+
+class CaptureStats:
+    """截图计数 / 耗时直方图, 多个引擎线程和采集线程共用, 加锁更新。
+
+    begin_capture_run() 挂上的子统计同步记录, 用来单独统计一次运行。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = ()         # begin_capture_run() 挂上的子统计
+        self.sources = {}       # {来源: {'count', 'bytes', 'total', 'max', 'hist'}}
+        self.fallbacks = 0      # BitBlt 失败回退 mss
+        self.blank_frames = 0   # BitBlt 得到黑屏被丢弃
+
+    def attach(self, run):
+        with self._lock:
+            self._runs += (run,)
+
+    def detach(self, run):
+        with self._lock:
+            self._runs = tuple(r for r in self._runs if r is not run)
+
+    def record(self, source, seconds, nbytes):
+        for run in self._runs:
+            run.record(source, seconds, nbytes)
+        with self._lock:
+            entry = self.sources.get(source)
+            if entry is None:
+                entry = {'count': 0, 'bytes': 0, 'total': 0.0, 'max': 0.0,
+                         'hist': [0] * (len(STATS_BUCKETS_MS) + 1)}
+                self.sources[source] = entry
+            entry['count'] += 1
+            entry['bytes'] += nbytes
+            entry['total'] += seconds
+            if seconds > entry['max']:
+                entry['max'] = seconds
+            ms = seconds * 1000.0
+            bucket = 0
+            while bucket < len(STATS_BUCKETS_MS) and ms > STATS_BUCKETS_MS[bucket]:
+                bucket += 1
+            entry['hist'][bucket] += 1
+
+    def count(self, field):
+        for run in self._runs:
+            run.count(field)
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'sources': {k: dict(v, hist=list(v['hist']))
+                            for k, v in self.sources.items()},
+                'fallbacks': self.fallbacks,
+                'blank_frames': self.blank_frames,
+                'buckets_ms': STATS_BUCKETS_MS,
+            }
+
+
+def enable_capture_stats(enabled=True):
+    """开启 / 关闭截图统计; 已开启时再次开启保留已有计数"""
+    global _stats
+    if not enabled:
+        _stats = None
+    elif _stats is None:
+        _stats = CaptureStats()
+
+
+def reset_capture_stats():
+    """清零截图统计 (未开启时无操作)"""
+    global _stats
+    if _stats is not None:
+        fresh = CaptureStats()
+        fresh._runs = _stats._runs
+        _stats = fresh
+
+
+def get_capture_stats():
+    """截图统计快照; 未开启时返回 None。
+
+    {'sources': {来源: {'count', 'bytes', 'total' (秒), 'max' (秒),
+                        'hist' (按 buckets_ms 分桶的次数)}},
+     'fallbacks': int, 'blank_frames': int, 'buckets_ms': tuple}
+    """
+    stats = _stats
+    return stats.snapshot() if stats is not None else None
+
+
+def begin_capture_run():
+    """开始单独统计一次运行 (引擎从启动到停止) 的截图, 返回子统计; 未开启时返回 None。
+
+    总统计从进程启动起一直累加, 运行结束时的汇总要用子统计才只含本次;
+    几个引擎同时运行时各自的子统计互不影响。"""
+    stats = _stats
+    if stats is None:
+        return None
+    run = CaptureStats()
+    stats.attach(run)
+    return run
+
+
+def end_capture_run(run):
+    """结束 begin_capture_run() 的子统计, 返回本次运行的日志行"""
+    if run is None:
+        return []
+    stats = _stats
+    if stats is not None:
+        stats.detach(run)
+    return format_capture_stats(run.snapshot())
+
+
+def format_capture_stats(stats=None):
+    """把统计整理成日志行; 未开启或没有截图时返回空列表"""
+    if stats is None:
+        stats = get_capture_stats()
+    if not stats or not stats['sources']:
+        return []
+    lines = []
+    edges = [f"≤{b}" for b in stats['buckets_ms']] + [f">{stats['buckets_ms'][-1]}"]
+    for name, e in sorted(stats['sources'].items()):
+        avg = e['total'] / e['count'] * 1000.0
+        hist = ' '.join(f"{edge}:{n}" for edge, n in zip(edges, e['hist']) if n)
+        lines.append(
+            f"截图[{name}] {e['count']}次 平均{avg:.2f}ms 最大{e['max'] * 1000:.1f}ms "
+            f"共{e['bytes'] / 1048576:.1f}MB ({hist} ms)")
+    lines.append(f"截图回退mss {stats['fallbacks']}次, 黑屏 {stats['blank_frames']}次")
+    return lines
+
+
+def _cached_region(session, region):
+    """缓存帧仍新鲜且窗口未移动/缩放时, 直接切出 region 对应的切片。"""
+    entry = _frame_cache
+    if entry is None:
+        return None
+    hwnd, rect, stamp, frame = entry
+    if hwnd != session.hwnd or time.monotonic() - stamp > _frame_cache_ttl:
+        return None
+    if session.window_rect() != rect:
+        return None
+    crop = window_crop(region, rect)
+    if crop is None:
+        return None
+    x, y, w, h = crop
+    return frame[y:y + h, x:x + w]
+
+
+def _remember_frame(session, grabbed, epoch, stamp):
+    """整窗口且非黑的帧才放进缓存, 供同一轮里其他区域请求切片复用。
+
+    epoch / stamp 是开始抓取时的输入纪元和时间: 抓取期间有输入
+    (invalidate_frame_cache) 时这一帧可能是输入之前的画面, 不放进缓存。"""
+    global _frame_cache
+    if _frame_cache_ttl <= 0:
+        return
+    frame, rect, src = grabbed
+    left, top, right, bottom = rect
+    if src == (0, 0) and frame.shape[:2] == (bottom - top, right - left):
+        if epoch == _frame_epoch:
+            _frame_cache = (session.hwnd, rect, stamp, frame)
+
+
+def _capture_window(hwnd, region=None, fresh=False):
+    """用 BitBlt 从窗口 DC 拷贝 region (屏幕坐标; None = 整个窗口含标题栏),
+    返回 BGRA 的 numpy 数组 (直接包装 GetBitmapBits 的字节, 不再拷贝) 或 None。
+    BitBlt 不发 WM_PRINT, 不触发游戏重绘, 所以无闪烁;
+    被遮挡时通过 DWM 重定向位图通常仍可拿到画面。
+    None 表示未绑定会话 / 尺寸异常 / 异常 / 全黑。
+
+    小区域本身可能就是暗色 UI, 所以 region 全黑时再抓一次整窗口确认:
+    整窗口也黑才算 BitBlt 失败, 否则照常返回该区域。
+
+    整窗口帧会在 _frame_cache_ttl 秒内缓存, 期间同窗口 (位置尺寸未变) 的
+    区域请求直接返回缓存帧的切片; fresh=True 跳过缓存。"""
+    session = _session
+    if session is None or session.hwnd != hwnd:
+        return None
+
+    if not fresh:
+        stats = _stats
+        started = time.perf_counter() if stats is not None else 0.0
+        cached = _cached_region(session, region)
+        if cached is not None:
+            if stats is not None:
+                stats.record('cache', time.perf_counter() - started, 0)
+            return cached
+
+    epoch, stamp = _frame_epoch, time.monotonic()
+    grabbed = _grab_window_bgra(session, region)
+    if grabbed is None:
+        return None
+    frame = grabbed[0]
+    if is_blank_frame(frame):
+        if region is None:
+            _count_stat('blank_frames')
+            return None
+        full = _grab_window_bgra(session, None)
+        if full is None or is_blank_frame(full[0]):
+            _count_stat('blank_frames')
+            return None
+        _remember_frame(session, full, epoch, stamp)
+        return frame
+    _remember_frame(session, grabbed, epoch, stamp)
+    return frame
+
+
+def _grab_window_bgra(session, region):
+    """返回 (bgra_frame, window_rect, src) 或 None"""
+    stats = _stats
+    started = time.perf_counter() if stats is not None else 0.0
+    frame = session.grab(region)
+    if frame is None:
+        return None
+    rect, src, w, h, bits = frame
+    if len(bits) != w * h * 4:
+        return None
+    if stats is not None:
+        stats.record('bitblt', time.perf_counter() - started, len(bits))
+    return np.frombuffer(bits, dtype=np.uint8).reshape(h, w, 4), rect, src
+
+
+def _count_stat(field):
+    stats = _stats
+    if stats is not None:
+        stats.count(field)
+
+
+def is_blank_frame(frame, threshold=3, grid=8):
+    """判断一帧是否为黑屏 (BitBlt 失败 / 切场景的全黑过渡帧)。
+
+    在 (grid-1) x (grid-1) 个均匀采样点上取 B/G/R 最大值, 全部低于
+    threshold 才算黑屏; 用 numpy 花式索引一次取完, 不逐点回 Python。
+
+    Args:
+        frame: numpy 数组, BGR / BGRA (H, W, C) 或灰度 (H, W)。
+        threshold: 亮度阈值, 调高可把淡入淡出中的暗帧也算作过渡帧。
+        grid: 采样网格分段数, 默认 8 → 7x7=49 个点。
+    """
+    h, w = frame.shape[:2]
+    if h == 0 or w == 0:
+        return True
+    steps = np.arange(1, grid)
+    sample = frame[np.ix_(steps * h // grid, steps * w // grid)]
+    if sample.ndim == 3:
+        sample = sample[..., :3]
+    return int(sample.max()) < threshold
+
+
+class FrameChangeDetector:
+    """分块变化检测: 判断画面的哪些区域自上一帧以来变了。
+
+    每帧先 INTER_AREA 缩小 downscale 倍 (相当于按块取均值, 过滤噪点),
+    再按 tile x tile 像素分块比较最大差值, 超过 tolerance 的块记为变化。
+    每个块记录最后一次变化时的代号 (generation), 调用方记下自己算结果时的
+    代号, 之后用 changed_since() 就能知道搜索区域有没有变过。
+
+    比较的基准是每个块上次记为变化时的内容, 不是上一帧: 未变化的块不更新
+    基准, 每帧都低于 tolerance 的缓慢渐变累积起来超过阈值时也会被记为变化。
+    """
+
+    def __init__(self, tile=32, downscale=4, tolerance=6):
+        self.tile = tile
+        self.downscale = downscale
+        self.tolerance = tolerance
+        self.generation = 0
+        self._prev = None
+        self._tile_gen = None
+        self._changed = None
+        self._shape = None
+
+    def update(self, frame):
+        """喂入一帧, 返回本帧的 generation。尺寸变了视为全部变化。"""
+        self.generation += 1
+        h, w = frame.shape[:2]
+        ds = self.downscale
+        small = cv2.resize(frame, (max(1, w // ds), max(1, h // ds)),
+                           interpolation=cv2.INTER_AREA).astype(np.int16)
+        per = max(1, self.tile // ds)
+        rows = -(-small.shape[0] // per)
+        cols = -(-small.shape[1] // per)
+        # 补齐到整块, 补出来的部分恒为 0, 不影响比较
+        padded = np.zeros((rows * per, cols * per) + small.shape[2:], small.dtype)
+        padded[:small.shape[0], :small.shape[1]] = small
+        if self._prev is None or self._shape != frame.shape:
+            self._changed = np.ones((rows, cols), bool)
+            self._tile_gen = np.full((rows, cols), self.generation)
+            self._prev = padded
+        else:
+            diff = np.abs(padded - self._prev)
+            if diff.ndim == 3:
+                diff = diff.max(axis=2)
+            block_max = diff.reshape(rows, per, cols, per).max(axis=(1, 3))
+            self._changed = block_max > self.tolerance
+            self._tile_gen[self._changed] = self.generation
+            # 只有变化的块才更新基准
+            pixels = np.repeat(np.repeat(self._changed, per, axis=0), per, axis=1)
+            self._prev[pixels] = padded[pixels]
+        self._shape = frame.shape
+        return self.generation
+
+    def changed_since(self, generation, roi=None):
+        """roi (x, y, w, h, 帧内坐标; None = 整帧) 自 generation 之后是否变过。"""
+        if self._tile_gen is None:
+            return True
+        tiles = self._tile_gen
+        if roi is not None:
+            x, y, w, h = roi
+            t = self.tile
+            tiles = tiles[max(0, y // t):-(-(y + h) // t),
+                          max(0, x // t):-(-(x + w) // t)]
+            if tiles.size == 0:
+                return True
+        return bool((tiles > generation).any())
+
+    def changed_regions(self):
+        """最近一次 update 中变化的块, [(x, y, w, h), ...] 帧内坐标。"""
+        if self._changed is None:
+            return []
+        t = self.tile
+        return [(int(c) * t, int(r) * t, t, t)
+                for r, c in zip(*np.nonzero(self._changed))]
+
+
+def _display_signature():
+    """当前显示器布局的指纹, 变化即视为发生了显示器插拔 / 分辨率切换。
+    非 Windows 拿不到廉价指纹, 返回 None (视为不变)。"""
+    if not _HAS_WIN32:
+        return None
+    try:
+        return tuple(win32api.GetSystemMetrics(m) for m in _DISPLAY_METRICS)
+    except Exception:
+        return None
+
+
+def _thread_mss():
+    """当前线程的 mss 实例, 首次使用时创建并缓存。
+
+    mss 实例内部持有平台句柄 (Windows 上是 DC), 不能跨线程共享,
+    所以按线程各存一份; 显示器布局变化时关掉重建, 顺带刷新
+    sct.monitors 的缓存。线程结束前调用 close_thread_capture() 释放。
+    """
+    sct = getattr(_mss_local, 'sct', None)
+    signature = _display_signature()
+    if sct is not None and _mss_local.signature != signature:
+        close_thread_capture()
+        sct = None
+    if sct is None:
+        sct = mss.mss()
+        _mss_local.sct = sct
+        _mss_local.signature = signature
+    return sct
+
+
+def close_thread_capture():
+    """关闭当前线程缓存的 mss 实例。引擎线程退出时调用, 可重复调用。"""
+    sct = getattr(_mss_local, 'sct', None)
+    _mss_local.sct = None
+    if sct is not None:
+        try:
+            sct.close()
+        except Exception:
+            pass
+
+
 def _mss_capture(region):
-    with mss.mss() as sct:
+    """mss 屏幕截图, 返回包装 mss 原始缓冲区的 BGRA numpy 数组。
+
+    复用当前线程的 mss 实例; 抓取出错时 (多半是显示器变了) 重建实例
+    再试一次。"""
+    stats = _stats
+    started = time.perf_counter() if stats is not None else 0.0
+    for attempt in range(2):
+        sct = _thread_mss()
         if region:
             left, top, width, height = region
             monitor = {"left": left, "top": top, "width": width, "height": height}
         else:
             monitor = sct.monitors[0]
-        sct_img = sct.grab(monitor)
-        return Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
+        try:
+            sct_img = sct.grab(monitor)
+        except Exception:
+            close_thread_capture()
+            if attempt:
+                raise
+            continue
+        raw = sct_img.raw
+        if stats is not None:
+            stats.record('mss', time.perf_counter() - started, len(raw))
+        return np.frombuffer(raw, dtype=np.uint8).reshape(
+            sct_img.height, sct_img.width, 4)
+
+
+def _desktop_grab_bgra(region, fresh=False):
+    hwnd = _bound_hwnd
+    if region is not None and hwnd and _HAS_WIN32:
+        frame = _capture_window(hwnd, region, fresh=fresh)
+        if frame is not None:
+            return frame
+        # BitBlt 失败 / 黑屏 → mss 回退 (会截到遮挡物, 但起码不会崩)
+        _count_stat('fallbacks')
+    return _mss_capture(region)
+
+
+class DesktopBackend:
+    """默认截图后端: 绑定窗口时 BitBlt, 否则 / 失败时 mss。"""
+
+    name = 'desktop'
+
+    def grab_bgra(self, region, fresh=False):
+        return _desktop_grab_bgra(region, fresh)
+
+    def close(self):
+        close_thread_capture()
+
+
+def set_capture_backend(backend):
+    """替换截图后端 (capture_backends 中的回放 / 合成后端等); None = 桌面。"""
+    global _backend
+    old, _backend = _backend, backend
+    invalidate_frame_cache()
+    if old is not None and old is not backend:
+        old.close()
+
+
+def get_capture_backend():
+    """当前截图后端。首次调用时若设置了环境变量 CAPTURE_BACKEND_ENV 则按其创建。"""
+    global _backend
+    if _backend is None:
+        import os
+        spec = os.environ.get(CAPTURE_BACKEND_ENV)
+        if spec:
+            from capture_backends import create_backend
+            _backend = create_backend(spec)
+        else:
+            _backend = DesktopBackend()
+    return _backend
+
+
+def _grab_bgra(region, fresh=False):
+    backend = _backend if _backend is not None else get_capture_backend()
+    stats = _stats
+    if stats is None or isinstance(backend, DesktopBackend):
+        # 桌面后端在 bitblt / mss / cache 各自的位置记录
+        return backend.grab_bgra(region, fresh)
+    started = time.perf_counter()
+    frame = backend.grab_bgra(region, fresh)
+    if frame is not None:
+        stats.record(getattr(backend, 'name', type(backend).__name__),
+                     time.perf_counter() - started, frame.nbytes)
+    return frame
+
+
+def screen_origin():
+    """take_screenshot() 不带 region 时整屏截图左上角的屏幕坐标 (left, top)。
+
+    桌面后端截的是整个虚拟屏幕, 有显示器在主显示器左边 / 上边时原点为负;
+    整屏截图上的坐标加上它才是 grab_bgr / take_screenshot 用的屏幕坐标。
+    回放 / 合成后端的画面原点恒为 (0, 0)。"""
+    backend = _backend if _backend is not None else get_capture_backend()
+    if not isinstance(backend, DesktopBackend):
+        return 0, 0
+    monitor = _thread_mss().monitors[0]
+    return monitor['left'], monitor['top']
+
+
+def grab_bgr(region=None, fresh=False, out=None):
+    """
+    截图, 返回 numpy BGR 数组 (H, W, 3), 可直接喂给 cv2。
+
+    与 take_screenshot 走同一套 BitBlt / mss 策略, 但跳过 PIL:
+    原始 BGRX 缓冲区 → 一次 cvtColor 得到 BGR, 全程只分配一帧。
+
+    Args:
+        region: 可选 (left, top, width, height) 屏幕坐标区域。
+        fresh: True = 不用整窗口帧缓存, 强制重新抓取。
+        out: 可选的预分配 BGR 数组; 尺寸吻合时结果直接写进去并返回它,
+            不吻合则另行分配。
+    """
+    return cv2.cvtColor(_grab_bgra(region, fresh), cv2.COLOR_BGRA2BGR, dst=out)
 
 
 def take_screenshot(region=None):
     """
-    截图, 返回 PIL.Image (RGB)。
+    截图, 返回 PIL.Image (RGB)。只需要 cv2 处理时用 grab_bgr 更省。
 
     Args:
         region: 可选 (left, top, width, height) 屏幕坐标区域。
 
     策略:
         - 未绑定窗口 / region=None: 直接 mss。
-        - 已绑定窗口: BitBlt 抓整窗口再裁剪 region (无闪烁, 被遮挡也能截);
+        - 已绑定窗口: 只 BitBlt region 对应的窗口子矩形 (无闪烁, 被遮挡也能截);
           BitBlt 失败 / 黑屏自动回退 mss。
     """
-    hwnd = _bound_hwnd
-    if region is not None and hwnd and _HAS_WIN32:
-        win_img = _capture_window(hwnd)
-        if win_img is not None:
-            try:
-                win_left, win_top, _, _ = win32gui.GetWindowRect(hwnd)
-            except Exception:
-                return _mss_capture(region)
-            r_left, r_top, r_w, r_h = region
-            crop_l = r_left - win_left
-            crop_t = r_top - win_top
-            crop_r = crop_l + r_w
-            crop_b = crop_t + r_h
-            crop_l = max(0, crop_l)
-            crop_t = max(0, crop_t)
-            crop_r = min(win_img.width, crop_r)
-            crop_b = min(win_img.height, crop_b)
-            if crop_r > crop_l and crop_b > crop_t:
-                return win_img.crop((crop_l, crop_t, crop_r, crop_b))
-        # BitBlt 失败 / 黑屏 → mss 回退 (会截到遮挡物, 但起码不会崩)
-    return _mss_capture(region)
+    # 整窗口帧缓存 / 回放后端给的是切片视图, 不连续时先拷成连续的
+    frame = np.ascontiguousarray(_grab_bgra(region))
+    h, w = frame.shape[:2]
+    return Image.frombuffer('RGB', (w, h), frame, 'raw', 'BGRX', 0, 1)
@@ -25,6 +25,11 @@ TEMPLATE_ITEMS = [
     ('organize_button_image', '整理背包', '背包界面的「整理」按钮'),
 ]
 
+# 数字识别引擎: 设置值 → 显示名
+DIGIT_ENGINES = {'template': '模板匹配', 'projection': '投影分割'}
+# 模板匹配的路径策略: 设置值 → 显示名
+DIGIT_PATH_POLICIES = {'gray_first': '灰度优先', 'both': '灰度+G-R'}
+
 
 def load_settings():
     """加载全局设置"""
@@ -41,8 +46,17 @@ def load_settings():
         'grid_offset_y': 0,
         'digit_region': {'x': 20, 'y': 26, 'w': 20, 'h': 14},
         'icon_region': {'x': 2, 'y': 2, 'w': 36, 'h': 36},
+        'color_prefilter': True,
+        'digit_path_policy': 'gray_first',
+        'digit_engine': 'template',
+        'template_mask_capture': False,
         'click_pre_delay': 200,
         'click_interval': 100,
+        'frame_cache_ms': 30,
+        'capture_stream_fps': 0,
+        'capture_backend': 'desktop',
+        'capture_stats': True,
+        'match_pyramid': 0,
     }
     if os.path.exists(SETTINGS_FILE):
         try:
@@ -60,6 +74,15 @@ def save_settings(settings):
         json.dump(settings, f, ensure_ascii=False, indent=2)
 
 
+def make_digit_recognizer(settings):
+    """按设置的识别引擎和路径策略创建数字识别器 (主界面和设置里的测试共用)"""
+    from digit_recognizer import DigitRecognizer
+    return DigitRecognizer(
+        DIGITS_DIR,
+        settings.get('digit_path_policy', 'gray_first'),
+        engine=settings.get('digit_engine', 'template'))
+
+
 class SettingsDialog:
     """全局设置对话框"""
 
@@ -67,7 +90,8 @@ class SettingsDialog:
         """
         Args:
             parent: 父窗口
-            screenshot_callback: 截图回调函数, 参数为 save_path, 返回 bool
+            screenshot_callback: 截图回调函数, 参数为 save_path 和 mask
+                (是否默认多次截取生成掩码), 返回 bool
             window_manager: WindowManager 实例（用于测试定位）
         """
         self.result = None
@@ -114,6 +138,12 @@ class SettingsDialog:
 
             ttk.Label(row, text=desc, foreground='gray').pack(side=tk.LEFT, padx=5)
 
+        self.mask_capture_var = tk.BooleanVar(
+            value=self.settings.get('template_mask_capture', False))
+        ttk.Checkbutton(
+            tmpl_label, text="截图时多次截取, 自动生成掩码 (框选时按 M 切换)",
+            variable=self.mask_capture_var).pack(anchor=tk.W, pady=(5, 0))
+
         # 数字模板区
         digit_label = ttk.LabelFrame(main_frame, text="数字模板", padding=10)
         digit_label.pack(fill=tk.X, pady=(0, 10))
@@ -133,6 +163,30 @@ class SettingsDialog:
                   command=self._capture_digits).pack(side=tk.LEFT, padx=5)
         ttk.Label(digit_row, text="逐个截取0-9数字", foreground='gray').pack(side=tk.LEFT, padx=5)
 
+        engine_row = ttk.Frame(digit_label)
+        engine_row.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(engine_row, text="识别方式:", width=10).pack(side=tk.LEFT)
+        engine = self.settings.get('digit_engine', 'template')
+        self.digit_engine_var = tk.StringVar(
+            value=DIGIT_ENGINES.get(engine, DIGIT_ENGINES['template']))
+        ttk.Combobox(engine_row, textvariable=self.digit_engine_var,
+                     values=list(DIGIT_ENGINES.values()), state='readonly',
+                     width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Label(engine_row, text="投影分割更快, 数字粘连或有描边时用模板匹配",
+                  foreground='gray').pack(side=tk.LEFT, padx=5)
+
+        policy_row = ttk.Frame(digit_label)
+        policy_row.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(policy_row, text="识别路径:", width=10).pack(side=tk.LEFT)
+        policy = self.settings.get('digit_path_policy', 'gray_first')
+        self.digit_policy_var = tk.StringVar(
+            value=DIGIT_PATH_POLICIES.get(policy, DIGIT_PATH_POLICIES['gray_first']))
+        ttk.Combobox(policy_row, textvariable=self.digit_policy_var,
+                     values=list(DIGIT_PATH_POLICIES.values()), state='readonly',
+                     width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Label(policy_row, text="灰度够可信时跳过 G-R 通道; 认错时改为两条都跑",
+                  foreground='gray').pack(side=tk.LEFT, padx=5)
+
         # 网格定位区
         grid_label = ttk.LabelFrame(main_frame, text="网格定位 (相对于背包定位模板)", padding=10)
         grid_label.pack(fill=tk.X, pady=(0, 10))
@@ -232,6 +286,16 @@ class SettingsDialog:
         ttk.Button(btn_frame, text="保存", command=self._save).pack(side=tk.RIGHT, padx=5)
         ttk.Button(btn_frame, text="取消", command=self.dialog.destroy).pack(side=tk.RIGHT, padx=5)
 
+    def _digit_engine(self):
+        """下拉框的显示名 → digit_engine 设置值"""
+        names = {v: k for k, v in DIGIT_ENGINES.items()}
+        return names.get(self.digit_engine_var.get(), 'template')
+
+    def _digit_path_policy(self):
+        """下拉框的显示名 → digit_path_policy 设置值"""
+        names = {v: k for k, v in DIGIT_PATH_POLICIES.items()}
+        return names.get(self.digit_policy_var.get(), 'gray_first')
+
     def _capture_template(self, key, name):
         """截取模板图片"""
         os.makedirs(TEMPLATES_DIR, exist_ok=True)
@@ -240,7 +304,8 @@ class SettingsDialog:
 
         self.dialog.grab_release()
         self.dialog.withdraw()
-        success = self.screenshot_callback(save_path)
+        success = self.screenshot_callback(
+            save_path, mask=self.mask_capture_var.get())
         self.dialog.deiconify()
         self.dialog.grab_set()
 
@@ -258,7 +323,8 @@ class SettingsDialog:
         for digit in range(10):
             save_path = os.path.join(DIGITS_DIR, f'{digit}.png')
             messagebox.showinfo("截取数字", f"请准备截取数字 {digit}\n点击确定后开始框选")
-            success = self.screenshot_callback(save_path)
+            # 数字模板按整块 (灰度 / G-R) 匹配, 不读掩码, 不必多次截取
+            success = self.screenshot_callback(save_path, mask=False)
             if not success:
                 self.dialog.deiconify()
                 self.dialog.grab_set()
@@ -331,18 +397,19 @@ class SettingsDialog:
             'w': self.digit_w_var.get(),
             'h': self.digit_h_var.get(),
         }
+        self.settings['digit_engine'] = self._digit_engine()
+        self.settings['digit_path_policy'] = self._digit_path_policy()
 
         self.digit_test_label.config(text="正在测试...", foreground='orange')
         self.dialog.update()
 
         try:
             from backpack_reader import BackpackReader
-            from digit_recognizer import DigitRecognizer
             import cv2
-            import numpy as np
 
+            # 与运行时同样的引擎和路径策略
             reader = BackpackReader(
-                DigitRecognizer('templates/digits'), self.settings)
+                make_digit_recognizer(self.settings), self.settings)
 
             window_rect = self.window_manager.get_window_rect()
             if not window_rect:
@@ -356,13 +423,10 @@ class SettingsDialog:
                 return
 
             # 截取网格区域
-            from screenshot_util import take_screenshot
+            from screenshot_util import grab_bgr
             grid_region = (grid.origin_x, grid.origin_y,
                            grid.cell_w * 5, grid.cell_h * 4)
-            screenshot = take_screenshot(region=grid_region)
-            grid_img = np.array(screenshot)
-            screenshot.close()
-            overlay = cv2.cvtColor(grid_img, cv2.COLOR_RGB2BGR)
+            overlay = grab_bgr(region=grid_region)
 
             dr = self.settings['digit_region']
             dx, dy, dw, dh = dr['x'], dr['y'], dr['w'], dr['h']
@@ -411,6 +475,9 @@ class SettingsDialog:
         }
         self.settings['click_pre_delay'] = self.click_pre_var.get()
         self.settings['click_interval'] = self.click_int_var.get()
+        self.settings['digit_engine'] = self._digit_engine()
+        self.settings['digit_path_policy'] = self._digit_path_policy()
+        self.settings['template_mask_capture'] = self.mask_capture_var.get()
         save_settings(self.settings)
         self.result = self.settings
         self.dialog.destroy()
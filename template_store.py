@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模板图片缓存
+
+各引擎和 BackpackReader 每次匹配都要用到按钮 / 材料模板。以前每次调用都
+用 PIL 重新打开 PNG 再转 BGR, 制造循环里同几张图一轮要解码几十次。
+TemplateStore 按 (绝对路径, 修改时间) 缓存解码后的 BGR (以及按需生成的灰度) 数组,
+按占用字节数做 LRU 淘汰。
+
+返回的数组是只读的共享对象, 调用方不要原地修改。
+模板被重新截取时 (main_gui 的框选截图) 调用 invalidate(path);
+即使漏了, 修改时间变化也会让旧缓存失效。
+
+模板掩码: 截下来的按钮 / 图标带着会随场景变化的背景像素, 这些像素会拉低
+匹配分数。PNG 带 alpha 通道时, 不透明 (alpha >= 128) 的像素参与匹配; 也可以
+在旁边放一张同尺寸的 <文件名>_mask.png (白 = 参与), 它优先于 alpha。
+load_mask() 返回单通道 0/255 掩码, 没有掩码 (或全部参与) 时返回 None。
+derive_mask() 从同一区域的多次截图里取稳定的像素生成掩码。
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+MASK_SUFFIX = '_mask'
+# derive_mask: 各次截图间通道差不超过该值的像素算稳定
+MASK_TOLERANCE = 24
+# 稳定像素不到这个比例时不生成掩码 (多半是整块都在动, 掩码没有意义)
+MASK_MIN_KEEP = 0.3
+
+
+def mask_path(path):
+    """模板旁的掩码文件路径: button.png → button_mask.png"""
+    stem, _ = os.path.splitext(path)
+    return stem + MASK_SUFFIX + '.png'
+
+
+def _read(path, mode=None):
+    pil_img = Image.open(path)
+    try:
+        if mode is not None:
+            pil_img = pil_img.convert(mode)
+        elif pil_img.mode not in ('RGB', 'RGBA', 'L'):
+            has_alpha = 'A' in pil_img.mode or 'transparency' in pil_img.info
+            pil_img = pil_img.convert('RGBA' if has_alpha else 'RGB')
+        return np.array(pil_img)
+    finally:
+        pil_img.close()
+
+
+def _binary(mask):
+    """0/255 单通道; 全部参与 (或一个都不参与, 掩码无意义) 时返回 None"""
+    mask = np.where(mask >= 128, 255, 0).astype(np.uint8)
+    if mask.min() == 255 or mask.max() == 0:
+        return None
+    mask.setflags(write=False)
+    return mask
+
+
+def _decode(path):
+    """PIL 解码 (兼容中文路径) → (BGR, 掩码或 None); 灰度图保持单通道"""
+    img = _read(path)
+    mask = None
+    if img.ndim == 3 and img.shape[2] == 4:
+        mask = _binary(img[..., 3])
+        img = cv2.cvtColor(img, cv2.COLOR_RGBA2BGR)
+    elif img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
+    companion = mask_path(path)
+    if os.path.exists(companion):
+        extra = _read(companion, 'L')
+        # 尺寸对不上的掩码文件 (模板重截过) 忽略
+        if extra.shape == img.shape[:2]:
+            mask = _binary(extra)
+    img.setflags(write=False)
+    return img, mask
+
+
+def _mtime(key):
+    """模板和掩码文件的修改时间, 任一变化都要重新解码"""
+    companion = mask_path(key)
+    return (os.stat(key).st_mtime_ns,
+            os.stat(companion).st_mtime_ns if os.path.exists(companion) else None)
+
+
+def derive_mask(frames, tolerance=MASK_TOLERANCE):
+    """同一区域的多张 BGR 截图 → 稳定像素的掩码 (0/255); 不值得加掩码时返回 None"""
+    stack = np.stack([f.astype(np.int16) for f in frames])
+    spread = stack.max(axis=0) - stack.min(axis=0)
+    if spread.ndim == 3:
+        spread = spread.max(axis=2)
+    stable = spread <= tolerance
+    if stable.mean() < MASK_MIN_KEEP:
+        return None
+    return _binary(stable.astype(np.uint8) * 255)
+
+
+def save_with_mask(path, bgr, mask):
+    """把模板存成带 alpha 的 PNG (掩码为 0 的像素透明)"""
+    rgba = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)
+    rgba[..., 3] = mask
+    Image.fromarray(rgba).save(path)
+
+
+class _Entry:
+    __slots__ = ('mtime', 'bgr', 'mask', 'gray')
+
+    def __init__(self, mtime, bgr, mask=None):
+        self.mtime = mtime
+        self.bgr = bgr
+        self.mask = mask
+        self.gray = None
+
+    @property
+    def nbytes(self):
+        n = self.bgr.nbytes
+        if self.mask is not None:
+            n += self.mask.nbytes
+        if self.gray is not None and self.gray is not self.bgr:
+            n += self.gray.nbytes
+        return n
+
+
+class TemplateStore:
+    """进程内共享的模板缓存"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # {绝对路径: _Entry}, 最近使用的在末尾
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, path):
+        key = os.path.abspath(path)
+        mtime = _mtime(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key, entry
+            self.misses += 1
+        # 解码放在锁外, 避免大图阻塞其他线程
+        entry = _Entry(mtime, *_decode(key))
+        with self._lock:
+            self._put(key, entry)
+        return key, entry
+
+    def _put(self, key, entry):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        # 至少保留刚放进来的这一张
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def get(self, path):
+        """返回模板的 BGR 数组 (原图为灰度时是单通道)"""
+        return self._entry(path)[1].bgr
+
+    def get_mask(self, path):
+        """返回模板的掩码 (0/255 单通道), 没有时返回 None"""
+        return self._entry(path)[1].mask
+
+    def get_gray(self, path):
+        """返回模板的灰度数组"""
+        key, entry = self._entry(path)
+        gray = entry.gray
+        if gray is None:
+            bgr = entry.bgr
+            if bgr.ndim == 2:
+                gray = bgr
+            else:
+                gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+                gray.setflags(write=False)
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._bytes -= entry.nbytes
+                    entry.gray = gray
+                    self._bytes += entry.nbytes
+        return gray
+
+    def invalidate(self, path=None):
+        """丢弃某张模板的缓存; path=None 清空全部"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(os.path.abspath(path), None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+
+_store = TemplateStore()
+
+
+def get_store():
+    return _store
+
+
+def load_bgr(path):
+    """从全局缓存取 BGR 模板"""
+    return _store.get(path)
+
+
+def load_mask(path):
+    """从全局缓存取模板掩码 (没有时为 None)"""
+    return _store.get_mask(path)
+
+
+def load_gray(path):
+    """从全局缓存取灰度模板"""
+    return _store.get_gray(path)
+
+
+def invalidate(path=None):
+    """模板文件被重写后调用"""
+    _store.invalidate(path)
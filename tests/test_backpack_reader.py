@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import backpack_reader
+import template_store
+from backpack_reader import BackpackReader, BackpackSlot, color_signature, signature_overlap
+
+
+def _icon(color):
+    icon = np.full((32, 32, 3), (40, 34, 30), np.uint8)
+    cv2.circle(icon, (16, 16), 12, color, -1)
+    cv2.line(icon, (8, 23), (23, 8), (230, 230, 230), 1)
+    return icon
+
+
+def _cell(icon, dx=4, dy=4):
+    cell = np.full((40, 40, 3), (28, 24, 22), np.uint8)
+    cell[dy:dy + 32, dx:dx + 32] = icon
+    cv2.putText(cell, '12', (20, 37), cv2.FONT_HERSHEY_PLAIN, 0.8, (255, 255, 255), 1)
+    return cell
+
+
+class TestColorSignature(unittest.TestCase):
+
+    def test_overlap(self):
+        """模板颜色被含有它的格子包含, 颜色不同的格子不包含"""
+        red, blue = _icon((40, 40, 220)), _icon((220, 60, 40))
+        tmpl_sig = color_signature(red[2:30, 2:30])
+        self.assertGreater(signature_overlap(color_signature(_cell(red, 5, 3)), tmpl_sig),
+                           backpack_reader.SIGNATURE_MIN_OVERLAP)
+        self.assertLess(signature_overlap(color_signature(_cell(blue)), tmpl_sig),
+                        backpack_reader.SIGNATURE_MIN_OVERLAP)
+
+
+class TestMatchItemPrefilter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        red, blue = _icon((40, 40, 220)), _icon((220, 60, 40))
+        self.path = os.path.join(self.dir, 'red.png')
+        cv2.imwrite(self.path, red[2:30, 2:30])
+        cells = [_cell(blue), _cell(red, 3, 5), _cell(blue, 5, 5)]
+        self.slots = [BackpackSlot(i, 0, 0, 0, c, 10) for i, c in enumerate(cells)]
+
+    def test_same_result_with_fewer_correlations(self):
+        """颜色预筛结果不变, 只对通过预筛的格子做匹配"""
+        off = BackpackReader(None, {'color_prefilter': False})
+        expected = off.match_item(self.slots, self.path, 5)
+        reader = BackpackReader(None)
+        with mock.patch.object(backpack_reader.cv2, 'matchTemplate',
+                               wraps=cv2.matchTemplate) as mt:
+            slot, info = reader.match_item(self.slots, self.path, 5)
+        self.assertIs(slot, expected[0])
+        self.assertEqual((slot.grid_x, slot.grid_y), (1, 0))
+        self.assertEqual(mt.call_count, 1)
+
+
+class TestTemplateMasks(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.rng = np.random.default_rng(3)
+
+    def _texture(self, h, w):
+        return self.rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+    def _save(self, name, image, mask):
+        path = os.path.join(self.dir, name)
+        cv2.imwrite(path, image)
+        cv2.imwrite(template_store.mask_path(path), mask)
+        return path
+
+    def test_title_match_uses_mask(self):
+        """背包标题模板的 _mask.png 参与定位, 掩码外的动态部分不影响匹配"""
+        title = self._texture(20, 30)
+        mask = np.full((20, 30), 255, np.uint8)
+        mask[:, 15:] = 0
+        path = self._save('title.png', title, mask)
+        screen = self._texture(200, 300)
+        screen[40:60, 50:80] = title
+        screen[40:60, 65:80] = self._texture(20, 15)
+        reader = BackpackReader(None, {'backpack_title_image': path,
+                                       'grid_offset_x': 3, 'grid_offset_y': 2})
+        with mock.patch.object(backpack_reader, 'grab_bgr', return_value=screen):
+            grid, info = reader.locate_grid((0, 0, 300, 200))
+        self.assertIsNotNone(grid, info)
+        self.assertEqual((grid.origin_x, grid.origin_y), (53, 62))
+
+    def test_empty_cell_uses_mask(self):
+        """空格子模板带掩码时, 掩码外 (格子中间) 的内容不影响空格子判断"""
+        empty = self._texture(40, 40)
+        mask = np.full((40, 40), 255, np.uint8)
+        mask[8:32, 8:32] = 0
+        path = self._save('empty.png', empty, mask)
+        grid = np.tile(empty, (backpack_reader.GRID_ROWS, backpack_reader.GRID_COLS, 1))
+        for row in range(backpack_reader.GRID_ROWS):
+            for col in range(backpack_reader.GRID_COLS):
+                y, x = row * 40 + 8, col * 40 + 8
+                grid[y:y + 24, x:x + 24] = self._texture(24, 24)
+        recognizer = mock.Mock(cache_hits=0)
+        recognizer.is_loaded.return_value = False
+        reader = BackpackReader(recognizer, {'empty_cell_image': path})
+        with mock.patch.object(backpack_reader, 'grab_bgr', return_value=grid):
+            slots = reader.scan_backpack(backpack_reader.GridInfo(0, 0, 40, 40))
+        self.assertEqual(len(slots), backpack_reader.GRID_TOTAL)
+        self.assertTrue(all(slot.is_empty for slot in slots))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import matching
+import screenshot_util
+from capture_backends import (ReplayBackend, SyntheticBackend,
+                              create_backend, configure)
+
+
+def _solid(value, w=40, h=30):
+    return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+class TestReplayBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for stamp, value in ((1000, 10), (1100, 20), (1300, 30)):
+            cv2.imwrite(os.path.join(self.dir, f'{stamp}.png'), _solid(value))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_sequence_order_and_loop(self):
+        """sequence 模式按顺序逐帧回放, 放完从头循环"""
+        backend = ReplayBackend(self.dir)
+        values = [backend.grab_bgra(None)[0, 0, 0] for _ in range(4)]
+        self.assertEqual(values, [10, 20, 30, 10])
+
+    def test_sequence_holds_last_frame_without_loop(self):
+        """不循环时放完停在最后一帧"""
+        backend = ReplayBackend(self.dir, loop=False)
+        values = [backend.grab_bgra(None)[0, 0, 0] for _ in range(5)]
+        self.assertEqual(values[-2:], [30, 30])
+
+    def test_timestamp_mode_uses_file_names(self):
+        """timestamp 模式按文件名里的毫秒时间戳选帧"""
+        backend = ReplayBackend(self.dir, mode='timestamp', loop=False)
+        with mock.patch('capture_backends.time.monotonic',
+                        side_effect=[5.0, 5.05, 5.15, 5.5]):
+            values = [backend.grab_bgra(None)[0, 0, 0] for _ in range(4)]
+        self.assertEqual(values, [10, 10, 20, 30])
+
+    def test_region_is_cropped_in_screen_coords(self):
+        """region 按屏幕坐标切出, 越界部分裁掉"""
+        frame = _solid(0)
+        frame[5:10, 20:30] = 200
+        cv2.imwrite(os.path.join(self.dir, '1000.png'), frame)
+        backend = ReplayBackend(self.dir)
+        crop = backend.grab_bgra((20, 5, 10, 5))
+        self.assertEqual(crop.shape, (5, 10, 4))
+        self.assertTrue((crop[..., :3] == 200).all())
+        # 部分越界: 补黑到 region 大小, 左上角仍对应 region 原点
+        edge = backend.grab_bgra((35, 25, 20, 20))
+        self.assertEqual(edge.shape, (20, 20, 4))
+        self.assertFalse(edge[5:, :].any())
+        self.assertFalse(edge[:, 5:].any())
+
+    def test_region_outside_frame_rejected(self):
+        """区域完全在回放画面之外时报出清楚的错误"""
+        backend = ReplayBackend(self.dir)
+        with self.assertRaisesRegex(ValueError, '不在画面'):
+            backend.grab_bgra((100, 100, 10, 10))
+
+    def test_video_replay(self):
+        """视频文件逐帧回放"""
+        path = os.path.join(self.dir, 'clip.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'),
+                                 10, (40, 30))
+        if not writer.isOpened():
+            self.skipTest('no video encoder')
+        for value in (40, 120, 220):
+            writer.write(_solid(value))
+        writer.release()
+        backend = ReplayBackend(path)
+        values = [int(backend.grab_bgra(None)[15, 20, 0]) for _ in range(3)]
+        backend.close()
+        for got, want in zip(values, (40, 120, 220)):
+            self.assertAlmostEqual(got, want, delta=8)
+
+    def test_empty_directory_rejected(self):
+        """目录里没有图片时报错"""
+        with self.assertRaises(ValueError):
+            ReplayBackend(tempfile.mkdtemp(dir=self.dir))
+
+
+class TestSyntheticBackend(unittest.TestCase):
+
+    def test_render_called_per_grab(self):
+        """每次截图调用一次 render, 帧号递增"""
+        backend = SyntheticBackend(lambda i, elapsed: _solid(i * 10))
+        self.assertEqual(backend.grab_bgra(None)[0, 0, 0], 0)
+        frame = backend.grab_bgra((0, 0, 8, 4))
+        self.assertEqual(frame.shape, (4, 8, 4))
+        self.assertEqual(frame[0, 0, 0], 10)
+
+    def test_take_screenshot_of_region(self):
+        """合成后端返回切片视图时 take_screenshot(region) 也能生成图片"""
+        screenshot_util.set_capture_backend(
+            SyntheticBackend(lambda i, elapsed: _solid(50)))
+        self.addCleanup(screenshot_util.set_capture_backend, None)
+        img = screenshot_util.take_screenshot((5, 5, 10, 8))
+        self.assertEqual(img.size, (10, 8))
+        self.assertEqual(img.getpixel((0, 0)), (50, 50, 50))
+
+    def test_partial_overlap_keeps_region_origin(self):
+        """区域从左上方越出画面时, 匹配到的坐标仍是正确的屏幕坐标"""
+        rng = np.random.default_rng(2)
+        screen = rng.integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        tmpl = screen[100:130, 200:240].copy()
+        screenshot_util.set_capture_backend(
+            SyntheticBackend(lambda i, elapsed: screen))
+        self.addCleanup(screenshot_util.set_capture_backend, None)
+        crop = screenshot_util.grab_bgr((-50, -50, 300, 250))
+        self.assertEqual(crop.shape, (250, 300, 3))
+        self.assertTrue((crop[50:, 50:] == screen[:200, :250]).all())
+        m = matching.find(tmpl, (-50, -50, 300, 250))
+        self.assertEqual(m.box, (200, 100, 40, 30))
+
+    def test_script_file(self):
+        """从脚本文件加载 render"""
+        d = tempfile.mkdtemp()
+        try:
+            script = os.path.join(d, 'scene.py')
+            with open(script, 'w') as f:
+                f.write('import numpy as np\n'
+                        'def render(index, elapsed):\n'
+                        '    return np.full((10, 10), 77, np.uint8)\n')
+            backend = create_backend(f'synthetic:{script}')
+            self.assertEqual(backend.grab_bgra(None)[0, 0, 0], 77)
+        finally:
+            shutil.rmtree(d)
+
+
+class TestBackendSelection(unittest.TestCase):
+
+    def tearDown(self):
+        screenshot_util.set_capture_backend(None)
+
+    def test_desktop_is_default(self):
+        """默认是桌面后端"""
+        self.assertIsInstance(create_backend(None),
+                              screenshot_util.DesktopBackend)
+        self.assertIsInstance(create_backend('desktop'),
+                              screenshot_util.DesktopBackend)
+
+    def test_unknown_backend_rejected(self):
+        """未知的后端名报错"""
+        with self.assertRaises(ValueError):
+            create_backend('nope')
+
+    def test_env_overrides_setting_and_grab_dispatches(self):
+        """环境变量优先于设置项, grab_bgr 走所选后端"""
+        d = tempfile.mkdtemp()
+        try:
+            cv2.imwrite(os.path.join(d, 'a.png'), _solid(99))
+            env = {screenshot_util.CAPTURE_BACKEND_ENV: f'replay:{d}@timestamp'}
+            with mock.patch.dict(os.environ, env):
+                backend = configure('desktop')
+            self.assertIsInstance(backend, ReplayBackend)
+            self.assertEqual(backend.mode, 'timestamp')
+            bgr = screenshot_util.grab_bgr((0, 0, 4, 4))
+            self.assertEqual(bgr.shape, (4, 4, 3))
+            self.assertTrue((bgr == 99).all())
+        finally:
+            shutil.rmtree(d)
+
+
+if __name__ == '__main__':
+    unittest.main()
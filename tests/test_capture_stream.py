@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import capture_stream
+import screenshot_util
+from capture_stream import CaptureStream
+
+
+class FakeGrab:
+    """假截图函数: 每次返回像素值递增的帧, 写入预分配缓冲"""
+
+    def __init__(self):
+        self.count = 0
+        self.outs = []
+        self.lock = threading.Lock()
+
+    def __call__(self, region, out):
+        with self.lock:
+            self.count += 1
+            value = self.count
+        self.outs.append(out)
+        _, _, w, h = region
+        if out is None or out.shape != (h, w, 3):
+            out = np.empty((h, w, 3), np.uint8)
+        out[:] = value % 256
+        return out
+
+
+class TestCaptureStream(unittest.TestCase):
+    def make_stream(self, fps=200.0, slots=3):
+        grab = FakeGrab()
+        stream = CaptureStream(lambda: (100, 50, 40, 30), fps=fps,
+                               slots=slots, grab=grab)
+        self.addCleanup(stream.stop)
+        return stream, grab
+
+    def test_sequence_increases(self):
+        """帧序号单调递增, wait_newer 返回更新的帧"""
+        stream, _ = self.make_stream()
+        stream.start()
+        first = stream.wait_newer(0)
+        second = stream.wait_newer(first.seq)
+        self.assertIsNotNone(first)
+        self.assertGreater(second.seq, first.seq)
+        self.assertGreaterEqual(second.timestamp, first.timestamp)
+        self.assertEqual(second.image.shape, (30, 40, 3))
+
+    def test_ring_buffer_reuses_slots(self):
+        """绕回同一槽位时复用预分配的数组"""
+        stream, grab = self.make_stream(slots=2)
+        for _ in range(5):
+            stream._capture_one()
+        self.assertIsNone(grab.outs[0])
+        self.assertIsNone(grab.outs[1])
+        self.assertIs(grab.outs[2], stream._slots[0].image)
+        self.assertEqual(stream.seq, 5)
+        self.assertEqual(stream.latest().seq, 5)
+
+    def test_shared_frame_not_overwritten(self):
+        """交给使用者的帧绕回其槽位后不被覆盖, 未交出的帧照常复用"""
+        stream, grab = self.make_stream(slots=2)
+        stream._capture_one()
+        frame = stream.latest()
+        crop = frame.crop((110, 60, 10, 5))
+        for _ in range(4):
+            stream._capture_one()
+        self.assertTrue((frame.image == 1).all())
+        self.assertTrue((crop == 1).all())
+        self.assertIsNone(grab.outs[2])
+        self.assertIs(grab.outs[3], stream._slots[1].image)
+
+    def test_latest_empty(self):
+        """还没有帧时 latest 返回 None"""
+        stream, _ = self.make_stream()
+        self.assertIsNone(stream.latest())
+        self.assertIsNone(stream.wait_newer(0, timeout=0.01))
+
+    def test_fps_cap(self):
+        """FPS 上限约束抓取次数"""
+        stream, grab = self.make_stream(fps=20.0)
+        stream.start()
+        threading.Event().wait(0.25)
+        stream.stop()
+        self.assertLessEqual(grab.count, 8)
+        self.assertGreaterEqual(grab.count, 2)
+
+    def test_wait_current_respects_input_epoch(self):
+        """输入之后只接受在输入之后开始抓取的帧"""
+        stream, _ = self.make_stream()
+        stream._capture_one()
+        self.assertIsNotNone(stream.wait_current(timeout=0.01))
+        screenshot_util.invalidate_frame_cache()
+        self.assertIsNone(stream.wait_current(timeout=0.01))
+        stream._capture_one()
+        self.assertEqual(stream.wait_current(timeout=0.01).seq, 2)
+
+    def test_frame_crop(self):
+        """Frame.crop 按屏幕坐标切片, 越界返回 None"""
+        stream, _ = self.make_stream()
+        stream._capture_one()
+        frame = stream.latest()
+        self.assertEqual(frame.crop((110, 60, 10, 5)).shape, (5, 10, 3))
+        self.assertIsNone(frame.crop((130, 60, 20, 5)))
+
+
+class TestSharedStreams(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(capture_stream.set_default_fps, 0)
+
+    def test_disabled_returns_none(self):
+        """未开启时 acquire 返回 None"""
+        capture_stream.set_default_fps(0)
+        self.assertIsNone(capture_stream.acquire(1, lambda: None))
+
+    def test_shared_by_hwnd(self):
+        """同一窗口的多个引擎共享一个采集线程, 最后一个归还时停止"""
+        capture_stream.set_default_fps(50)
+        a = capture_stream.acquire(7, lambda: None)
+        b = capture_stream.acquire(7, lambda: None)
+        self.assertIs(a, b)
+        capture_stream.release(a)
+        self.assertIsNotNone(a._thread)
+        capture_stream.release(b)
+        self.assertIsNone(a._thread)
+        self.assertNotIn(7, capture_stream._streams)
+
+
+if __name__ == '__main__':
+    unittest.main()
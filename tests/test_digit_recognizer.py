@@ -5,11 +5,31 @@ import os
 import sys
 import unittest
 import shutil
+from unittest import mock
+
+import cv2
 import numpy as np
 from PIL import Image, ImageDraw
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
-from digit_recognizer import DigitRecognizer
+import digit_recognizer
+from digit_recognizer import DigitRecognizer, PathGate
+
+
+def _pointwise_select(results, templates, confidence):
+    """原来的逐点去重实现, 作对照"""
+    widths = [t.shape[1] for t in templates.values()]
+    min_spacing = sum(widths) / len(widths) * 0.5
+    all_matches = []
+    for digit, result in results.items():
+        ys, xs = np.where(result >= confidence)
+        all_matches += [(int(x), digit, float(result[y, x])) for y, x in zip(ys, xs)]
+    all_matches.sort(key=lambda m: -m[2])
+    selected = []
+    for x, digit, conf in all_matches:
+        if not any(abs(x - sx) < min_spacing for sx, _, _ in selected):
+            selected.append((x, digit, conf))
+    return sorted(selected)
 
 
 class TestDigitRecognizer(unittest.TestCase):
@@ -50,6 +70,147 @@ class TestDigitRecognizer(unittest.TestCase):
         result = self.recognizer.recognize(blank)
         self.assertIsNone(result)
 
+    def _regions(self, count, seed=0):
+        """合成数字区域: 随机底色/字色/位置/尺寸, 部分为灰度图"""
+        rng = np.random.default_rng(seed)
+        regions = []
+        for i in range(count):
+            w, h = int(rng.integers(24, 36)), int(rng.integers(16, 22))
+            bg = tuple(int(v) for v in rng.integers(0, 80, 3))
+            fg = tuple(int(v) for v in rng.integers(160, 256, 3))
+            img = Image.new('RGB', (w, h), color=bg)
+            ImageDraw.Draw(img).text((int(rng.integers(0, 6)), int(rng.integers(0, 4))),
+                                     str(int(rng.integers(1, 999))), fill=fg)
+            region = np.asarray(img)[:, :, ::-1].copy()
+            noise = rng.integers(-6, 7, region.shape)
+            region = np.clip(region.astype(int) + noise, 0, 255).astype(np.uint8)
+            if i % 5 == 4:
+                region = region[:, :, 1].copy()
+            regions.append(region)
+        return regions
+
+    def test_recognize_batch_matches_recognize(self):
+        """批量识别结果与逐个识别完全相同"""
+        regions = self._regions(40)
+        regions.append(np.zeros((14, 30, 3), dtype=np.uint8))
+        regions.append(np.zeros((8, 6, 3), dtype=np.uint8))    # 比模板小
+        recognizer = DigitRecognizer(self.test_dir, cache_size=0)
+        expected = [recognizer.recognize(r) for r in regions]
+        self.assertEqual(recognizer.recognize_batch(regions), expected)
+        self.assertGreater(sum(q is not None for q in expected), 20)
+
+    def test_recognize_batch_matches_recognize_gr(self):
+        """青色数字模板 (有G-R通道模板) 时批量识别结果也相同"""
+        for digit in range(10):
+            img = Image.new('RGB', (10, 14), color=(40, 30, 30))
+            ImageDraw.Draw(img).text((1, 0), str(digit), fill=(0, 255, 255))
+            img.save(os.path.join(self.test_dir, f'{digit}.png'))
+        recognizer = DigitRecognizer(self.test_dir, cache_size=0)
+        self.assertEqual(len(recognizer.templates_gr), 10)
+        regions = self._regions(40, seed=1)
+        expected = [recognizer.recognize(r) for r in regions]
+        self.assertEqual(recognizer.recognize_batch(regions), expected)
+
+    def test_select_matches_same_as_pointwise(self):
+        """向量化去重与逐点收集 + 排序 + 逐个比较的结果相同 (含同分)"""
+        rng = np.random.default_rng(0)
+        templates = self.recognizer.templates
+        for _ in range(200):
+            shape = (int(rng.integers(1, 10)), int(rng.integers(1, 40)))
+            # 量化到 0.05 制造大量同分
+            results = {d: (np.round(rng.random(shape) * 20) / 20).astype(np.float32)
+                       for d in templates}
+            confidence = float(rng.choice([0.3, 0.6, 0.9]))
+            self.assertEqual(
+                self.recognizer._select_matches(results, templates, confidence),
+                _pointwise_select(results, templates, confidence))
+
+    def test_recognize_batch_empty(self):
+        """批量识别空列表返回空列表"""
+        self.assertEqual(self.recognizer.recognize_batch([]), [])
+
+    def test_gray_first_same_results(self):
+        """gray_first 策略学够样本后跳过 G-R, 结果与两条路径都跑相同"""
+        for digit in range(10):
+            img = Image.new('RGB', (10, 14), color=(40, 30, 30))
+            ImageDraw.Draw(img).text((1, 0), str(digit), fill=(0, 255, 255))
+            img.save(os.path.join(self.test_dir, f'{digit}.png'))
+        both = DigitRecognizer(self.test_dir)
+        fast = DigitRecognizer(self.test_dir, path_policy='gray_first')
+        regions = self._regions(200, seed=2)
+        for i in range(0, len(regions), 20):
+            scan = regions[i:i + 20]
+            self.assertEqual(fast.recognize_batch(scan), both.recognize_batch(scan))
+        self.assertEqual(both.gray_only + both.both_paths, 200)
+        self.assertEqual(fast.gray_only + fast.both_paths, 200)
+        self.assertGreater(fast.gray_only, both.gray_only)
+        self.assertIn('仅灰度', fast.summary())
+
+    def test_quantity_cache(self):
+        """像素相同的区域第二次直接命中缓存, 不再 matchTemplate"""
+        regions = self._regions(10, seed=3)
+        first = self.recognizer.recognize_batch(regions)
+        changed = regions[0].copy()
+        changed[0, 0] ^= 0xFF
+        with mock.patch.object(digit_recognizer.cv2, 'matchTemplate',
+                               wraps=cv2.matchTemplate) as mt:
+            second = self.recognizer.recognize_batch(regions[1:] + [changed])
+        self.assertEqual(second[:9], first[1:])
+        self.assertEqual(self.recognizer.cache_hits, 9)
+        self.assertEqual(self.recognizer.cache_misses, 11)
+        self.assertEqual(mt.call_count, len(self.recognizer.templates))
+        self.assertIn('缓存命中 9/20', self.recognizer.summary())
+        self.assertEqual(self.recognizer.recognize(regions[3]), first[3])
+        self.assertEqual(self.recognizer.cache_hits, 10)
+
+    def test_cache_lru(self):
+        """数量缓存按 LRU 淘汰"""
+        recognizer = DigitRecognizer(self.test_dir, cache_size=2)
+        a, b, c = self._regions(3, seed=4)
+        for region in (a, b, a, c, a, b):
+            recognizer.recognize(region)
+        # a 一直被用到所以留着, b 在 c 进来时被挤掉
+        self.assertEqual((recognizer.cache_hits, recognizer.cache_misses), (2, 4))
+
+    def test_unknown_policy(self):
+        """未知的路径策略报错"""
+        with self.assertRaises(ValueError):
+            DigitRecognizer(self.test_dir, path_policy='fastest')
+
+
+class TestPathGate(unittest.TestCase):
+
+    def test_needs_samples_then_skips(self):
+        """样本够了才跳过 G-R, 没学过的位数不跳过"""
+        gate = PathGate(min_samples=3, margin=0.05, audit_every=4)
+        self.assertFalse(gate.skip_gr(12, 0.9))
+        for _ in range(3):
+            gate.learn([(4, 1, 0.9), (10, 2, 0.9)], 12, 0.9, 12)
+        self.assertTrue(gate.skip_gr(12, 0.9))
+        self.assertFalse(gate.skip_gr(5, 0.9))      # 一位数还没学过
+        self.assertFalse(gate.skip_gr(None, 0.0))
+
+    def test_disagreement_raises_bound(self):
+        """G-R 结果不同时提高该位数的置信度下限"""
+        gate = PathGate(min_samples=1, margin=0.05, audit_every=100)
+        gate.learn([(4, 1, 0.8), (10, 2, 0.8)], 12, 0.8, 128)                    # G-R 多识别出一位
+        self.assertFalse(gate.skip_gr(12, 0.84))
+        self.assertTrue(gate.skip_gr(12, 0.86))
+
+    def test_gap(self):
+        """学到通常间距 6 后, 间距 12 视为漏了一位"""
+        gate = PathGate()
+        self.assertFalse(gate.has_gap([(4, 4, 0.9), (16, 8, 0.9)]))
+        gate.learn([(4, 1, 0.9), (10, 2, 0.9), (16, 3, 0.9)], 123, 0.9, 123)
+        self.assertTrue(gate.has_gap([(4, 4, 0.9), (16, 8, 0.9)]))
+        self.assertFalse(gate.has_gap([(4, 4, 0.9), (10, 8, 0.9)]))
+
+    def test_audit(self):
+        """每隔 audit_every 次仍跑一次 G-R 抽查"""
+        gate = PathGate(min_samples=0, audit_every=3)
+        self.assertEqual([gate.skip_gr(7, 0.9) for _ in range(6)],
+                         [True, True, False, True, True, False])
+
 
 if __name__ == '__main__':
     unittest.main()
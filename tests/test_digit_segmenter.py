@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import digit_segmenter
+from digit_recognizer import DigitRecognizer
+from digit_segmenter import binarize, segment
+
+
+def _text(text, size=(30, 20), bg=(30, 30, 30), fg=(255, 255, 255), pos=(3, 3)):
+    img = Image.new('RGB', size, color=bg)
+    ImageDraw.Draw(img).text(pos, text, fill=fg)
+    return np.asarray(img)[:, :, ::-1].copy()
+
+
+class TestSegment(unittest.TestCase):
+
+    def test_binarize_polarity(self):
+        """深字浅底也以数字为前景"""
+        dark = _text('8', bg=(230, 230, 230), fg=(10, 10, 10))[:, :, 1]
+        binary, sep = binarize(dark)
+        self.assertEqual(binary[0, 0], 0)
+        self.assertGreater(np.count_nonzero(binary), 5)
+        self.assertGreater(sep, 0.5)
+        self.assertEqual(binarize(np.full((10, 10), 7, np.uint8))[1], 0.0)
+
+    def test_split_merged(self):
+        """三个字粘成一段时按字距切成三段"""
+        binary = np.zeros((10, 30), np.uint8)
+        binary[2:8, 2:20] = 255
+        spans = segment(binary, glyph_w=5)
+        self.assertEqual(len(spans), 3)
+        self.assertEqual((spans[0][0], spans[-1][1]), (2, 20))
+        binary[:, 8] = binary[:, 14] = 0
+        self.assertEqual(segment(binary, glyph_w=5), [(2, 8), (9, 14), (15, 20)])
+
+
+class TestProjectionEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        for digit in range(10):
+            Image.fromarray(_text(str(digit), (10, 14), (40, 30, 30), (255, 255, 255),
+                                  (1, 0))[:, :, ::-1]).save(
+                os.path.join(self.dir, f'{digit}.png'))
+
+    def test_reads_numbers(self):
+        """投影分割引擎读出 1~3 位数"""
+        recognizer = DigitRecognizer(self.dir, engine='projection', cache_size=0)
+        self.assertEqual(len(recognizer._projector.digits), 10)
+        rng = np.random.default_rng(0)
+        labels = [int(v) for v in rng.integers(1, 999, 30)]
+        regions = [_text(str(v), pos=(int(rng.integers(1, 8)), int(rng.integers(1, 5))))
+                   for v in labels]
+        self.assertEqual(recognizer.recognize_batch(regions), labels)
+        self.assertEqual(recognizer.projected, 30)
+        self.assertIn('投影分割 30', recognizer.summary())
+        self.assertIsNone(recognizer.recognize(np.zeros((20, 30, 3), np.uint8)))
+
+    def test_unknown_engine(self):
+        """未知的识别引擎报错"""
+        with self.assertRaises(ValueError):
+            DigitRecognizer(self.dir, engine='ocr')
+
+    def test_no_templates(self):
+        """没有模板时什么都不识别"""
+        classifier = digit_segmenter.ProjectionClassifier({})
+        self.assertFalse(classifier.is_loaded())
+        self.assertEqual(classifier.read([np.zeros((20, 30), np.uint8)], 0.6), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import fft_match
+import matching
+from matching import Matcher
+
+
+def _frame(seed=7, w=320, h=240):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (h // 8, w // 8, 3), dtype=np.uint8)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+
+
+class TestFftMatch(unittest.TestCase):
+
+    def setUp(self):
+        fft_match.clear_cache()
+        self.frame = _frame()
+        # 平坦区域: 窗口方差为 0, 两边都应给 0 分
+        self.frame[0:60, 0:100] = 90
+
+    def assert_same_as_cv2(self, image, tmpl):
+        expected = cv2.matchTemplate(image, tmpl, cv2.TM_CCOEFF_NORMED)
+        got = fft_match.fft_match_map(image, tmpl)
+        self.assertEqual(got.shape, expected.shape)
+        self.assertLess(float(np.abs(got - expected).max()), 1e-4)
+        self.assertEqual(fft_match.fft_match(image, tmpl)[1],
+                         cv2.minMaxLoc(expected)[3])
+
+    def test_color_agrees_with_cv2(self):
+        """彩色图的结果与 cv2.matchTemplate 一致"""
+        for x, y, w, h in ((150, 90, 60, 40), (5, 170, 33, 50), (250, 10, 64, 64)):
+            self.assert_same_as_cv2(self.frame, self.frame[y:y + h, x:x + w].copy())
+
+    def test_gray_agrees_with_cv2(self):
+        """灰度图的结果与 cv2.matchTemplate 一致"""
+        gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
+        self.assert_same_as_cv2(gray, gray[120:160, 40:100].copy())
+
+    def test_template_spectra_cached(self):
+        """模板频谱缓存, 同一帧的频谱多个模板共用"""
+        tmpl = self.frame[100:140, 100:160].copy()
+        fft_match.fft_match(self.frame, tmpl)
+        with mock.patch.object(fft_match, '_pad_dft',
+                               wraps=fft_match._pad_dft) as dft:
+            fft_match.fft_match(self.frame, tmpl)
+        # 只变换了画面的 3 个通道, 模板频谱来自缓存
+        self.assertEqual(dft.call_count, 3)
+
+        shared = fft_match.FrameSpectra(self.frame)
+        fft_match.fft_match(self.frame, tmpl, shared)
+        with mock.patch.object(fft_match, '_pad_dft',
+                               wraps=fft_match._pad_dft) as dft:
+            other = self.frame[20:60, 200:260].copy()
+            val, loc = fft_match.fft_match(self.frame, other, shared)
+        # 新模板只算自己的频谱, 画面的复用
+        self.assertEqual(dft.call_count, 3)
+        self.assertEqual(loc, (200, 20))
+
+    def test_cache_capped_by_bytes(self):
+        """频谱缓存按字节数淘汰最久未用的, 且不让模板数组一直活着"""
+        tmpls = [self.frame[y:y + 40, 100:160].copy() for y in (0, 50, 100)]
+        fft_match.fft_match(self.frame, tmpls[0])
+        per_entry = fft_match.cache_bytes()
+        self.assertGreater(per_entry, 0)
+        with mock.patch.object(fft_match, 'SPECTRA_CACHE_BYTES', per_entry * 2):
+            for tmpl in tmpls[1:]:
+                fft_match.fft_match(self.frame, tmpl)
+        self.assertEqual(fft_match.cache_bytes(), per_entry * 2)
+        self.assertEqual(len(fft_match._cache), 2)
+        self.assertNotIn((id(tmpls[0]), fft_match._dft_shape(self.frame.shape)),
+                         fft_match._cache)
+        ref = next(iter(fft_match._cache.values()))[0]
+        del tmpls[:]
+        self.assertIsNone(ref())
+
+    def test_prefer_fft(self):
+        """大模板在大画面里才走频域"""
+        self.assertTrue(fft_match.prefer_fft((600, 800, 3), (40, 100, 3)))
+        self.assertFalse(fft_match.prefer_fft((600, 800, 3), (16, 16, 3)))
+        self.assertFalse(fft_match.prefer_fft((80, 120, 3), (40, 100, 3)))
+
+
+class TestMatcherUsesFft(unittest.TestCase):
+
+    def test_large_search_goes_through_fft(self):
+        """Matcher 在大画面里找大模板时走频域"""
+        frame = _frame(w=640, h=480)
+        tmpl = frame[300:340, 100:160].copy()
+        with mock.patch.object(matching.fft_match, 'fft_match',
+                               wraps=fft_match.fft_match) as fm:
+            m = Matcher(remember=False).match(tmpl, (0, 0, 640, 480), screen=frame)
+        fm.assert_called_once()
+        self.assertEqual(m.box, (100, 300, 60, 40))
+        self.assertGreater(m.confidence, 0.99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import matching
+import screenshot_util
+from capture_backends import SyntheticBackend
+from matching import Matcher
+
+SCREEN_W, SCREEN_H = 320, 240
+
+
+def _scene(seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.integers(30, 220, (SCREEN_H, SCREEN_W, 3), dtype=np.uint8)
+
+
+class MatchingTestCase(unittest.TestCase):
+    """用合成后端当"屏幕": render 返回的整帧原点在屏幕 (0, 0)"""
+
+    def setUp(self):
+        self.screen = _scene()
+        self.tmpl = self.screen[100:130, 200:240].copy()
+        self.frames = []        # 为空时一直返回 self.screen
+        self.use_backend(self._render)
+        self.addCleanup(screenshot_util.set_capture_backend, None)
+
+    def _render(self, index, elapsed):
+        if index < len(self.frames):
+            return self.frames[index]
+        return self.screen
+
+    def use_backend(self, render):
+        screenshot_util.set_capture_backend(SyntheticBackend(render))
+
+
+class TestFind(MatchingTestCase):
+
+    def test_screen_coords(self):
+        """返回的框和中心点是屏幕坐标"""
+        region = (50, 20, 250, 200)
+        m = matching.find(self.tmpl, region)
+        self.assertEqual(m.box, (200, 100, 40, 30))
+        self.assertEqual((m.x, m.y), (220, 115))
+        self.assertGreater(m.confidence, 0.99)
+
+    def test_below_threshold(self):
+        """低于阈值时 find 返回 None, exists 为 False"""
+        other = _scene(seed=2)[0:30, 0:40].copy()
+        self.assertIsNone(matching.find(other, (0, 0, SCREEN_W, SCREEN_H)))
+        self.assertFalse(matching.exists(other, (0, 0, SCREEN_W, SCREEN_H)))
+        self.assertLess(
+            matching.match(other, (0, 0, SCREEN_W, SCREEN_H)).confidence, 0.7)
+
+    def test_roi(self):
+        """roi 限定搜索范围, 范围外的目标找不到"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        m = matching.find(self.tmpl, window, roi=(180, 90, 80, 60))
+        self.assertEqual(m.box, (200, 100, 40, 30))
+        self.assertIsNone(matching.find(self.tmpl, window, roi=(0, 0, 150, 150)))
+
+    def test_area_smaller_than_template(self):
+        """搜索区域比模板小时置信度为 0"""
+        m = matching.match(self.tmpl, (0, 0, SCREEN_W, SCREEN_H),
+                           roi=(200, 100, 10, 10))
+        self.assertEqual(m.confidence, 0.0)
+        m = matching.match(self.tmpl, (0, 0, 20, 20))
+        self.assertEqual(m.confidence, 0.0)
+
+    def test_template_path(self):
+        """模板可以直接传路径"""
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        path = os.path.join(d, 'button.png')
+        Image.fromarray(self.tmpl[..., ::-1]).save(path)
+        self.assertEqual(matching.find(path, (0, 0, SCREEN_W, SCREEN_H)).box,
+                         (200, 100, 40, 30))
+
+
+class TestMatcher(MatchingTestCase):
+
+    def test_skip_unchanged(self):
+        """画面未变时复用上次结果, 变了重新匹配"""
+        matcher = Matcher(skip_unchanged=True, remember=False)
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        first = matcher.match(self.tmpl, window)
+        second = matcher.match(self.tmpl, window)
+        self.assertEqual(first, second)
+        self.assertEqual(matcher.stats()['matches'], 1)
+        self.assertEqual(matcher.skipped, 1)
+
+        changed = self.screen.copy()
+        changed[100:130, 200:240] = 0
+        changed[10:40, 20:60] = self.tmpl
+        self.use_backend(lambda i, t: changed)
+        self.assertEqual(matcher.match(self.tmpl, window).box, (20, 10, 40, 30))
+        self.assertEqual(matcher.stats()['matches'], 2)
+
+    def test_last_hit_searched_first(self):
+        """先在上次命中位置附近搜索"""
+        matcher = Matcher()
+        window = (50, 20, 250, 200)
+        first = matcher.find(self.tmpl, window)
+        self.assertEqual(matcher.stats()['roi_hits'], 0)
+        with mock.patch('matching.cv2.matchTemplate',
+                        wraps=matching.cv2.matchTemplate) as mt:
+            second = matcher.find(self.tmpl, window)
+        self.assertEqual(second.box, first.box)
+        self.assertAlmostEqual(second.confidence, first.confidence, places=4)
+        self.assertEqual(matcher.roi_hits, 1)
+        searched = mt.call_args[0][0]
+        self.assertLessEqual(searched.shape[0], 30 + 2 * matching.LAST_HIT_PADDING)
+        self.assertLessEqual(searched.shape[1], 40 + 2 * matching.LAST_HIT_PADDING)
+        self.assertIn('1/1', matcher.summary())
+
+    def test_last_hit_falls_back_to_full_frame(self):
+        """上次位置附近找不到时退回整个区域, 并记住新位置"""
+        matcher = Matcher()
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        matcher.find(self.tmpl, window)
+        moved = self.screen.copy()
+        moved[100:130, 200:240] = 0
+        moved[10:40, 20:60] = self.tmpl
+        self.use_backend(lambda i, t: moved)
+        self.assertEqual(matcher.find(self.tmpl, window).box, (20, 10, 40, 30))
+        self.assertEqual(matcher.roi_misses, 1)
+        # 新位置被记住
+        matcher.find(self.tmpl, window)
+        self.assertEqual(matcher.roi_hits, 1)
+
+    def test_last_hit_follows_drifting_target(self):
+        """目标每次挪几个像素时, 上次位置跟着更新, 一直在附近命中"""
+        matcher = Matcher()
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        background = _scene(seed=5)
+        step = matching.LAST_HIT_PADDING // 2
+        for i in range(6):
+            x = 20 + i * step
+            moved = background.copy()
+            moved[100:130, x:x + 40] = self.tmpl
+            self.use_backend(lambda idx, t, frame=moved: frame)
+            self.assertEqual(matcher.find(self.tmpl, window).box, (x, 100, 40, 30))
+        self.assertEqual((matcher.roi_hits, matcher.roi_misses), (5, 0))
+
+    def test_settle_waits_for_blank_frames(self):
+        """settle 时等黑屏过渡帧过去再匹配"""
+        black = np.zeros_like(self.screen)
+        self.frames = [black, black]
+        matcher = Matcher(settle=True)
+        with mock.patch.object(matching, 'BLANK_RECHECK_INTERVAL', 0):
+            m = matcher.find(self.tmpl, (0, 0, SCREEN_W, SCREEN_H))
+        self.assertIsNotNone(m)
+
+    def test_without_settle_blank_frame_misses(self):
+        """不 settle 时黑屏帧上找不到"""
+        self.frames = [np.zeros_like(self.screen)]
+        self.assertIsNone(Matcher().find(self.tmpl, (0, 0, SCREEN_W, SCREEN_H)))
+
+    def test_wait_for(self):
+        """wait_for 轮询到目标出现"""
+        other = _scene(seed=3)
+        self.frames = [other, other, other]
+        m = Matcher().wait_for(self.tmpl, (0, 0, SCREEN_W, SCREEN_H),
+                               timeout=5, interval=0)
+        self.assertEqual(m.box, (200, 100, 40, 30))
+
+    def test_wait_for_timeout_and_stop(self):
+        """wait_for 超时或被停止时返回 None"""
+        other = _scene(seed=3)
+        self.use_backend(lambda i, t: other)
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        self.assertIsNone(
+            Matcher().wait_for(self.tmpl, window, timeout=0.05, interval=0.01))
+        stopped = Matcher(stop_check=lambda: True)
+        self.assertIsNone(stopped.wait_for(self.tmpl, window, timeout=5))
+
+
+class TestMemo(MatchingTestCase):
+
+    def test_static_screen_reuses_result(self):
+        """画面像素相同时直接用备忘的结果, 不再匹配"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        matcher = Matcher(remember=False)
+        first = matcher.match(self.tmpl, window)
+        with mock.patch.object(matching, 'exhaustive_match') as ex, \
+                mock.patch.object(matching.fft_match, 'fft_match') as fm:
+            second = matcher.match(self.tmpl, window)
+        ex.assert_not_called()
+        fm.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual((matcher.memo_hits, matcher.memo_misses), (1, 1))
+        self.assertIn('结果备忘命中 1/2', matcher.summary())
+
+    def test_restored_screen_hits_again(self):
+        """画面恢复原样后再次命中备忘, 模板换新数组不复用"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        popup = self.screen.copy()
+        popup[0:50, 0:50] = 0
+        self.frames = [self.screen, popup, self.screen]
+        matcher = Matcher(remember=False)
+        for _ in range(3):
+            self.assertEqual(matcher.match(self.tmpl, window).box, (200, 100, 40, 30))
+        self.assertEqual((matcher.memo_hits, matcher.memo_misses), (1, 2))
+        # 同样的像素但模板换成了新数组 (重新截图), 不复用
+        matcher.match(self.tmpl.copy(), window)
+        self.assertEqual(matcher.memo_misses, 3)
+
+    def test_template_not_kept_alive(self):
+        """备忘只弱引用模板数组, 模板不再使用后可以被回收"""
+        matcher = Matcher(remember=False)
+        tmpl = self.tmpl.copy()
+        matcher.match(tmpl, (0, 0, SCREEN_W, SCREEN_H))
+        ref = next(iter(matcher._memo.values()))[0]
+        self.assertIs(ref(), tmpl)
+        del tmpl
+        self.assertIsNone(ref())
+
+    def test_size_capped(self):
+        """备忘条数不超过 MEMO_SIZE"""
+        matcher = Matcher(remember=False)
+        with mock.patch.object(matching, 'MEMO_SIZE', 2):
+            for x in (0, 10, 20):
+                matcher.match(self.tmpl, (0, 0, SCREEN_W, SCREEN_H),
+                              roi=(x, 0, 200, 200))
+        self.assertEqual(len(matcher._memo), 2)
+
+
+class TestMask(MatchingTestCase):
+
+    def test_masked_template_ignores_background(self):
+        # 圆形按钮截图时背景是一种纹理, 现在换了场景
+        """带掩码的模板不受掩码外背景变化影响"""
+        rng = np.random.default_rng(11)
+        button = rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)
+        mask = np.zeros((30, 40), np.uint8)
+        cv2.ellipse(mask, (20, 15), (18, 13), 0, 0, 360, 255, -1)
+        captured = np.where(mask[..., None] > 0, button, _scene(seed=6)[:30, :40])
+        self.screen[100:130, 200:240] = np.where(mask[..., None] > 0, button,
+                                                 self.screen[100:130, 200:240])
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        path = os.path.join(d, 'button.png')
+        Image.fromarray(np.dstack([captured[..., ::-1], mask])).save(path)
+        plain = captured.copy()
+        window = (0, 0, SCREEN_W, SCREEN_H)
+
+        self.assertLess(Matcher(remember=False).match(plain, window).confidence, 0.8)
+        m = Matcher(remember=False).match(path, window)
+        self.assertEqual(m.box, (200, 100, 40, 30))
+        self.assertGreater(m.confidence, 0.99)
+        self.assertTrue(Matcher(remember=False).exists(path, window, threshold=0.9))
+
+    def test_flat_window_scores_zero(self):
+        """掩码内平坦的窗口记 0 分"""
+        frame = np.full((60, 80, 3), 77, np.uint8)
+        tmpl = _scene()[:20, :20].copy()
+        mask = np.full((20, 20), 255, np.uint8)
+        mask[:5] = 0
+        val, _ = matching.exhaustive_match(frame, tmpl, mask)
+        self.assertEqual(val, 0.0)
+
+
+class TestMatchMany(MatchingTestCase):
+
+    def test_same_as_individual(self):
+        """match_many 的结果与逐个 match 相同"""
+        window = (10, 10, 300, 220)
+        others = [self.screen[20:50, 30:90].copy(), _scene(seed=4)[0:20, 0:20].copy()]
+        templates = [self.tmpl] + others
+        many = Matcher(remember=False).match_many(templates, window)
+        single = [Matcher(remember=False).match(t, window) for t in templates]
+        self.assertEqual([m.box for m in many], [m.box for m in single])
+        for a, b in zip(many, single):
+            self.assertAlmostEqual(a.confidence, b.confidence, places=5)
+
+    def test_one_grab_and_shared_shrink(self):
+        """多个模板只截一次图, 缩小图共用"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        templates = [self.screen[y:y + 32, x:x + 48].copy()
+                     for x, y in ((0, 0), (100, 100), (250, 180))]
+        matcher = Matcher(remember=False, pyramid=2)
+        with mock.patch.object(matcher, 'grab', wraps=matcher.grab) as grab, \
+                mock.patch.object(matching, '_shrink',
+                                  wraps=matching._shrink) as shrink:
+            results = matcher.match_many(templates, window)
+        grab.assert_called_once()
+        frame_shrinks = [c for c in shrink.call_args_list
+                         if c[0][0].shape == self.screen.shape]
+        self.assertEqual(len(frame_shrinks), 1)
+        self.assertEqual([m.box[:2] for m in results],
+                         [(0, 0), (100, 100), (250, 180)])
+
+    def test_threshold_and_screen_keyword_only(self):
+        """threshold / screen 只能按关键字传, 防止两种写法间位置参数对调"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        for fn in (matching.match, Matcher().match):
+            with self.assertRaises(TypeError):
+                fn(self.tmpl, window, None, 0.8)
+        for fn in (matching.match_many, Matcher().match_many):
+            with self.assertRaises(TypeError):
+                fn([self.tmpl], window, None, 0.8)
+
+    def test_per_template_threshold(self):
+        """threshold 可以按模板分别给出"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        a, b = Matcher().match_many([self.tmpl, self.tmpl], window,
+                                    threshold=[0.5, 1.01])
+        self.assertEqual(a.box, b.box)
+
+    def test_wait_for_any(self):
+        """wait_for_any 返回先出现的模板下标和结果"""
+        other = _scene(seed=3)
+        missing = other[0:30, 0:30].copy()
+        self.frames = [other]
+        hit = Matcher().wait_for_any([missing, self.tmpl],
+                                     (0, 0, SCREEN_W, SCREEN_H),
+                                     timeout=5, interval=0)
+        # 第一帧里 missing 就在 (0, 0), 排在前面
+        self.assertEqual(hit[0], 0)
+        self.assertEqual(hit[1].box, (0, 0, 30, 30))
+
+
+class TestExists(MatchingTestCase):
+
+    def test_fast_path_agrees(self):
+        """存在性粗判与完整匹配结论一致"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        other = _scene(seed=2)[0:30, 0:40].copy()
+        fast = Matcher(remember=False, memo=False)
+        slow = Matcher(remember=False, fast_exists=False)
+        for tmpl in (self.tmpl, other):
+            self.assertEqual(fast.exists(tmpl, window), slow.exists(tmpl, window))
+        self.assertTrue(fast.exists(self.tmpl, window))
+        self.assertEqual(fast.presence_checks, 3)
+        self.assertEqual(fast.presence_escalations, 0)
+        self.assertIn('存在性粗判 3次', fast.summary())
+
+    def test_gray_match_with_wrong_colors(self):
+        # 灰度上完全相关、颜色相反的块: 粗判命中, 但 BGR 确认不通过
+        """灰度相关但颜色不对的块经 BGR 确认后判为不存在"""
+        rng = np.random.default_rng(9)
+        texture = rng.integers(0, 256, (30, 40), dtype=np.uint8)
+        self.screen[100:130, 200:240] = texture[..., None]
+        tmpl = np.dstack([255 - texture, texture, 255 - texture])
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        matcher = Matcher(remember=False)
+        self.assertFalse(matcher.exists(tmpl, window))
+        self.assertFalse(Matcher(fast_exists=False).exists(tmpl, window))
+        self.assertTrue(matcher.exists(self.screen[100:130, 200:240].copy(), window))
+
+    def test_roi(self):
+        """exists 也按 roi 限定范围"""
+        window = (0, 0, SCREEN_W, SCREEN_H)
+        self.assertTrue(matching.exists(self.tmpl, window, roi=(180, 90, 80, 60)))
+        self.assertFalse(matching.exists(self.tmpl, window, roi=(0, 0, 150, 150)))
+        self.assertFalse(matching.exists(self.tmpl, window, roi=(200, 100, 10, 10)))
+
+
+class TestPyramid(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        small = rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)
+        self.frame = cv2.resize(small, (640, 480), interpolation=cv2.INTER_CUBIC)
+
+    def test_agrees_with_exhaustive(self):
+        """金字塔匹配的位置与原分辨率一致"""
+        for (x, y, w, h) in ((300, 200, 60, 25), (17, 401, 40, 32),
+                             (580, 3, 48, 48)):
+            tmpl = self.frame[y:y + h, x:x + w].copy()
+            for scale in (2, 4):
+                val, loc = matching.pyramid_match(self.frame, tmpl, scale)
+                self.assertEqual(loc, (x, y))
+                self.assertGreater(val, 0.99)
+
+    def test_small_template_falls_back(self):
+        """模板太小时退回原分辨率匹配"""
+        tmpl = self.frame[50:60, 70:82].copy()
+        with mock.patch.object(matching, 'exhaustive_match',
+                               wraps=matching.exhaustive_match) as ex:
+            val, loc = matching.pyramid_match(self.frame, tmpl, 4)
+        self.assertEqual(loc, (70, 50))
+        ex.assert_called_once()
+        self.assertEqual(ex.call_args[0][0].shape, self.frame.shape)
+
+    def test_matcher_default_pyramid(self):
+        """set_default_pyramid 后 Matcher 默认走金字塔"""
+        tmpl = self.frame[300:340, 100:160].copy()
+        self.addCleanup(matching.set_default_pyramid, 0)
+        matching.set_default_pyramid(2)
+        with mock.patch.object(matching, 'pyramid_match',
+                               wraps=matching.pyramid_match) as pm:
+            m = Matcher(remember=False).match(
+                tmpl, (0, 0, 640, 480), screen=self.frame)
+        pm.assert_called_once()
+        self.assertEqual(m.box, (100, 300, 60, 40))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import screenshot_util
+from screenshot_util import (FrameChangeDetector, WindowCaptureSession,
+                             is_blank_frame, window_crop)
+
+
+class FakeGdi:
+    """假 GDI 层: 记录调用次数, 窗口尺寸由 rect 属性控制"""
+
+    def __init__(self, rect=(100, 50, 900, 650)):
+        self.rect = rect
+        self.opened = []
+        self.closed = []
+        self.bitmaps = []
+        self.deleted = []
+        self.blits = []
+        self.fail_blit = False
+        self.pixel = b'\x10\x20\x30\x00'
+
+    def get_window_rect(self, hwnd):
+        return self.rect
+
+    def open_dc(self, hwnd):
+        dcs = ('dc', len(self.opened))
+        self.opened.append(dcs)
+        return dcs
+
+    def create_bitmap(self, dcs, width, height):
+        bmp = ('bmp', len(self.bitmaps), width, height)
+        self.bitmaps.append(bmp)
+        return bmp
+
+    def blit(self, dcs, bmp, size, src):
+        if self.fail_blit:
+            raise OSError('BitBlt failed')
+        self.blits.append((size, src))
+        return self.pixel * (size[0] * size[1])
+
+    def delete_bitmap(self, bmp):
+        self.deleted.append(bmp)
+
+    def close_dc(self, hwnd, dcs):
+        self.closed.append(dcs)
+
+
+class TestWindowCrop(unittest.TestCase):
+    def test_inside(self):
+        """窗口内区域换算为窗口内坐标"""
+        self.assertEqual(
+            window_crop((150, 80, 200, 160), (100, 50, 900, 650)),
+            (50, 30, 200, 160))
+
+    def test_clipped(self):
+        """越界部分被裁掉"""
+        self.assertEqual(
+            window_crop((50, 600, 200, 100), (100, 50, 900, 650)),
+            (0, 550, 150, 50))
+
+    def test_outside(self):
+        """完全在窗口外返回 None"""
+        self.assertIsNone(
+            window_crop((1000, 0, 50, 50), (100, 50, 900, 650)))
+
+    def test_full_window(self):
+        """region=None 表示整窗口"""
+        self.assertEqual(
+            window_crop(None, (100, 50, 900, 650)), (0, 0, 800, 600))
+
+
+class TestIsBlankFrame(unittest.TestCase):
+    def test_black(self):
+        """全黑帧判为黑屏"""
+        self.assertTrue(is_blank_frame(np.zeros((600, 800, 4), np.uint8)))
+
+    def test_alpha_ignored(self):
+        """BGRA 的 X/alpha 通道不参与判断"""
+        frame = np.zeros((60, 80, 4), np.uint8)
+        frame[..., 3] = 255
+        self.assertTrue(is_blank_frame(frame))
+
+    def test_single_bright_sample(self):
+        """任一采样点亮起即不算黑屏"""
+        frame = np.zeros((80, 80, 3), np.uint8)
+        frame[10, 50, 1] = 200
+        self.assertFalse(is_blank_frame(frame))
+
+    def test_between_samples_ignored(self):
+        """采样点之外的像素不影响结果 (与旧的 49 点逐点采样一致)"""
+        frame = np.zeros((80, 80, 3), np.uint8)
+        frame[11, 11] = 255
+        self.assertTrue(is_blank_frame(frame))
+
+    def test_threshold(self):
+        """调高阈值可把暗过渡帧也视为黑屏"""
+        frame = np.full((60, 80), 10, np.uint8)
+        self.assertFalse(is_blank_frame(frame))
+        self.assertTrue(is_blank_frame(frame, threshold=16))
+
+
+class TestFrameChangeDetector(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.frame = rng.integers(0, 256, (200, 320, 3), dtype=np.uint8)
+
+    def test_first_frame_all_changed(self):
+        """首帧视为全部变化"""
+        det = FrameChangeDetector()
+        det.update(self.frame)
+        self.assertTrue(det.changed_since(0))
+        self.assertEqual(len(det.changed_regions()), 7 * 10)
+
+    def test_identical_frame_unchanged(self):
+        """相同画面不算变化"""
+        det = FrameChangeDetector()
+        gen = det.update(self.frame)
+        det.update(self.frame.copy())
+        self.assertFalse(det.changed_since(gen))
+        self.assertEqual(det.changed_regions(), [])
+
+    def test_local_change(self):
+        """局部变化只影响所在块"""
+        det = FrameChangeDetector(tile=32)
+        gen = det.update(self.frame)
+        changed = self.frame.copy()
+        changed[70:90, 200:230] = 255 - changed[70:90, 200:230]
+        det.update(changed)
+        self.assertTrue(det.changed_since(gen))
+        self.assertTrue(det.changed_since(gen, roi=(190, 60, 50, 40)))
+        self.assertFalse(det.changed_since(gen, roi=(0, 0, 100, 60)))
+        for x, y, w, h in det.changed_regions():
+            self.assertTrue(160 <= x < 240 and 64 <= y < 96)
+
+    def test_noise_tolerated(self):
+        """轻微噪声 (压缩/抖动) 不算变化"""
+        det = FrameChangeDetector()
+        gen = det.update(self.frame)
+        noisy = np.clip(self.frame.astype(int) + 1, 0, 255).astype(np.uint8)
+        det.update(noisy)
+        self.assertFalse(det.changed_since(gen))
+
+    def test_slow_drift_detected(self):
+        """每帧都低于阈值的缓慢渐变累积起来也算变化"""
+        det = FrameChangeDetector()
+        gen = det.update(self.frame)
+        base = self.frame.astype(int)
+        for step in range(1, 21):
+            det.update(np.clip(base + step * 5, 0, 255).astype(np.uint8))
+        self.assertTrue(det.changed_since(gen))
+        # 渐变停下之后基准跟上, 之后的静止画面不再算变化
+        settled = det.update(np.clip(base + 100, 0, 255).astype(np.uint8))
+        det.update(np.clip(base + 100, 0, 255).astype(np.uint8))
+        self.assertFalse(det.changed_since(settled))
+
+    def test_resize_resets(self):
+        """尺寸变化视为全部变化"""
+        det = FrameChangeDetector()
+        gen = det.update(self.frame)
+        det.update(self.frame[:100])
+        self.assertTrue(det.changed_since(gen))
+
+
+class TestWindowCaptureSession(unittest.TestCase):
+    def test_reuses_dc_across_frames(self):
+        """尺寸不变时多帧只创建一次 DC/位图"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        for _ in range(5):
+            rect, src, w, h, bits = session.grab()
+        self.assertEqual(len(gdi.opened), 1)
+        self.assertEqual(len(gdi.bitmaps), 1)
+        self.assertEqual(len(gdi.blits), 5)
+        self.assertEqual((w, h), (800, 600))
+        self.assertEqual(src, (0, 0))
+        self.assertEqual(len(bits), 800 * 600 * 4)
+        self.assertEqual(rect, gdi.rect)
+
+    def test_region_blits_sub_rect(self):
+        """region 只拷贝子矩形"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        _, src, w, h, bits = session.grab((300, 250, 200, 160))
+        self.assertEqual(gdi.blits, [((200, 160), (200, 200))])
+        self.assertEqual(src, (200, 200))
+        self.assertEqual(len(bits), 200 * 160 * 4)
+
+    def test_bitmap_per_size_cached(self):
+        """同尺寸区域复用位图, 超出上限淘汰最久未用的"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        session.grab((100, 50, 20, 14))
+        session.grab((200, 60, 20, 14))
+        self.assertEqual(len(gdi.bitmaps), 1)
+        for i in range(WindowCaptureSession.MAX_BITMAPS):
+            session.grab((100, 50, 30 + i, 14))
+        self.assertEqual(gdi.deleted, [gdi.bitmaps[0]])
+
+    def test_rebuilds_on_resize(self):
+        """窗口尺寸变化时释放旧 DC/位图并重建"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        session.grab()
+        gdi.rect = (100, 50, 740, 530)
+        _, _, w, h, _ = session.grab()
+        self.assertEqual((w, h), (640, 480))
+        self.assertEqual(len(gdi.opened), 2)
+        self.assertEqual(gdi.closed, [gdi.opened[0]])
+        self.assertEqual(gdi.deleted, [gdi.bitmaps[0]])
+
+    def test_move_without_resize_keeps_dc(self):
+        """仅移动窗口不重建"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        session.grab()
+        gdi.rect = (300, 200, 1100, 800)
+        session.grab()
+        self.assertEqual(len(gdi.opened), 1)
+
+    def test_close_releases_and_stops(self):
+        """close 后释放资源, 之后 grab 返回 None"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        session.grab()
+        session.close()
+        self.assertEqual(gdi.closed, gdi.opened)
+        self.assertEqual(gdi.deleted, gdi.bitmaps)
+        self.assertIsNone(session.grab())
+        self.assertEqual(len(gdi.opened), 1)
+
+    def test_blit_error_drops_dc(self):
+        """BitBlt 异常时丢弃 DC, 下一帧重建"""
+        gdi = FakeGdi()
+        session = WindowCaptureSession(1234, gdi=gdi)
+        session.grab()
+        gdi.fail_blit = True
+        self.assertIsNone(session.grab())
+        self.assertEqual(len(gdi.closed), 1)
+        gdi.fail_blit = False
+        self.assertIsNotNone(session.grab())
+        self.assertEqual(len(gdi.opened), 2)
+
+    def test_invalid_size(self):
+        """零尺寸窗口返回 None 且不创建 DC"""
+        gdi = FakeGdi(rect=(0, 0, 0, 0))
+        session = WindowCaptureSession(1234, gdi=gdi)
+        self.assertIsNone(session.grab())
+        self.assertEqual(gdi.opened, [])
+
+
+class FakeShot:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.raw = bytearray(width * height * 4)
+
+
+class FakeMss:
+    """假 mss 实例, 记录创建/关闭次数"""
+    created = []
+
+    def __init__(self):
+        self.closed = False
+        self.monitors = [{'left': 0, 'top': 0, 'width': 64, 'height': 48}]
+        FakeMss.created.append(self)
+
+    def grab(self, monitor):
+        return FakeShot(monitor['width'], monitor['height'])
+
+    def close(self):
+        self.closed = True
+
+
+class TestThreadMss(unittest.TestCase):
+    def setUp(self):
+        FakeMss.created = []
+        self.signature = (0, 0, 1920, 1080, 1)
+        patches = [
+            mock.patch.object(screenshot_util.mss, 'mss', FakeMss),
+            mock.patch.object(screenshot_util, '_display_signature',
+                              lambda: self.signature),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(screenshot_util.close_thread_capture)
+
+    def test_reused_within_thread(self):
+        """同一线程多次截图只创建一个 mss 实例"""
+        for _ in range(3):
+            frame = screenshot_util._mss_capture((0, 0, 20, 10))
+        self.assertEqual(frame.shape, (10, 20, 4))
+        self.assertEqual(len(FakeMss.created), 1)
+
+    def test_full_screen_uses_cached_monitors(self):
+        """region=None 时用实例缓存的 monitors[0]"""
+        frame = screenshot_util._mss_capture(None)
+        self.assertEqual(frame.shape, (48, 64, 4))
+
+    def test_close_thread_capture(self):
+        """close_thread_capture 关闭实例, 下次截图重新创建"""
+        screenshot_util._mss_capture((0, 0, 4, 4))
+        screenshot_util.close_thread_capture()
+        self.assertTrue(FakeMss.created[0].closed)
+        screenshot_util._mss_capture((0, 0, 4, 4))
+        self.assertEqual(len(FakeMss.created), 2)
+
+    def test_display_change_recreates(self):
+        """显示器布局变化时重建实例"""
+        screenshot_util._mss_capture((0, 0, 4, 4))
+        self.signature = (0, 0, 3840, 1080, 2)
+        screenshot_util._mss_capture((0, 0, 4, 4))
+        self.assertTrue(FakeMss.created[0].closed)
+        self.assertEqual(len(FakeMss.created), 2)
+
+    def test_screen_origin(self):
+        """整屏截图原点取虚拟屏幕左上角, 副显示器在左边 / 上边时为负"""
+        screenshot_util.set_capture_backend(screenshot_util.DesktopBackend())
+        self.addCleanup(screenshot_util.set_capture_backend, None)
+        screenshot_util._thread_mss().monitors[0].update(left=-1920, top=-200)
+        self.assertEqual(screenshot_util.screen_origin(), (-1920, -200))
+
+    def test_per_thread_instances(self):
+        """不同线程各自持有实例"""
+        screenshot_util._mss_capture((0, 0, 4, 4))
+        worker = threading.Thread(
+            target=lambda: (screenshot_util._mss_capture((0, 0, 4, 4)),
+                            screenshot_util.close_thread_capture()))
+        worker.start()
+        worker.join()
+        self.assertEqual(len(FakeMss.created), 2)
+        self.assertTrue(FakeMss.created[1].closed)
+        self.assertFalse(FakeMss.created[0].closed)
+
+
+class TestSetCaptureHwnd(unittest.TestCase):
+    def setUp(self):
+        self.gdis = []
+
+        def factory():
+            gdi = FakeGdi()
+            self.gdis.append(gdi)
+            return gdi
+
+        patches = [
+            mock.patch.object(screenshot_util, '_HAS_WIN32', True),
+            mock.patch.object(screenshot_util, '_Win32Gdi', factory),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(screenshot_util.set_capture_hwnd, None)
+
+    def test_rebind_same_hwnd_keeps_session(self):
+        """重复绑定同一窗口沿用会话"""
+        screenshot_util.set_capture_hwnd(1)
+        session = screenshot_util._session
+        screenshot_util.set_capture_hwnd(1)
+        self.assertIs(screenshot_util._session, session)
+
+    def test_acquire_release_refcounted(self):
+        """两个引擎绑定同一窗口, 一个归还后会话仍在, 最后一个归还才解绑"""
+        self.addCleanup(screenshot_util._bind_refs.clear)
+        a = screenshot_util.acquire_capture_hwnd(1)
+        session = screenshot_util._session
+        session.grab()
+        b = screenshot_util.acquire_capture_hwnd(1)
+        screenshot_util.release_capture_hwnd(a)
+        self.assertIs(screenshot_util._session, session)
+        self.assertEqual(screenshot_util.get_capture_hwnd(), 1)
+        self.assertEqual(self.gdis[0].closed, [])
+        screenshot_util.release_capture_hwnd(b)
+        self.assertIsNone(screenshot_util._session)
+        self.assertEqual(len(self.gdis[0].closed), 1)
+        self.assertIsNone(screenshot_util.get_capture_hwnd())
+        self.assertIsNone(screenshot_util.acquire_capture_hwnd(0))
+        screenshot_util.release_capture_hwnd(None)
+        self.assertEqual(screenshot_util._bind_refs, {})
+
+    def test_unbind_releases(self):
+        """解绑时释放 DC"""
+        screenshot_util.set_capture_hwnd(1)
+        screenshot_util._session.grab()
+        screenshot_util.set_capture_hwnd(None)
+        self.assertIsNone(screenshot_util._session)
+        self.assertIsNone(screenshot_util.get_capture_hwnd())
+        gdi = self.gdis[0]
+        self.assertEqual(gdi.closed, gdi.opened)
+
+    def test_capture_window_returns_bgra(self):
+        """_capture_window 直接把 BGRX 字节包装成 numpy 数组"""
+        screenshot_util.set_capture_hwnd(1)
+        frame = screenshot_util._capture_window(1)
+        self.assertEqual(frame.shape, (600, 800, 4))
+        self.assertEqual(tuple(frame[0, 0]), (0x10, 0x20, 0x30, 0))
+
+    def test_take_screenshot_is_rgb(self):
+        """take_screenshot 仍返回 RGB 的 PIL 图片"""
+        screenshot_util.set_capture_hwnd(1)
+        img = screenshot_util.take_screenshot(region=(150, 80, 20, 14))
+        self.assertEqual(img.mode, 'RGB')
+        self.assertEqual(img.getpixel((0, 0)), (0x30, 0x20, 0x10))
+
+    def test_grab_bgr(self):
+        """grab_bgr 返回可写的 BGR 数组"""
+        screenshot_util.set_capture_hwnd(1)
+        frame = screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        self.assertEqual(frame.shape, (160, 200, 3))
+        self.assertEqual(tuple(frame[5, 5]), (0x10, 0x20, 0x30))
+        self.assertTrue(frame.flags.writeable)
+
+    def test_take_screenshot_region(self):
+        """绑定窗口后 take_screenshot 只抓 region 子矩形"""
+        screenshot_util.set_capture_hwnd(1)
+        img = screenshot_util.take_screenshot(region=(150, 80, 200, 160))
+        self.assertEqual(img.size, (200, 160))
+        self.assertEqual(self.gdis[0].blits, [((200, 160), (50, 30))])
+
+    def test_black_region_in_live_window_is_kept(self):
+        """区域全黑但整窗口有画面时, 仍返回该区域而不回退 mss"""
+        screenshot_util.set_capture_hwnd(1)
+        gdi = self.gdis[0]
+        frames = iter([b'\x00' * 4, b'\x10\x20\x30\x00'])
+        real_blit = gdi.blit
+
+        def blit(dcs, bmp, size, src):
+            gdi.pixel = next(frames)
+            return real_blit(dcs, bmp, size, src)
+
+        gdi.blit = blit
+        with mock.patch.object(screenshot_util, '_mss_capture') as mss_cap:
+            frame = screenshot_util.grab_bgr(region=(150, 80, 20, 14))
+        mss_cap.assert_not_called()
+        self.assertEqual(tuple(frame[0, 0]), (0, 0, 0))
+
+    def test_black_window_falls_back_to_mss(self):
+        """整窗口全黑时回退 mss"""
+        screenshot_util.set_capture_hwnd(1)
+        self.gdis[0].pixel = b'\x00' * 4
+        mss_frame = np.full((14, 20, 4), 7, dtype=np.uint8)
+        with mock.patch.object(screenshot_util, '_mss_capture',
+                               return_value=mss_frame) as mss_cap:
+            result = screenshot_util.grab_bgr(region=(150, 80, 20, 14))
+        mss_cap.assert_called_once_with((150, 80, 20, 14))
+        self.assertEqual(tuple(result[0, 0]), (7, 7, 7))
+
+
+class TestFrameCache(unittest.TestCase):
+    def setUp(self):
+        self.gdi = FakeGdi()
+        patches = [
+            mock.patch.object(screenshot_util, '_HAS_WIN32', True),
+            mock.patch.object(screenshot_util, '_Win32Gdi', lambda: self.gdi),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(screenshot_util.set_capture_hwnd, None)
+        self.addCleanup(screenshot_util.set_frame_cache_ttl,
+                        screenshot_util.FRAME_CACHE_TTL)
+        screenshot_util.set_frame_cache_ttl(60)
+        screenshot_util.set_capture_hwnd(1)
+        self.window = (100, 50, 800, 600)
+
+    def test_region_served_from_full_frame(self):
+        """整窗口帧新鲜时, 区域请求直接切片, 不再 BitBlt"""
+        full = screenshot_util.grab_bgr(region=self.window)
+        part = screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        self.assertEqual(len(self.gdi.blits), 1)
+        self.assertEqual(part.shape, (160, 200, 3))
+        self.assertTrue(np.array_equal(part, full[30:190, 50:250]))
+
+    def test_take_screenshot_from_cached_frame(self):
+        """整窗口帧缓存里切出的不连续切片也能生成 PIL 图片"""
+        full = screenshot_util.grab_bgr(region=self.window)
+        img = screenshot_util.take_screenshot(region=(150, 80, 200, 160))
+        self.assertEqual(len(self.gdi.blits), 1)
+        self.assertEqual(img.size, (200, 160))
+        self.assertEqual(img.getpixel((0, 0)), tuple(int(v) for v in full[30, 50, ::-1]))
+
+    def test_region_grab_not_cached(self):
+        """小区域截图不进缓存"""
+        screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_fresh_bypasses_cache(self):
+        """fresh=True 强制重新抓"""
+        screenshot_util.grab_bgr(region=self.window)
+        screenshot_util.grab_bgr(region=self.window, fresh=True)
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_invalidate(self):
+        """invalidate_frame_cache 之后重新抓"""
+        screenshot_util.grab_bgr(region=self.window)
+        screenshot_util.invalidate_frame_cache()
+        screenshot_util.grab_bgr(region=self.window)
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_input_during_grab_not_cached(self):
+        """抓取期间有输入时, 抓到的 (可能是输入前的) 帧不进缓存"""
+        blit = self.gdi.blit
+
+        def blit_then_input(*args):
+            pixels = blit(*args)
+            screenshot_util.invalidate_frame_cache()
+            return pixels
+
+        self.gdi.blit = blit_then_input
+        screenshot_util.grab_bgr(region=self.window, fresh=True)
+        self.gdi.blit = blit
+        screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_expired(self):
+        """超过保鲜时间后重新抓"""
+        screenshot_util.set_frame_cache_ttl(0.01)
+        screenshot_util.grab_bgr(region=self.window)
+        with mock.patch.object(screenshot_util.time, 'monotonic',
+                               return_value=time.monotonic() + 1):
+            screenshot_util.grab_bgr(region=self.window)
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_window_moved(self):
+        """窗口移动后缓存失效"""
+        screenshot_util.grab_bgr(region=self.window)
+        self.gdi.rect = (110, 50, 910, 650)
+        screenshot_util.grab_bgr(region=(150, 80, 200, 160))
+        self.assertEqual(len(self.gdi.blits), 2)
+
+    def test_disabled(self):
+        """保鲜时间为 0 时不缓存"""
+        screenshot_util.set_frame_cache_ttl(0)
+        screenshot_util.grab_bgr(region=self.window)
+        screenshot_util.grab_bgr(region=self.window)
+        self.assertEqual(len(self.gdi.blits), 2)
+
+
+class TestCaptureStats(unittest.TestCase):
+    def setUp(self):
+        self.gdi = FakeGdi()
+        patches = [
+            mock.patch.object(screenshot_util, '_HAS_WIN32', True),
+            mock.patch.object(screenshot_util, '_Win32Gdi', lambda: self.gdi),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.addCleanup(screenshot_util.set_capture_hwnd, None)
+        self.addCleanup(screenshot_util.enable_capture_stats, False)
+        self.addCleanup(screenshot_util.set_frame_cache_ttl,
+                        screenshot_util.FRAME_CACHE_TTL)
+        screenshot_util.set_frame_cache_ttl(60)
+        screenshot_util.set_capture_hwnd(1)
+        screenshot_util.enable_capture_stats()
+        self.window = (100, 50, 800, 600)
+
+    def test_disabled_by_default(self):
+        """关闭时不统计"""
+        screenshot_util.enable_capture_stats(False)
+        screenshot_util.grab_bgr(region=self.window)
+        self.assertIsNone(screenshot_util.get_capture_stats())
+        self.assertEqual(screenshot_util.format_capture_stats(), [])
+
+    def test_bitblt_and_cache(self):
+        """BitBlt 记次数 / 字节 / 直方图, 缓存命中单独记"""
+        screenshot_util.grab_bgr(region=self.window)
+        screenshot_util.grab_bgr(region=(150, 80, 20, 14))
+        stats = screenshot_util.get_capture_stats()
+        bitblt = stats['sources']['bitblt']
+        self.assertEqual(bitblt['count'], 1)
+        self.assertEqual(bitblt['bytes'], 800 * 600 * 4)
+        self.assertEqual(sum(bitblt['hist']), 1)
+        self.assertEqual(stats['sources']['cache']['count'], 1)
+        self.assertEqual(stats['fallbacks'], 0)
+        self.assertTrue(screenshot_util.format_capture_stats())
+
+    def test_black_window_counts_fallback(self):
+        """整窗口黑屏: 黑屏 +1, 回退 +1, mss 计入"""
+        self.gdi.pixel = b'\x00' * 4
+        with mock.patch.object(screenshot_util.mss, 'mss', FakeMss):
+            screenshot_util.grab_bgr(region=(150, 80, 20, 14))
+            screenshot_util.close_thread_capture()
+        stats = screenshot_util.get_capture_stats()
+        self.assertEqual(stats['blank_frames'], 1)
+        self.assertEqual(stats['fallbacks'], 1)
+        self.assertEqual(stats['sources']['mss']['count'], 1)
+        self.assertEqual(stats['sources']['mss']['bytes'], 20 * 14 * 4)
+
+    def test_enable_keeps_counts_reset_clears(self):
+        """再次开启保留计数, reset 清零"""
+        screenshot_util.grab_bgr(region=self.window)
+        screenshot_util.enable_capture_stats()
+        self.assertIn('bitblt', screenshot_util.get_capture_stats()['sources'])
+        screenshot_util.reset_capture_stats()
+        self.assertEqual(screenshot_util.get_capture_stats()['sources'], {})
+
+    def test_capture_run_counts_only_its_own(self):
+        """每次运行的汇总只含本次运行期间的截图, 不含之前运行的"""
+        screenshot_util.grab_bgr(region=self.window)
+        first = screenshot_util.begin_capture_run()
+        screenshot_util.grab_bgr(region=(150, 80, 20, 14))
+        second = screenshot_util.begin_capture_run()
+        screenshot_util.grab_bgr(region=(150, 80, 20, 14), fresh=True)
+        self.assertEqual(len(screenshot_util.end_capture_run(first)), 3)
+        screenshot_util.grab_bgr(region=(150, 80, 20, 14), fresh=True)
+        first_stats = first.snapshot()['sources']
+        second_stats = second.snapshot()['sources']
+        self.assertEqual(first_stats['cache']['count'], 1)
+        self.assertEqual(first_stats['bitblt']['count'], 1)
+        self.assertNotIn('cache', second_stats)
+        self.assertEqual(second_stats['bitblt']['count'], 2)
+        self.assertEqual(
+            screenshot_util.get_capture_stats()['sources']['bitblt']['count'], 3)
+        self.assertTrue(screenshot_util.end_capture_run(second))
+        screenshot_util.enable_capture_stats(False)
+        self.assertIsNone(screenshot_util.begin_capture_run())
+        self.assertEqual(screenshot_util.end_capture_run(None), [])
+
+    def test_histogram_buckets(self):
+        """耗时按 STATS_BUCKETS_MS 分桶"""
+        stats = screenshot_util.CaptureStats()
+        for seconds in (0.0005, 0.003, 0.003, 0.5):
+            stats.record('x', seconds, 0)
+        hist = stats.snapshot()['sources']['x']['hist']
+        self.assertEqual(hist[0], 1)
+        self.assertEqual(hist[2], 2)
+        self.assertEqual(hist[-1], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import template_store
+from template_store import TemplateStore
+
+
+class TestTemplateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = TemplateStore()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, rgb, size=(8, 6), mode='RGB'):
+        path = os.path.join(self.dir, name)
+        Image.new(mode, size, rgb).save(path)
+        return path
+
+    def test_decodes_to_bgr(self):
+        """解码成只读的 BGR 数组"""
+        path = self._write('a.png', (10, 20, 30))
+        bgr = self.store.get(path)
+        self.assertEqual(bgr.shape, (6, 8, 3))
+        self.assertEqual(tuple(bgr[0, 0]), (30, 20, 10))
+        self.assertFalse(bgr.flags.writeable)
+
+    def test_rgba_drops_alpha(self):
+        """RGBA 图去掉 alpha 通道"""
+        path = self._write('a.png', (10, 20, 30, 40), mode='RGBA')
+        self.assertEqual(self.store.get(path).shape, (6, 8, 3))
+
+    def test_hits_and_misses(self):
+        """同一文件 (不同写法的路径) 第二次命中缓存"""
+        path = self._write('a.png', (1, 2, 3))
+        first = self.store.get(path)
+        second = self.store.get(os.path.join(self.dir, '.', 'a.png'))
+        self.assertIs(first, second)
+        self.assertEqual(self.store.stats()['hits'], 1)
+        self.assertEqual(self.store.stats()['misses'], 1)
+
+    def test_gray(self):
+        """灰度图按需生成并缓存, 计入字节数"""
+        path = self._write('a.png', (100, 100, 100))
+        gray = self.store.get_gray(path)
+        self.assertEqual(gray.shape, (6, 8))
+        self.assertEqual(gray[0, 0], 100)
+        self.assertIs(self.store.get_gray(path), gray)
+        self.assertEqual(self.store.stats()['bytes'], 6 * 8 * 4)
+
+    def test_mtime_change_reloads(self):
+        """文件修改时间变了重新解码"""
+        path = self._write('a.png', (1, 2, 3))
+        self.store.get(path)
+        self._write('a.png', (50, 60, 70))
+        stamp = os.stat(path).st_mtime + 5
+        os.utime(path, (stamp, stamp))
+        self.assertEqual(tuple(self.store.get(path)[0, 0]), (70, 60, 50))
+
+    def test_invalidate(self):
+        """invalidate 后重新解码"""
+        path = self._write('a.png', (1, 2, 3))
+        self.store.get(path)
+        self._write('a.png', (50, 60, 70))
+        self.store.invalidate(path)
+        self.assertEqual(tuple(self.store.get(path)[0, 0]), (70, 60, 50))
+        self.assertEqual(self.store.stats()['misses'], 2)
+
+    def test_lru_by_bytes(self):
+        """超出字节上限时淘汰最久未用的"""
+        store = TemplateStore(max_bytes=2 * 6 * 8 * 3)
+        a, b, c = (self._write(f'{n}.png', (9, 9, 9)) for n in 'abc')
+        store.get(a)
+        store.get(b)
+        store.get(a)
+        store.get(c)            # 超出上限, 淘汰最久未用的 b
+        self.assertEqual(store.stats()['entries'], 2)
+        store.get(a)
+        self.assertEqual(store.stats()['misses'], 3)
+        store.get(b)
+        self.assertEqual(store.stats()['misses'], 4)
+
+    def test_alpha_mask(self):
+        """alpha 通道转成掩码, 不透明的像素参与"""
+        rgba = np.zeros((6, 8, 4), np.uint8)
+        rgba[..., :3] = (10, 20, 30)
+        rgba[2:, :, 3] = 255
+        path = os.path.join(self.dir, 'a.png')
+        Image.fromarray(rgba).save(path)
+        mask = self.store.get_mask(path)
+        self.assertEqual(mask.shape, (6, 8))
+        self.assertEqual(np.count_nonzero(mask), 4 * 8)
+        self.assertIsNone(self.store.get_mask(self._write('b.png', (1, 2, 3))))
+
+    def test_companion_mask_file(self):
+        """读取 _mask.png 掩码文件, 尺寸不符时忽略"""
+        path = self._write('a.png', (1, 2, 3))
+        self.assertIsNone(self.store.get_mask(path))
+        mask = np.full((6, 8), 255, np.uint8)
+        mask[:, :2] = 0
+        Image.fromarray(mask).save(template_store.mask_path(path))
+        # 只新增了掩码文件, 模板本身没变也要重新加载
+        self.assertEqual(np.count_nonzero(self.store.get_mask(path)), 6 * 6)
+        # 尺寸对不上的掩码忽略
+        Image.fromarray(mask[:3]).save(template_store.mask_path(path))
+        stamp = os.stat(path).st_mtime + 5
+        os.utime(template_store.mask_path(path), (stamp, stamp))
+        self.assertIsNone(self.store.get_mask(path))
+
+    def test_derive_and_save_mask(self):
+        """多次截图生成稳定像素掩码并存成带 alpha 的 PNG"""
+        rng = np.random.default_rng(0)
+        base = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+        frames = []
+        for _ in range(4):
+            f = base.copy()
+            f[:, :2] = rng.integers(0, 256, (6, 2, 3))    # 左边两列是会变的背景
+            frames.append(f)
+        mask = template_store.derive_mask(frames)
+        self.assertEqual(np.count_nonzero(mask[:, 2:]), 6 * 6)
+        self.assertEqual(np.count_nonzero(mask[:, :2]), 0)
+        self.assertIsNone(template_store.derive_mask([base, base]))
+
+        path = os.path.join(self.dir, 'm.png')
+        template_store.save_with_mask(path, base, mask)
+        self.assertTrue(np.array_equal(self.store.get(path), base))
+        self.assertTrue(np.array_equal(self.store.get_mask(path), mask))
+
+    def test_missing_file(self):
+        """文件不存在时报 OSError"""
+        with self.assertRaises(OSError):
+            self.store.get(os.path.join(self.dir, 'nope.png'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,11 +9,9 @@
 import time
 import threading
 import pyautogui  # 仅用于 pyautogui.position() 读取真实鼠标位置 (不会移动鼠标)
-import cv2
-import numpy as np
-from PIL import Image
+import capture_stream
+import matching
 import screenshot_util
-from screenshot_util import take_screenshot
 import bg_input
 
 
@@ -50,7 +48,8 @@ class AutoEncounterEngine:
             self.status_callback(message)
 
     def _run(self, point1_x, point1_y, point2_x, point2_y, click_delay):
-        screenshot_util.set_capture_hwnd(self.window_manager.hwnd)
+        bound_hwnd = screenshot_util.acquire_capture_hwnd(
+            self.window_manager.hwnd)
         try:
             if not self.window_manager.is_window_valid():
                 self._log("错误: 未绑定游戏窗口")
@@ -97,7 +96,7 @@ class AutoEncounterEngine:
         except Exception as e:
             self._log(f"自动遇敌出错: {str(e)}")
         finally:
-            screenshot_util.set_capture_hwnd(None)
+            screenshot_util.release_capture_hwnd(bound_hwnd)
             self.is_running = False
             self._log("自动遇敌已停止")
 
@@ -125,6 +124,8 @@ class LoopHealingEngine:
         self.should_stop = False
         self.is_running = False
         self._thread = None
+        self._stream = None
+        self._matcher = matching.Matcher()
 
     def start(self, skill_image, member_image, steps):
         """
@@ -152,33 +153,6 @@ class LoopHealingEngine:
         if self.status_callback:
             self.status_callback(message)
 
-    def _find_template(self, template_path, window_rect, threshold=0.7):
-        """在窗口中查找模板图片
-
-        Returns:
-            tuple: (center_x, center_y, confidence) 或 None
-        """
-        screenshot = take_screenshot(region=window_rect)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
-
-        result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-        if max_val >= threshold:
-            th, tw = tmpl.shape[:2]
-            click_x = window_rect[0] + max_loc[0] + tw // 2
-            click_y = window_rect[1] + max_loc[1] + th // 2
-            return (click_x, click_y, max_val)
-        return None
-
     def _find_with_retry(self, template_path, hwnd, timeout, label):
         """限时反复查找模板, 找不到时移开鼠标后继续找。
 
@@ -190,13 +164,13 @@ class LoopHealingEngine:
 
         Returns:
             tuple: (pos, rect)
-                pos: (x, y, conf) 或 None (超时 / should_stop / 取窗口失败)
+                pos: matching.Match 或 None (超时 / should_stop / 取窗口失败)
                 rect: 最后一次有效的 window_rect, 失败时可能为 None
         """
         rect = self.window_manager.get_window_rect()
         if not rect:
             return None, None
-        pos = self._find_template(template_path, rect)
+        pos = self._matcher.find(template_path, rect)
         if pos:
             return pos, rect
         self._log(f"  {label}: 未找到, 移开重试 ({timeout:.0f}秒内)...")
@@ -207,14 +181,19 @@ class LoopHealingEngine:
             rect = self.window_manager.get_window_rect()
             if not rect:
                 return None, None
-            pos = self._find_template(template_path, rect)
+            pos = self._matcher.find(template_path, rect)
             if pos:
                 return pos, rect
             bg_input.post_move(hwnd, rect[0] + 50, rect[1] + 50)
         return None, rect
 
     def _run(self, skill_image, member_image, steps):
-        screenshot_util.set_capture_hwnd(self.window_manager.hwnd)
+        bound_hwnd = screenshot_util.acquire_capture_hwnd(
+            self.window_manager.hwnd)
+        self._stream = capture_stream.acquire(
+            self.window_manager.hwnd, self.window_manager.get_window_rect)
+        self._matcher = matching.Matcher(self._stream)
+        capture_run = screenshot_util.begin_capture_run()
         try:
             if not self.window_manager.is_window_valid():
                 self._log("错误: 未绑定游戏窗口")
@@ -250,10 +229,9 @@ class LoopHealingEngine:
                             self._log(
                                 f"  步骤{i+1}: {self.RETRY_TIMEOUT:.0f}秒未找到治疗技能, 重启本轮")
                             break
-                        sx, sy, _ = skill_pos
                         if self.should_stop:
                             break
-                        bg_input.post_click(hwnd, sx, sy, pre_delay=0.2)
+                        bg_input.post_click(hwnd, skill_pos.x, skill_pos.y, pre_delay=0.2)
                         self._log(f"  步骤{i+1}: 点击治疗技能")
 
                     elif step['type'] == 'member':
@@ -267,11 +245,10 @@ class LoopHealingEngine:
                             self._log(
                                 f"  步骤{i+1}: {self.RETRY_TIMEOUT:.0f}秒未找到队员定位, 重启本轮")
                             break
-                        mx, my, _ = member_pos
                         ox = step.get('offset_x', 0)
                         oy = step.get('offset_y', 0)
-                        click_x = mx + ox
-                        click_y = my + oy
+                        click_x = member_pos.x + ox
+                        click_y = member_pos.y + oy
                         if self.should_stop:
                             break
                         bg_input.post_click(hwnd, click_x, click_y, pre_delay=0.2)
@@ -289,8 +266,16 @@ class LoopHealingEngine:
         except Exception as e:
             self._log(f"循环医疗出错: {str(e)}")
         finally:
-            screenshot_util.set_capture_hwnd(None)
+            capture_stream.release(self._stream)
+            self._stream = None
+            screenshot_util.release_capture_hwnd(bound_hwnd)
+            screenshot_util.close_thread_capture()
             self.is_running = False
+            for line in screenshot_util.end_capture_run(capture_run):
+                self._log(line)
+            summary = self._matcher.summary()
+            if summary:
+                self._log(summary)
             self._log("循环医疗已停止")
 
 
@@ -307,35 +292,14 @@ class GetMaterialEngine:
         self.window_manager = window_manager
         self.status_callback = status_callback
         self._busy = False
+        self._stream = None
+        self._matcher = matching.Matcher()
         self.should_stop = False
 
     def _log(self, message):
         if self.status_callback:
             self.status_callback(message)
 
-    def _find_template(self, template_path, window_rect, threshold=0.7):
-        """在窗口中查找模板图片"""
-        screenshot = take_screenshot(region=window_rect)
-        screen_np = np.array(screenshot)
-        screenshot.close()
-        screen_bgr = cv2.cvtColor(screen_np, cv2.COLOR_RGB2BGR)
-
-        pil_tmpl = Image.open(template_path)
-        tmpl = np.array(pil_tmpl)
-        pil_tmpl.close()
-        if len(tmpl.shape) == 3:
-            tmpl = cv2.cvtColor(tmpl, cv2.COLOR_RGB2BGR)
-
-        result = cv2.matchTemplate(screen_bgr, tmpl, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-        if max_val >= threshold:
-            th, tw = tmpl.shape[:2]
-            click_x = window_rect[0] + max_loc[0] + tw // 2
-            click_y = window_rect[1] + max_loc[1] + th // 2
-            return (click_x, click_y, max_val)
-        return None
-
     def stop(self):
         self.should_stop = True
 
@@ -351,7 +315,12 @@ class GetMaterialEngine:
         ).start()
 
     def _run(self, material_image):
-        screenshot_util.set_capture_hwnd(self.window_manager.hwnd)
+        bound_hwnd = screenshot_util.acquire_capture_hwnd(
+            self.window_manager.hwnd)
+        self._stream = capture_stream.acquire(
+            self.window_manager.hwnd, self.window_manager.get_window_rect)
+        self._matcher = matching.Matcher(self._stream)
+        capture_run = screenshot_util.begin_capture_run()
         try:
             if not self.window_manager.is_window_valid():
                 self._log("获取材料: 未绑定游戏窗口")
@@ -387,7 +356,7 @@ class GetMaterialEngine:
                 if self.should_stop:
                     self._log("获取材料: 已取消")
                     return
-                pos = self._find_template(material_image, rect)
+                pos = self._matcher.find(material_image, rect)
                 if pos:
                     break
                 time.sleep(0.2)
@@ -400,9 +369,8 @@ class GetMaterialEngine:
                 self._log("获取材料: 已取消")
                 return
 
-            mx, my, _ = pos
-            bg_input.post_click(hwnd, mx, my)
-            self._log(f"  点击材料图片 ({mx}, {my})")
+            bg_input.post_click(hwnd, pos.x, pos.y)
+            self._log(f"  点击材料图片 ({pos.x}, {pos.y})")
 
             # 4. 等待 300ms
             time.sleep(0.3)
@@ -419,5 +387,10 @@ class GetMaterialEngine:
         except Exception as e:
             self._log(f"获取材料出错: {str(e)}")
         finally:
-            screenshot_util.set_capture_hwnd(None)
+            capture_stream.release(self._stream)
+            self._stream = None
+            screenshot_util.release_capture_hwnd(bound_hwnd)
+            screenshot_util.close_thread_capture()
             self._busy = False
+            for line in screenshot_util.end_capture_run(capture_run):
+                self._log(line)